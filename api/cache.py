@@ -0,0 +1,156 @@
+import os
+import json
+import time
+import threading
+import logging
+from collections import OrderedDict
+from hashlib import md5
+from api.crud import fetch_rows
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+API_CACHE_BACKEND = os.getenv("API_CACHE_BACKEND", "memory")
+API_CACHE_MAX_ENTRIES = int(os.getenv("API_CACHE_MAX_ENTRIES", "1024"))
+API_CACHE_TTL_SECONDS = float(os.getenv("API_CACHE_TTL_SECONDS", "3600"))
+API_CACHE_REDIS_URL = os.getenv("API_CACHE_REDIS_URL", "redis://localhost:6379/0")
+# How long the data version read from the warehouse is trusted before it is re-read.
+API_CACHE_VERSION_CHECK_SECONDS = float(os.getenv("API_CACHE_VERSION_CHECK_SECONDS", "5"))
+DATA_VERSION_TABLE = 'marts.api_data_version'
+
+class MemoryCacheBackend:
+    """In-process LRU cache with a per-entry TTL."""
+    def __init__(self, max_entries=API_CACHE_MAX_ENTRIES):
+        self.max_entries = max(1, max_entries)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+class RedisCacheBackend:
+    """Cache shared by all API workers, stored as JSON in Redis (requires the 'redis' package)."""
+    def __init__(self, url=API_CACHE_REDIS_URL, prefix='telegram-api:'):
+        if redis is None:
+            raise ValueError("Redis cache backend requested but the 'redis' package is not installed.")
+        self._client = redis.Redis.from_url(url)
+        self._prefix = prefix
+
+    def get(self, key):
+        value = self._client.get(self._prefix + key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, key, value, ttl):
+        self._client.set(self._prefix + key, json.dumps(value, default=str), ex=max(1, int(ttl)))
+
+    def __len__(self):
+        return 0
+
+CACHE_BACKENDS = {'memory': MemoryCacheBackend, 'redis': RedisCacheBackend}
+
+class ResponseCache:
+    """
+    Caches endpoint payloads keyed on (endpoint, parameters, data version).
+
+    The data version is a counter the dbt on-run-end hook bumps in marts.api_data_version,
+    so entries from before a pipeline run are never served after it. ETags are derived from
+    the same key, which lets If-None-Match requests be answered without touching the payload.
+    """
+    def __init__(self, backend=None, ttl=API_CACHE_TTL_SECONDS):
+        self.backend = backend if backend is not None else MemoryCacheBackend()
+        self.ttl = ttl
+        self._version = None
+        self._version_checked_at = 0.0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'not_modified': 0, 'errors': 0}
+
+    def data_version(self):
+        """Returns the warehouse data version, re-reading it at most every few seconds."""
+        now = time.monotonic()
+        if self._version is not None and now - self._version_checked_at < API_CACHE_VERSION_CHECK_SECONDS:
+            return self._version
+        version = 0
+        if fetch_rows("SELECT to_regclass(%s) IS NOT NULL;", (DATA_VERSION_TABLE,))[1][0][0]:
+            rows = fetch_rows(f"SELECT version FROM {DATA_VERSION_TABLE};")[1]
+            version = rows[0][0] if rows else 0
+        with self._lock:
+            if version != self._version and self._version is not None:
+                logger.info(f"Warehouse data version changed from {self._version} to {version}; cached responses expire.")
+            self._version = version
+            self._version_checked_at = now
+        return version
+
+    @staticmethod
+    def make_key(endpoint, params, version):
+        return f"{endpoint}:{json.dumps(params, sort_keys=True, default=str)}:v{version}"
+
+    @staticmethod
+    def make_etag(key):
+        return f'"{md5(key.encode("utf-8")).hexdigest()}"'
+
+    def record(self, outcome):
+        with self._lock:
+            self._stats[outcome] += 1
+
+    def get(self, key):
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            logger.warning(f"Response cache read failed ({e}); computing the response.")
+            self.record('errors')
+            return None
+        self.record('hits' if value is not None else 'misses')
+        return value
+
+    def set(self, key, value):
+        try:
+            self.backend.set(key, value, self.ttl)
+        except Exception as e:
+            logger.warning(f"Response cache write failed: {e}")
+            self.record('errors')
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, backend=type(self.backend).__name__, entries=len(self.backend),
+                        data_version=self._version)
+
+def if_none_match(header_value, etag):
+    """
+    True if an If-None-Match header value lists `etag` (weak comparison). '*' is not a match:
+    it is checked before the payload is built, when the resource may not exist (a 404).
+    """
+    if not header_value:
+        return False
+    candidates = [candidate.strip() for candidate in header_value.split(',')]
+    return etag in candidates or f"W/{etag}" in candidates
+
+def create_response_cache():
+    if API_CACHE_BACKEND not in CACHE_BACKENDS:
+        raise ValueError(f"Unsupported API cache backend '{API_CACHE_BACKEND}'. Expected one of {sorted(CACHE_BACKENDS)}.")
+    logger.info(f"Using the '{API_CACHE_BACKEND}' response cache backend (TTL {API_CACHE_TTL_SECONDS}s).")
+    return ResponseCache(CACHE_BACKENDS[API_CACHE_BACKEND]())
+
+response_cache = create_response_cache()
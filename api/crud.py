@@ -1,112 +1,302 @@
+import json
+import uuid
+import base64
+import binascii
+import threading
 import psycopg2
-import psycopg2.extras
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import date
-from api.database import get_db_connection
+from api.database import get_db_connection, release_db_connection, open_export_connection, close_export_connection
 import logging
 
 logger = logging.getLogger(__name__)
 
-def fetch_data(query: str, params: Optional[tuple] = None) -> List[Dict[str, Any]]:
+def fetch_rows(query: str, params: Optional[tuple] = None) -> Tuple[List[str], List[tuple]]:
+    """
+    Runs a query and returns (column names, row tuples). Plain tuple cursors skip building
+    a dict per row, which is most of the client-side cost of large result sets.
+    """
     conn = None
     cursor = None
+    broken = False
     try:
         conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+        cursor = conn.cursor()
         cursor.execute(query, params)
-        results = cursor.fetchall()
-        return results
+        columns = [column[0] for column in cursor.description]
+        return columns, cursor.fetchall()
     except Exception as e:
+        # Connection-level failures leave the connection unusable; don't hand it to the next request.
+        broken = isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError))
         logger.error(f"Database query failed: {query} with params {params}. Error: {e}", exc_info=True)
         raise
     finally:
         if cursor:
             cursor.close()
         if conn:
-            conn.close()
+            release_db_connection(conn, close=broken)
 
-def get_top_products(limit: int = 10) -> List[Dict[str, Any]]:
-    product_keywords_list = [
-        'paracetamol', 'amoxicillin', 'ibuprofen', 'azithromycin', 'omeprazole',
-        'cream', 'tablet', 'syrup', 'injection', 'vitamin', 'antibiotic',
-        'ointment', 'drops', 'capsule', 'suspension', 'vaccine', 'mask',
-        'sanitizer', 'gloves', 'thermometer', 'blood pressure monitor'
-    ]
+def get_top_products(limit: int = 10) -> Tuple[List[str], List[tuple]]:
+    """
+    Aggregates the precomputed marts.fct_product_mentions table (built from the spans the
+    keyword tagger writes); a message counts once towards every product it mentions.
+    """
+    query = """
+    SELECT
+        product_name AS product_keyword,
+        COUNT(*) AS mention_count
+    FROM marts.fct_product_mentions
+    GROUP BY product_name
+    ORDER BY mention_count DESC, product_name
+    LIMIT %s;
+    """
+    return fetch_rows(query, (limit,))
 
-    like_conditions = [f"fm.message_text ILIKE %s" for _ in product_keywords_list]
-    where_clause_parts = " OR ".join(like_conditions)
+ACTIVITY_GRANULARITIES = ('day', 'week', 'month')
 
-    like_params = [f"%{keyword}%" for keyword in product_keywords_list]
+def normalize_channel_username(channel_name: str) -> str:
+    """Matches marts.agg_channel_daily_activity.channel_username_normalized (lower-cased, no leading '@')."""
+    return channel_name.strip().lstrip('@').lower()
 
+def build_channel_activity_query(
+    channel_name: str,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    granularity: str = 'day'
+):
+    """
+    Reads a channel's activity from the marts.agg_channel_daily_activity rollup, summed per
+    day, week (starting Monday) or month. The username lookup and date range are served by
+    its (channel_username_normalized, activity_date) index.
+    """
+    if granularity not in ACTIVITY_GRANULARITIES:
+        raise ValueError(f"Unsupported granularity '{granularity}'. Expected one of {ACTIVITY_GRANULARITIES}.")
+    filters = []
+    params = [granularity, normalize_channel_username(channel_name)]
+    if date_from:
+        filters.append("AND activity_date >= %s")
+        params.append(date_from)
+    if date_to:
+        filters.append("AND activity_date <= %s")
+        params.append(date_to)
     query = f"""
-    WITH ProductMentions AS (
+    SELECT
+        date_trunc(%s, activity_date)::date AS message_date,
+        SUM(message_count)::bigint AS message_count,
+        SUM(total_views)::bigint AS total_views,
+        SUM(total_forwards)::bigint AS total_forwards,
+        SUM(media_message_count)::bigint AS media_message_count,
+        SUM(detection_count)::bigint AS detection_count
+    FROM marts.agg_channel_daily_activity
+    WHERE channel_username_normalized = %s
+      {' '.join(filters)}
+    GROUP BY 1
+    ORDER BY 1;
+    """
+    return query, tuple(params)
+
+def get_channel_activity(
+    channel_name: str,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    granularity: str = 'day'
+) -> Tuple[List[str], List[tuple]]:
+    query, params = build_channel_activity_query(channel_name, date_from, date_to, granularity)
+    return fetch_rows(query, params)
+
+SEARCH_SORT_OPTIONS = ('relevance', 'date')
+# The fields of schemas.MessageSearchResult. Search queries select them first, in this order,
+# so rows are serialized as they come; channel_id follows for the paging cursor only.
+SEARCH_RESULT_COLUMNS = ('message_id', 'message_text', 'message_date', 'channel_name', 'rank')
+EXPORT_FETCH_SIZE = 2000
+
+def escape_like(value: str) -> str:
+    """Escapes LIKE wildcards so user input is matched literally."""
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def encode_search_cursor(row: Dict[str, Any], sort: str) -> str:
+    """Opaque keyset cursor pointing just after `row` in the given sort order."""
+    position = [row['message_date'].isoformat(), row['message_id'], row['channel_id']]
+    if sort == 'relevance':
+        position.insert(0, float(row['rank']))
+    return base64.urlsafe_b64encode(json.dumps(position).encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_search_cursor(cursor: str, sort: str) -> list:
+    """Inverse of encode_search_cursor; raises ValueError for cursors that are malformed or from another sort."""
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        expected = 4 if sort == 'relevance' else 3
+        if not isinstance(position, list) or len(position) != expected:
+            raise ValueError
+        position[-3] = date.fromisoformat(position[-3])
+        return position
+    except (ValueError, TypeError, binascii.Error):
+        raise ValueError("Invalid cursor for this search.")
+
+def build_search_query(
+    query_str: str,
+    channel: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    sort: str = 'relevance',
+    after: Optional[list] = None,
+    limit: Optional[int] = None
+):
+    """
+    Builds the message search SQL shared by the paged endpoint and the streaming export.
+
+    A message matches when its tsvector (English stems plus 'simple' tokens, so Amharic
+    words are matched verbatim) matches the query, or when its text contains the query
+    as a substring (served by the pg_trgm index). Paging is keyset-based: `after` is the
+    decoded cursor of the last row of the previous page.
+    """
+    if sort not in SEARCH_SORT_OPTIONS:
+        raise ValueError(f"Unsupported sort '{sort}'. Expected one of {SEARCH_SORT_OPTIONS}.")
+
+    filters = []
+    filter_params = []
+    if channel:
+        # Exact username match, as for channel activity: stored usernames keep their leading '@'.
+        filters.append("AND fm.channel_id IN (SELECT dc.channel_id FROM marts.dim_channels dc "
+                       "WHERE LOWER(LTRIM(dc.channel_username, '@')) = %s)")
+        filter_params.append(normalize_channel_username(channel))
+    if date_from:
+        filters.append("AND fm.message_date >= %s")
+        filter_params.append(date_from)
+    if date_to:
+        filters.append("AND fm.message_date <= %s")
+        filter_params.append(date_to)
+
+    sort_columns = ['message_date', 'message_id', 'channel_id']
+    if sort == 'relevance':
+        sort_columns.insert(0, 'rank')
+    keyset = ''
+    keyset_params = []
+    if after:
+        placeholders = ['%s::real' if column == 'rank' else '%s' for column in sort_columns]
+        keyset = f"WHERE ({', '.join(sort_columns)}) < ({', '.join(placeholders)})"
+        keyset_params = list(after)
+
+    query = f"""
+    WITH search AS (
+        SELECT websearch_to_tsquery('english', %s) || websearch_to_tsquery('simple', %s) AS tsquery
+    ),
+    matches AS (
         SELECT
-            CASE
-                WHEN fm.message_text ILIKE '%paracetamol%' THEN 'Paracetamol'
-                WHEN fm.message_text ILIKE '%amoxicillin%' THEN 'Amoxicillin'
-                WHEN fm.message_text ILIKE '%ibuprofen%' THEN 'Ibuprofen'
-                WHEN fm.message_text ILIKE '%cream%' THEN 'Cream'
-                WHEN fm.message_text ILIKE '%tablet%' THEN 'Tablet'
-                WHEN fm.message_text ILIKE '%syrup%' THEN 'Syrup'
-                WHEN fm.message_text ILIKE '%injection%' THEN 'Injection'
-                WHEN fm.message_text ILIKE '%vitamin%' THEN 'Vitamin'
-                WHEN fm.message_text ILIKE '%antibiotic%' THEN 'Antibiotic'
-                WHEN fm.message_text ILIKE '%ointment%' THEN 'Ointment'
-                WHEN fm.message_text ILIKE '%drops%' THEN 'Drops'
-                WHEN fm.message_text ILIKE '%capsule%' THEN 'Capsule'
-                WHEN fm.message_text ILIKE '%vaccine%' THEN 'Vaccine'
-                WHEN fm.message_text ILIKE '%mask%' THEN 'Mask'
-                WHEN fm.message_text ILIKE '%sanitizer%' THEN 'Sanitizer'
-                WHEN fm.message_text ILIKE '%gloves%' THEN 'Gloves'
-                WHEN fm.message_text ILIKE '%thermometer%' THEN 'Thermometer'
-                WHEN fm.message_text ILIKE '%blood pressure monitor%' THEN 'Blood Pressure Monitor'
-                ELSE NULL
-            END AS product_keyword
+            fm.message_id,
+            fm.channel_id,
+            fm.message_text,
+            fm.message_date,
+            ts_rank_cd(fm.message_search_vector, search.tsquery) AS rank
         FROM marts.fct_messages fm
-        WHERE fm.message_text IS NOT NULL
-          AND (
-            {where_clause_parts}
-          )
+        CROSS JOIN search
+        WHERE (fm.message_search_vector @@ search.tsquery OR fm.message_text ILIKE %s)
+          {' '.join(filters)}
+    ),
+    page AS (
+        SELECT * FROM matches
+        {keyset}
+        ORDER BY {', '.join(f'{column} DESC' for column in sort_columns)}
+        {'LIMIT %s' if limit is not None else ''}
     )
     SELECT
-        product_keyword,
-        COUNT(*) AS mention_count
-    FROM ProductMentions
-    WHERE product_keyword IS NOT NULL
-    GROUP BY product_keyword
-    ORDER BY mention_count DESC
-    LIMIT %s;
+        page.message_id,
+        page.message_text,
+        page.message_date,
+        (
+            SELECT COALESCE(dc.channel_title, dc.channel_username)
+            FROM marts.dim_channels dc
+            WHERE dc.channel_id = page.channel_id
+            ORDER BY dc.latest_scraped_date DESC
+            LIMIT 1
+        ) AS channel_name,
+        page.rank,
+        page.channel_id
+    FROM page
+    ORDER BY {', '.join(f'page.{column} DESC' for column in sort_columns)};
     """
-    all_params = tuple(like_params + [limit])
-    return fetch_data(query, all_params)
+    params = [query_str, query_str, f"%{escape_like(query_str)}%"] + filter_params + keyset_params
+    if limit is not None:
+        params.append(limit)
+    return query, tuple(params)
 
-def get_channel_activity(channel_name: str) -> List[Dict[str, Any]]:
-    query = """
-    SELECT
-        dd.date_day AS message_date,
-        COUNT(fm.message_pk) AS message_count
-    FROM marts.fct_messages fm
-    JOIN marts.dim_channels dc ON fm.channel_id = dc.channel_id
-    JOIN marts.dim_dates dd ON fm.date_key = dd.date_key
-    WHERE dc.channel_username ILIKE %s
-    GROUP BY dd.date_day
-    ORDER BY dd.date_day;
+def search_messages(
+    query_str: str,
+    channel: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    sort: str = 'relevance',
+    limit: int = 100,
+    cursor: Optional[str] = None
+) -> Tuple[List[str], List[tuple], Optional[str]]:
+    """
+    Returns the columns and rows of one page of search results and the cursor of the next
+    page (None on the last page).
+    Results are ranked with ts_rank_cd or ordered by date, and can be limited to one channel
+    and a date range.
     """
-    return fetch_data(query, (channel_name,))
+    after = decode_search_cursor(cursor, sort) if cursor else None
+    query, params = build_search_query(query_str, channel, date_from, date_to, sort, after, limit + 1)
+    columns, rows = fetch_rows(query, params)
+    next_cursor = encode_search_cursor(dict(zip(columns, rows[limit - 1])), sort) if len(rows) > limit else None
+    return columns, rows[:limit], next_cursor
 
-def search_messages(query_str: str) -> List[Dict[str, Any]]:
-    search_pattern = f"%{query_str}%"
-    query = """
-    SELECT
-        fm.message_id,
-        fm.message_text,
-        dd.date_day AS message_date,
-        dc.channel_name
-    FROM marts.fct_messages fm
-    JOIN marts.dim_channels dc ON fm.channel_id = dc.channel_id
-    JOIN marts.dim_dates dd ON fm.date_key = dd.date_key
-    WHERE fm.message_text ILIKE %s
-    ORDER BY dd.date_day DESC, fm.message_id DESC
-    LIMIT 100;
+class QueryStream:
+    """
+    A query read through a server-side (named) cursor on its own export connection,
+    `fetch_size` rows per round trip, so an export of any size is held in memory one batch
+    at a time. Opening the stream runs the query and fetches the first batch, so errors
+    surface before a response is started; later batches come from fetch_next().
     """
-    return fetch_data(query, (search_pattern,))
\ No newline at end of file
+    def __init__(self, query: str, params: Optional[tuple] = None, fetch_size: int = EXPORT_FETCH_SIZE):
+        self.fetch_size = fetch_size
+        self._close_lock = threading.Lock()
+        self._conn = open_export_connection()
+        try:
+            self._cursor = self._conn.cursor(name=f"export_{uuid.uuid4().hex}")
+            self._cursor.execute(query, params)
+            self.first_batch = self._cursor.fetchmany(fetch_size)
+            # A named cursor only has a description once the first batch is fetched.
+            self.columns = [column[0] for column in self._cursor.description]
+        except Exception as e:
+            logger.error(f"Streaming query failed: {query} with params {params}. Error: {e}", exc_info=True)
+            self.close()
+            raise
+
+    def fetch_next(self) -> List[tuple]:
+        """Fetches the next batch of rows; an empty list once the result is exhausted."""
+        try:
+            return self._cursor.fetchmany(self.fetch_size)
+        except Exception as e:
+            logger.error(f"Streaming query failed while fetching rows. Error: {e}", exc_info=True)
+            raise
+
+    def close(self):
+        """
+        Closes the export connection, which also drops the cursor and its transaction.
+        Safe to call more than once: the response's cleanup task closes it after the body did.
+        """
+        with self._close_lock:
+            conn, self._conn = self._conn, None
+        if conn is not None:
+            close_export_connection(conn)
+
+def stream_search_messages(
+    query_str: str,
+    channel: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None
+) -> QueryStream:
+    """Opens a stream of every matching message, newest first."""
+    query, params = build_search_query(query_str, channel, date_from, date_to, sort='date')
+    return QueryStream(query, params)
+
+def stream_channel_activity(
+    channel_name: str,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    granularity: str = 'day'
+) -> QueryStream:
+    """Opens a stream of a channel's activity per period, oldest first."""
+    query, params = build_channel_activity_query(channel_name, date_from, date_to, granularity)
+    return QueryStream(query, params)
@@ -1,6 +1,12 @@
 import os
+import time
+import asyncio
+import functools
+import threading
 import psycopg2
+import psycopg2.pool
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -15,19 +21,213 @@ DB_PASSWORD = os.getenv("POSTGRES_PASSWORD")
 DB_HOST = os.getenv("POSTGRES_HOST")
 DB_PORT = os.getenv("POSTGRES_PORT")
 
-def get_db_connection():
-    """Establishes and returns a new PostgreSQL database connection."""
-    conn = None
-    try:
-        conn = psycopg2.connect(
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_POOL_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "10"))
+# Connections idle for longer than this are pinged before being handed out.
+DB_POOL_IDLE_CHECK_SECONDS = float(os.getenv("DB_POOL_IDLE_CHECK_SECONDS", "30"))
+# Threads running blocking queries for async endpoints; defaults to one per pooled connection.
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", str(DB_POOL_MAX_SIZE)))
+# Streaming exports keep a connection for the whole download, so they get their own
+# connections outside the pool, at most this many at a time.
+DB_EXPORT_MAX_CONNECTIONS = int(os.getenv("DB_EXPORT_MAX_CONNECTIONS", "4"))
+
+class DatabasePool:
+    """
+    Process-wide pool of PostgreSQL connections shared by all API requests.
+
+    Wraps psycopg2's ThreadedConnectionPool, which fails immediately once `max_size`
+    connections are checked out, with a semaphore so callers wait (up to `timeout`
+    seconds) for a connection instead. Connections that sat idle for longer than
+    `idle_check_seconds` are checked with `SELECT 1` and replaced if they are dead.
+    """
+    def __init__(self, min_size=DB_POOL_MIN_SIZE, max_size=DB_POOL_MAX_SIZE,
+                 timeout=DB_POOL_TIMEOUT_SECONDS, idle_check_seconds=DB_POOL_IDLE_CHECK_SECONDS):
+        self.min_size = min_size
+        self.max_size = max(max_size, min_size, 1)
+        self.timeout = timeout
+        self.idle_check_seconds = idle_check_seconds
+        self._pool = psycopg2.pool.ThreadedConnectionPool(
+            min_size,
+            self.max_size,
             dbname=DB_NAME,
             user=DB_USER,
             password=DB_PASSWORD,
             host=DB_HOST,
             port=DB_PORT
         )
-        logger.debug("Successfully connected to PostgreSQL database.")
+        self._slots = threading.BoundedSemaphore(self.max_size)
+        self._lock = threading.Lock()
+        self._returned_at = {}
+        self._stats = {
+            'checkouts': 0,
+            'wait_seconds_total': 0.0,
+            'wait_seconds_max': 0.0,
+            'timeouts': 0,
+            'discarded': 0
+        }
+        self._in_use = 0
+
+    def _is_healthy(self, conn):
+        if conn.closed:
+            return False
+        returned_at = self._returned_at.get(id(conn))
+        if returned_at is None or time.monotonic() - returned_at < self.idle_check_seconds:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1;")
+            conn.rollback()
+            return True
+        except psycopg2.Error as e:
+            logger.warning(f"Discarding idle PostgreSQL connection that failed its health check: {e}")
+            return False
+
+    def getconn(self):
+        """Checks out a connection, waiting for a free one for at most `timeout` seconds."""
+        wait_started_at = time.monotonic()
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self._stats['timeouts'] += 1
+            raise ConnectionError(f"Timed out after {self.timeout}s waiting for a database connection "
+                                  f"({self.max_size} connections in use).")
+        waited = time.monotonic() - wait_started_at
+        try:
+            conn = self._pool.getconn()
+            while not self._is_healthy(conn):
+                self._discard(conn)
+                conn = self._pool.getconn()
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._returned_at.pop(id(conn), None)
+            self._in_use += 1
+            self._stats['checkouts'] += 1
+            self._stats['wait_seconds_total'] += waited
+            self._stats['wait_seconds_max'] = max(self._stats['wait_seconds_max'], waited)
+        return conn
+
+    def _discard(self, conn):
+        with self._lock:
+            self._returned_at.pop(id(conn), None)
+            self._stats['discarded'] += 1
+        self._pool.putconn(conn, close=True)
+
+    def putconn(self, conn, close=False):
+        """Returns a connection; broken connections (or close=True) are closed instead of reused."""
+        try:
+            if close or conn.closed:
+                self._discard(conn)
+            else:
+                self._pool.putconn(conn)
+                with self._lock:
+                    self._returned_at[id(conn)] = time.monotonic()
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            checkouts = self._stats['checkouts']
+            return {
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'in_use': self._in_use,
+                'idle': len(self._pool._pool),
+                'checkouts': checkouts,
+                'wait_seconds_avg': self._stats['wait_seconds_total'] / checkouts if checkouts else 0.0,
+                'wait_seconds_max': self._stats['wait_seconds_max'],
+                'timeouts': self._stats['timeouts'],
+                'discarded': self._stats['discarded']
+            }
+
+    def close(self):
+        self._pool.closeall()
+
+_db_pool = None
+_db_executor = None
+_db_pool_lock = threading.Lock()
+_export_slots = threading.BoundedSemaphore(max(1, DB_EXPORT_MAX_CONNECTIONS))
+
+def init_db_pool():
+    """Creates the process-wide connection pool and query executor (called on API startup)."""
+    global _db_pool, _db_executor
+    with _db_pool_lock:
+        if _db_executor is None:
+            _db_executor = ThreadPoolExecutor(max_workers=max(1, DB_EXECUTOR_WORKERS), thread_name_prefix='db-query')
+        if _db_pool is None:
+            try:
+                _db_pool = DatabasePool()
+            except psycopg2.Error as e:
+                logger.error(f"Error connecting to PostgreSQL database: {e}", exc_info=True)
+                raise ConnectionError("Could not connect to the database.") from e
+            logger.info(f"PostgreSQL connection pool created (min {_db_pool.min_size}, max {_db_pool.max_size}).")
+        return _db_pool
+
+def close_db_pool():
+    """Closes every pooled connection (called on API shutdown)."""
+    global _db_pool, _db_executor
+    with _db_pool_lock:
+        if _db_executor is not None:
+            _db_executor.shutdown(wait=True)
+            _db_executor = None
+        if _db_pool is not None:
+            _db_pool.close()
+            _db_pool = None
+            logger.info("PostgreSQL connection pool closed.")
+
+def get_db_connection():
+    """Checks out a PostgreSQL connection from the pool; return it with release_db_connection()."""
+    pool = _db_pool or init_db_pool()
+    try:
+        conn = pool.getconn()
+        logger.debug("Checked out a PostgreSQL connection from the pool.")
         return conn
     except psycopg2.Error as e:
         logger.error(f"Error connecting to PostgreSQL database: {e}", exc_info=True)
         raise ConnectionError("Could not connect to the database.") from e
+
+def release_db_connection(conn, close=False):
+    """Returns a connection checked out with get_db_connection() to the pool."""
+    if _db_pool is None:
+        conn.close()
+        return
+    _db_pool.putconn(conn, close=close)
+
+def open_export_connection():
+    """
+    Opens a connection outside the pool for a streaming export, waiting (up to the pool
+    timeout) while DB_EXPORT_MAX_CONNECTIONS exports are running. Close it with
+    close_export_connection().
+    """
+    if not _export_slots.acquire(timeout=DB_POOL_TIMEOUT_SECONDS):
+        raise ConnectionError(f"Timed out after {DB_POOL_TIMEOUT_SECONDS}s waiting for an export connection "
+                              f"({DB_EXPORT_MAX_CONNECTIONS} exports running).")
+    try:
+        return psycopg2.connect(dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT)
+    except psycopg2.Error as e:
+        _export_slots.release()
+        logger.error(f"Error connecting to PostgreSQL database: {e}", exc_info=True)
+        raise ConnectionError("Could not connect to the database.") from e
+
+def close_export_connection(conn):
+    try:
+        conn.close()
+    finally:
+        _export_slots.release()
+
+def get_db_pool_stats():
+    """Returns pool usage counters, or None before the pool is created."""
+    return _db_pool.stats() if _db_pool is not None else None
+
+async def run_db_query(func, *args, **kwargs):
+    """
+    Runs a blocking data-layer call (e.g. a crud function) on the bounded query executor,
+    so a slow query only occupies one executor thread instead of the event loop.
+    """
+    if _db_executor is None:
+        init_db_pool()
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_db_executor, functools.partial(func, *args, **kwargs))
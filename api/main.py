@@ -1,6 +1,13 @@
-from fastapi import FastAPI, HTTPException, Query, Path
-from typing import List
-from api import crud, schemas
+from fastapi import FastAPI, HTTPException, Query, Path, Request, Response
+from fastapi.responses import StreamingResponse
+from typing import List, Optional, Literal
+from datetime import date
+from api import crud, schemas, database
+from api.cache import response_cache, if_none_match
+from api.serialization import FastJSONResponse, api_payload, dumps, row_records, add_compression_middleware
+import io
+import csv
+import asyncio
 import logging
 
 logging.basicConfig(level=logging.INFO,
@@ -10,8 +17,114 @@ logger = logging.getLogger(__name__)
 app = FastAPI(
     title="Telegram Health Insights API",
     description="Analytical API to query insights from Ethiopian medical Telegram channels.",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=FastJSONResponse
 )
+add_compression_middleware(app)
+
+@app.on_event("startup")
+def open_database_pool():
+    try:
+        database.init_db_pool()
+    except ConnectionError:
+        # Keep serving; the pool is created on the first request once the database is reachable.
+        logger.exception("Could not create the database connection pool on startup.")
+
+@app.on_event("shutdown")
+def close_database_pool():
+    database.close_db_pool()
+
+async def cached_json_response(request: Request, endpoint: str, params: dict, build_payload):
+    """
+    Serves an endpoint's payload from the response cache, keyed on its parameters and the
+    warehouse data version. Responses carry an ETag; a matching If-None-Match gets a 304.
+    The serialized body is cached, so hits skip serialization as well as the query.
+    """
+    version = await database.run_db_query(response_cache.data_version)
+    key = response_cache.make_key(endpoint, params, version)
+    headers = {'ETag': response_cache.make_etag(key), 'Cache-Control': 'no-cache'}
+    if if_none_match(request.headers.get('if-none-match'), headers['ETag']):
+        response_cache.record('not_modified')
+        return Response(status_code=304, headers=headers)
+
+    body = response_cache.get(key)
+    if body is None:
+        body = dumps(await build_payload()).decode('utf-8')
+        response_cache.set(key, body)
+    return Response(content=body, media_type='application/json', headers=headers)
+
+EXPORT_MEDIA_TYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+async def iter_export_chunks(stream, columns, export_format):
+    """
+    Serializes the rows of a crud.QueryStream as NDJSON or CSV, one chunk per fetched batch.
+    Later batches are fetched on the bounded query executor; the stream is closed when the
+    download ends or the client goes away.
+    """
+    positions = [stream.columns.index(column) for column in columns]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if export_format == 'csv' else None
+    if writer:
+        writer.writerow(columns)
+    try:
+        batch = stream.first_batch
+        while batch:
+            for row in batch:
+                values = [row[position] for position in positions]
+                if writer:
+                    writer.writerow(values)
+                else:
+                    buffer.write(dumps(dict(zip(columns, values))).decode('utf-8') + '\n')
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            batch = await database.run_db_query(stream.fetch_next)
+        if buffer.tell():
+            yield buffer.getvalue()
+    except Exception:
+        # The status line is already sent; the client sees a truncated body.
+        logger.exception("Export failed after the response was started.")
+        raise
+    finally:
+        await asyncio.shield(database.run_db_query(stream.close))
+
+async def open_export_stream(stream_func, **kwargs):
+    """
+    Opens a crud.QueryStream on the query executor. The query and its first batch run before
+    the response starts, so failures get a proper status. If the request is cancelled while
+    the query runs, the stream is closed once it has opened instead of holding its connection.
+    """
+    future = asyncio.ensure_future(database.run_db_query(stream_func, **kwargs))
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        future.add_done_callback(
+            lambda done: done.cancelled() or done.exception() is not None or done.result().close())
+        raise
+
+class ExportStreamingResponse(StreamingResponse):
+    """
+    Closes its crud.QueryStream however the response ends, including when the body is never
+    iterated (the client left, or sending the status line failed). Starlette skips background
+    tasks when sending fails, so the close is not left to one.
+    """
+    def __init__(self, stream, content, **kwargs):
+        super().__init__(content, **kwargs)
+        self.stream = stream
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await asyncio.shield(database.run_db_query(self.stream.close))
+
+def export_response(stream, columns, export_format, filename):
+    return ExportStreamingResponse(
+        stream,
+        iter_export_chunks(stream, columns, export_format),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={'Content-Disposition': f'attachment; filename="{filename}.{export_format}"'}
+    )
 
 @app.get("/", include_in_schema=False)
 async def read_root():
@@ -24,15 +137,15 @@ async def read_root():
     description="Returns the top N most frequently mentioned medical products or drugs based on keyword matching in message text."
 )
 async def get_top_products_report(
+    request: Request,
     limit: int = Query(10, gt=0, description="Number of top products to return.")
 ):
+    async def build_payload():
+        columns, rows = await database.run_db_query(crud.get_top_products, limit=limit)
+        return api_payload(row_records(columns, rows), f"Successfully retrieved top {limit} products.")
+
     try:
-        data = crud.get_top_products(limit=limit)
-        return schemas.APIResponse(
-            status="success",
-            message=f"Successfully retrieved top {limit} products.",
-            data=[schemas.TopProduct(**item) for item in data]
-        )
+        return await cached_json_response(request, 'top-products', {'limit': limit}, build_payload)
     except Exception as e:
         logger.exception("Error retrieving top products report.")
         raise HTTPException(status_code=500, detail=f"Internal Server Error: {e}")
@@ -41,48 +154,139 @@ async def get_top_products_report(
     "/api/channels/{channel_name}/activity",
     response_model=schemas.APIResponse[List[schemas.ChannelActivity]],
     summary="Get posting activity for a specific channel",
-    description="Returns the daily message posting activity for a given Telegram channel."
+    description="Returns message, view, forward, media and detection counts of a Telegram channel per day, week or month, "
+                "read from the pre-aggregated marts.agg_channel_daily_activity rollup."
 )
 async def get_channel_posting_activity(
-    channel_name: str = Path(..., description="The exact username of the Telegram channel (e.g., 'CheMed123').")
+    request: Request,
+    channel_name: str = Path(..., description="The username of the Telegram channel, case-insensitive (e.g., 'CheMed123')."),
+    date_from: Optional[date] = Query(None, description="Only include activity on or after this date."),
+    date_to: Optional[date] = Query(None, description="Only include activity on or before this date."),
+    granularity: Literal['day', 'week', 'month'] = Query('day', description="Aggregate per 'day', 'week' or 'month'.")
 ):
-    try:
-        data = crud.get_channel_activity(channel_name=channel_name)
-        if not data:
+    if date_from and date_to and date_from > date_to:
+        raise HTTPException(status_code=400, detail="date_from must not be after date_to.")
+
+    async def build_payload():
+        columns, rows = await database.run_db_query(crud.get_channel_activity, channel_name=channel_name,
+                                                    date_from=date_from, date_to=date_to, granularity=granularity)
+        if not rows:
             raise HTTPException(status_code=404, detail=f"Channel '{channel_name}' not found or no activity.")
-        return schemas.APIResponse(
-            status="success",
-            message=f"Successfully retrieved activity for channel '{channel_name}'.",
-            data=[schemas.ChannelActivity(**item) for item in data]
-        )
+        return api_payload(row_records(columns, rows), f"Successfully retrieved activity for channel '{channel_name}'.")
+
+    params = {'channel_name': crud.normalize_channel_username(channel_name), 'date_from': date_from,
+              'date_to': date_to, 'granularity': granularity}
+    try:
+        return await cached_json_response(request, 'channel-activity', params, build_payload)
     except HTTPException:
         raise
     except Exception as e:
         logger.exception(f"Error retrieving activity for channel '{channel_name}'.")
         raise HTTPException(status_code=500, detail=f"Internal Server Error: {e}")
 
+@app.get(
+    "/api/channels/{channel_name}/activity/export",
+    summary="Export posting activity for a channel",
+    description="Streams the channel's full posting activity per day, week or month as NDJSON or CSV."
+)
+async def export_channel_posting_activity(
+    channel_name: str = Path(..., description="The username of the Telegram channel, case-insensitive (e.g., 'CheMed123')."),
+    date_from: Optional[date] = Query(None, description="Only include activity on or after this date."),
+    date_to: Optional[date] = Query(None, description="Only include activity on or before this date."),
+    granularity: Literal['day', 'week', 'month'] = Query('day', description="Aggregate per 'day', 'week' or 'month'."),
+    format: Literal['ndjson', 'csv'] = Query('ndjson', description="Export format.")
+):
+    if date_from and date_to and date_from > date_to:
+        raise HTTPException(status_code=400, detail="date_from must not be after date_to.")
+    try:
+        stream = await open_export_stream(crud.stream_channel_activity, channel_name=channel_name,
+                                          date_from=date_from, date_to=date_to, granularity=granularity)
+    except Exception as e:
+        logger.exception(f"Error exporting activity for channel '{channel_name}'.")
+        raise HTTPException(status_code=500, detail=f"Internal Server Error: {e}")
+    return export_response(stream, list(schemas.ChannelActivity.model_fields), format, f"{channel_name}-activity")
+
 @app.get(
     "/api/search/messages",
-    response_model=schemas.APIResponse[List[schemas.MessageSearchResult]],
+    response_model=schemas.PaginatedAPIResponse[List[schemas.MessageSearchResult]],
     summary="Search for messages by keyword",
-    description="Searches for Telegram messages containing a specific keyword in their text content."
+    description="Full-text search over Telegram message text (English stemming plus verbatim Amharic tokens, "
+                "with substring matches), ranked by relevance or ordered by date."
 )
 async def search_telegram_messages(
-    query: str = Query(..., min_length=3, description="The keyword or phrase to search for in messages.")
+    query: str = Query(..., min_length=3, description="The keyword or phrase to search for in messages."),
+    channel: Optional[str] = Query(None, description="Only search messages of this channel username."),
+    date_from: Optional[date] = Query(None, description="Only search messages posted on or after this date."),
+    date_to: Optional[date] = Query(None, description="Only search messages posted on or before this date."),
+    sort: Literal['relevance', 'date'] = Query('relevance', description="Order by 'relevance' or 'date'."),
+    limit: int = Query(100, gt=0, le=500, description="Maximum number of messages per page."),
+    cursor: Optional[str] = Query(None, description="The next_cursor of the previous page, to fetch the page after it.")
 ):
+    if date_from and date_to and date_from > date_to:
+        raise HTTPException(status_code=400, detail="date_from must not be after date_to.")
     try:
-        data = crud.search_messages(query_str=query)
-        if not data:
-            return schemas.APIResponse(
-                status="success",
-                message=f"No messages found for query '{query}'.",
-                data=[]
-            )
-        return schemas.APIResponse(
-            status="success",
-            message=f"Successfully found {len(data)} messages for query '{query}'.",
-            data=[schemas.MessageSearchResult(**item) for item in data]
-        )
+        _, rows, next_cursor = await database.run_db_query(crud.search_messages, query_str=query, channel=channel,
+                                                           date_from=date_from, date_to=date_to, sort=sort,
+                                                           limit=limit, cursor=cursor)
+        if not rows:
+            return FastJSONResponse(api_payload([], f"No messages found for query '{query}'.", next_cursor=None))
+        return FastJSONResponse(api_payload(row_records(crud.SEARCH_RESULT_COLUMNS, rows),
+                                            f"Successfully found {len(rows)} messages for query '{query}'.",
+                                            next_cursor=next_cursor))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.exception(f"Error searching messages for query '{query}'.")
-        raise HTTPException(status_code=500, detail=f"Internal Server Error: {e}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Internal Server Error: {e}")
+
+@app.get(
+    "/api/export/messages",
+    summary="Export messages matching a search",
+    description="Streams every message matching the search (newest first) as NDJSON or CSV, without a result limit."
+)
+async def export_telegram_messages(
+    query: str = Query(..., min_length=3, description="The keyword or phrase to search for in messages."),
+    channel: Optional[str] = Query(None, description="Only export messages of this channel username."),
+    date_from: Optional[date] = Query(None, description="Only export messages posted on or after this date."),
+    date_to: Optional[date] = Query(None, description="Only export messages posted on or before this date."),
+    format: Literal['ndjson', 'csv'] = Query('ndjson', description="Export format.")
+):
+    if date_from and date_to and date_from > date_to:
+        raise HTTPException(status_code=400, detail="date_from must not be after date_to.")
+    try:
+        stream = await open_export_stream(crud.stream_search_messages, query_str=query, channel=channel,
+                                          date_from=date_from, date_to=date_to)
+    except Exception as e:
+        logger.exception(f"Error exporting messages for query '{query}'.")
+        raise HTTPException(status_code=500, detail=f"Internal Server Error: {e}")
+    return export_response(stream, ['message_id', 'channel_id', 'message_date', 'channel_name', 'message_text'],
+                           format, "messages")
+
+@app.get(
+    "/api/health/db-pool",
+    response_model=schemas.APIResponse[schemas.DatabasePoolStats],
+    summary="Get database connection pool statistics",
+    description="Returns the size, usage and wait-time counters of the API's PostgreSQL connection pool."
+)
+async def get_database_pool_stats():
+    stats = database.get_db_pool_stats()
+    if stats is None:
+        raise HTTPException(status_code=503, detail="Database connection pool is not initialised.")
+    return schemas.APIResponse(
+        status="success",
+        message="Successfully retrieved database pool statistics.",
+        data=schemas.DatabasePoolStats(**stats)
+    )
+
+@app.get(
+    "/api/health/cache",
+    response_model=schemas.APIResponse[schemas.ResponseCacheStats],
+    summary="Get response cache statistics",
+    description="Returns hit/miss counters of the response cache and the warehouse data version it is keyed on."
+)
+async def get_response_cache_stats():
+    return schemas.APIResponse(
+        status="success",
+        message="Successfully retrieved response cache statistics.",
+        data=schemas.ResponseCacheStats(**response_cache.stats())
+    )
@@ -9,16 +9,47 @@ class TopProduct(BaseModel):
     mention_count: int = Field(..., description="The number of times the product keyword was mentioned.")
 
 class ChannelActivity(BaseModel):
-    message_date: date = Field(..., description="The date of the activity.")
-    message_count: int = Field(..., description="The number of messages posted on that date.")
+    message_date: date = Field(..., description="The date of the activity, or the first day of its week or month.")
+    message_count: int = Field(..., description="The number of messages posted in the period.")
+    total_views: int = Field(0, description="Views of the messages posted in the period.")
+    total_forwards: int = Field(0, description="Forwards of the messages posted in the period.")
+    media_message_count: int = Field(0, description="Messages with media posted in the period.")
+    detection_count: int = Field(0, description="Objects detected in the period's images.")
 
 class MessageSearchResult(BaseModel):
     message_id: int = Field(..., description="Unique ID of the Telegram message.")
     message_text: Optional[str] = Field(None, description="The full text of the message.")
     message_date: date = Field(..., description="The date the message was posted.")
     channel_name: Optional[str] = Field(None, description="The name of the Telegram channel.")
+    rank: float = Field(0.0, description="Full-text relevance of the message to the query (0 for substring-only matches).")
+
+class DatabasePoolStats(BaseModel):
+    min_size: int = Field(..., description="Connections opened when the pool is created.")
+    max_size: int = Field(..., description="Maximum number of open connections.")
+    in_use: int = Field(..., description="Connections currently checked out by requests.")
+    idle: int = Field(..., description="Open connections waiting in the pool.")
+    checkouts: int = Field(..., description="Connections handed out since startup.")
+    wait_seconds_avg: float = Field(..., description="Average time requests waited for a connection.")
+    wait_seconds_max: float = Field(..., description="Longest time a request waited for a connection.")
+    timeouts: int = Field(..., description="Requests that gave up waiting for a connection.")
+    discarded: int = Field(..., description="Broken or unhealthy connections closed instead of reused.")
+
+class ResponseCacheStats(BaseModel):
+    backend: str = Field(..., description="Cache backend in use.")
+    entries: int = Field(..., description="Entries held by an in-process backend (0 for shared backends).")
+    data_version: Optional[int] = Field(None, description="Warehouse data version cached responses are keyed on.")
+    hits: int = Field(..., description="Responses served from the cache.")
+    misses: int = Field(..., description="Responses computed because they were not cached.")
+    not_modified: int = Field(..., description="Requests answered with 304 Not Modified.")
+    errors: int = Field(..., description="Cache backend reads or writes that failed.")
 
 class APIResponse(BaseModel, Generic[T]):
     status: str = Field("success", description="Status of the API request.")
     message: Optional[str] = Field(None, description="A descriptive message for the response.")
-    data: Optional[T] = Field(None, description="The main data payload of the response.")
\ No newline at end of file
+    data: Optional[T] = Field(None, description="The main data payload of the response.")
+
+class PaginatedAPIResponse(BaseModel, Generic[T]):
+    status: str = Field("success", description="Status of the API request.")
+    message: Optional[str] = Field(None, description="A descriptive message for the response.")
+    data: Optional[T] = Field(None, description="The page of results.")
+    next_cursor: Optional[str] = Field(None, description="Pass as `cursor` to fetch the next page; null on the last page.")
@@ -0,0 +1,66 @@
+import os
+import json
+import decimal
+import datetime
+import logging
+from starlette.responses import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# gzip (built in), brotli (needs the optional 'brotli-asgi' package, falls back to gzip) or none.
+API_COMPRESSION = os.getenv("API_COMPRESSION", "gzip")
+API_COMPRESSION_MIN_BYTES = int(os.getenv("API_COMPRESSION_MIN_BYTES", "1024"))
+
+def _default(value):
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (datetime.date, datetime.datetime, datetime.time)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(content) -> bytes:
+    """Serializes API payloads built from database rows; uses orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default)
+    return json.dumps(content, ensure_ascii=False, separators=(',', ':'), default=_default).encode('utf-8')
+
+def api_payload(data, message, status="success", **extra):
+    """
+    The APIResponse envelope as a plain dict. Rows coming from our own queries already have
+    the documented shape, so they are not re-validated through the pydantic schemas.
+    """
+    payload = {"status": status, "message": message, "data": data}
+    payload.update(extra)
+    return payload
+
+def row_records(columns, rows):
+    """
+    JSON objects for row tuples, built once at serialization time. Queries select the
+    documented fields first, so trailing values past `columns` (e.g. paging keys) are dropped.
+    """
+    return [dict(zip(columns, row)) for row in rows]
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return content if isinstance(content, bytes) else dumps(content)
+
+def add_compression_middleware(app):
+    """Compresses responses above API_COMPRESSION_MIN_BYTES according to API_COMPRESSION."""
+    if API_COMPRESSION == 'none':
+        return
+    if API_COMPRESSION == 'brotli':
+        try:
+            from brotli_asgi import BrotliMiddleware
+            app.add_middleware(BrotliMiddleware, minimum_size=API_COMPRESSION_MIN_BYTES)
+            return
+        except ImportError:
+            logger.warning("API_COMPRESSION=brotli but 'brotli-asgi' is not installed; using gzip.")
+    from starlette.middleware.gzip import GZipMiddleware
+    app.add_middleware(GZipMiddleware, minimum_size=API_COMPRESSION_MIN_BYTES)
@@ -0,0 +1,18 @@
+{% macro bump_api_data_version() %}
+  {#- Called from on-run-end: every build that may change the marts bumps the version the API
+      response cache is keyed on, so cached responses never outlive a pipeline run. -#}
+  {% if execute and flags.WHICH in ('run', 'build', 'seed', 'snapshot') %}
+    CREATE TABLE IF NOT EXISTS marts.api_data_version (
+      singleton BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (singleton),
+      version BIGINT NOT NULL,
+      updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+    INSERT INTO marts.api_data_version (singleton, version)
+    VALUES (TRUE, 1)
+    ON CONFLICT (singleton) DO UPDATE SET
+      version = marts.api_data_version.version + 1,
+      updated_at = CURRENT_TIMESTAMP;
+  {% else %}
+    SELECT 1;
+  {% endif %}
+{% endmacro %}
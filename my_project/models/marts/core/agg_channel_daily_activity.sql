@@ -0,0 +1,78 @@
+{{ config(
+    materialized='incremental',
+    unique_key=['channel_id', 'activity_date'],
+    incremental_strategy='delete+insert',
+    schema='marts',
+    indexes=[
+      {'columns': ['channel_username_normalized', 'activity_date']},
+      {'columns': ['channel_id', 'activity_date'], 'unique': True},
+      {'columns': ['last_loaded_at']}
+    ],
+    post_hook="UPDATE {{ this }} a SET channel_username_normalized = LOWER(LTRIM(dc.channel_username, '@')) FROM {{ ref('dim_channels') }} dc WHERE dc.channel_id = a.channel_id AND a.channel_username_normalized IS DISTINCT FROM LOWER(LTRIM(dc.channel_username, '@'));"
+) }}
+
+-- One row per channel and day, read by /api/channels/{name}/activity. Incremental runs only
+-- recompute the days that received new or re-loaded messages or new image detections; the
+-- post_hook keeps the lookup username of untouched days in step with renamed channels.
+
+WITH fct_messages AS (
+    SELECT * FROM {{ ref('fct_messages') }}
+),
+{% if is_incremental() %}
+watermark AS (
+    SELECT COALESCE(MAX(last_loaded_at), '-infinity') AS loaded_at FROM {{ this }}
+),
+touched_days AS (
+    SELECT fm.channel_id, fm.message_date
+    FROM fct_messages fm
+    WHERE fm.loaded_at >= (SELECT loaded_at FROM watermark)
+    UNION
+    SELECT fm.channel_id, fm.message_date
+    FROM {{ ref('fct_image_detections') }} fid
+    JOIN fct_messages fm ON fm.message_pk = fid.message_pk
+    WHERE fid.loaded_at >= (SELECT loaded_at FROM watermark)
+),
+messages AS (
+    SELECT fm.*
+    FROM fct_messages fm
+    JOIN touched_days td ON td.channel_id = fm.channel_id AND td.message_date = fm.message_date
+),
+{% else %}
+messages AS (
+    SELECT * FROM fct_messages
+),
+{% endif %}
+detections AS (
+    SELECT
+        fid.message_pk,
+        COUNT(*) AS detection_count,
+        MAX(fid.loaded_at) AS last_loaded_at
+    FROM
+        {{ ref('fct_image_detections') }} fid
+    WHERE
+        fid.message_pk IN (SELECT message_pk FROM messages)
+    GROUP BY
+        fid.message_pk
+)
+SELECT
+    m.channel_id,
+    LOWER(LTRIM(dc.channel_username, '@')) AS channel_username_normalized,
+    m.message_date AS activity_date,
+    m.date_key,
+    COUNT(*) AS message_count,
+    COALESCE(SUM(m.views_count), 0) AS total_views,
+    COALESCE(SUM(m.forwards_count), 0) AS total_forwards,
+    COUNT(*) FILTER (WHERE m.has_media) AS media_message_count,
+    COALESCE(SUM(d.detection_count), 0) AS detection_count,
+    GREATEST(MAX(m.loaded_at), MAX(d.last_loaded_at)) AS last_loaded_at
+FROM
+    messages m
+LEFT JOIN
+    detections d ON d.message_pk = m.message_pk
+LEFT JOIN
+    {{ ref('dim_channels') }} dc ON dc.channel_id = m.channel_id
+GROUP BY
+    m.channel_id,
+    dc.channel_username,
+    m.message_date,
+    m.date_key
@@ -1,22 +1,111 @@
 {{ config(
-  materialized='table',
-  schema='marts'
+  materialized='incremental',
+  unique_key='channel_id',
+  incremental_strategy='delete+insert',
+  on_schema_change='append_new_columns',
+  schema='marts',
+  indexes=[
+    {'columns': ['channel_id'], 'unique': True},
+    {'columns': ['last_loaded_at']}
+  ]
 ) }}
+
+-- One row per channel, named after its most recent scrape. Incremental runs only rebuild the
+-- channels that have raw messages loaded since the last run; their message aggregates are
+-- recomputed from fct_messages through its (channel_id, message_date) index. image_dir_names
+-- collects every title the channel has had in the scraper's image directory form (spaces as
+-- underscores), which is how fct_image_detections finds the channel of an image.
+
+WITH new_messages AS (
+  SELECT
+    telethon_channel_id AS channel_id,
+    channel_username,
+    channel_title,
+    scraped_date,
+    raw_loaded_at
+  FROM
+    {{ ref('stg_telegram_messages') }}
+  WHERE
+    telethon_channel_id IS NOT NULL
+    {% if is_incremental() %}
+      AND raw_loaded_at >= (SELECT COALESCE(MAX(last_loaded_at), '-infinity') FROM {{ this }})
+    {% endif %}
+),
+touched_channels AS (
+  SELECT
+    channel_id,
+    MAX(scraped_date) AS latest_scraped_date,
+    MAX(raw_loaded_at) AS last_loaded_at
+  FROM
+    new_messages
+  GROUP BY
+    channel_id
+),
+channel_names AS (
+  SELECT DISTINCT ON (channel_id)
+    channel_id,
+    channel_username,
+    channel_title
+  FROM
+    new_messages
+  ORDER BY
+    channel_id,
+    scraped_date DESC,
+    raw_loaded_at DESC
+),
+image_dirs AS (
+  SELECT
+    channel_id,
+    ARRAY_AGG(DISTINCT REPLACE(channel_title, ' ', '_')) AS image_dir_names
+  FROM
+    new_messages
+  WHERE
+    channel_title IS NOT NULL
+  GROUP BY
+    channel_id
+),
+message_stats AS (
+  SELECT
+    fm.channel_id,
+    MIN(fm.message_timestamp) AS first_scraped_message_timestamp,
+    MAX(fm.message_timestamp) AS last_scraoed_message_timestamp,
+    COUNT(*) AS total_message_scraped
+  FROM
+    {{ ref('fct_messages') }} fm
+  WHERE
+    fm.channel_id IN (SELECT channel_id FROM touched_channels)
+  GROUP BY
+    fm.channel_id
+)
 SELECT
-  telethon_channel_id AS channel_id,
-  channel_username,
-  channel_title,
-  MIN(message_timestamp) AS first_scraped_message_timestamp,
-  MAX(message_timestamp) AS last_scraoed_message_timestamp,
-  COUNT(DISTINCT message_id) AS total_message_scraped,
-  MAX(scraped_date) AS latest_scraped_date
+  tc.channel_id,
+  cn.channel_username,
+  cn.channel_title,
+  ms.first_scraped_message_timestamp,
+  ms.last_scraoed_message_timestamp,
+  COALESCE(ms.total_message_scraped, 0) AS total_message_scraped,
+  {% if is_incremental() %}
+  GREATEST(tc.latest_scraped_date, existing.latest_scraped_date) AS latest_scraped_date,
+  ARRAY(
+    SELECT DISTINCT image_dir_name
+    FROM UNNEST(COALESCE(existing.image_dir_names, '{}') || COALESCE(idr.image_dir_names, '{}')) AS image_dir_name
+  ) AS image_dir_names,
+  {% else %}
+  tc.latest_scraped_date,
+  COALESCE(idr.image_dir_names, '{}') AS image_dir_names,
+  {% endif %}
+  tc.last_loaded_at
 FROM
-  {{ ref('stg_telegram_messages') }}
-WHERE
-  telethon_channel_id IS NOT NULL
-GROUP BY
-  telethon_channel_id,
-  channel_username,
-  channel_title
+  touched_channels tc
+JOIN
+  channel_names cn ON cn.channel_id = tc.channel_id
+LEFT JOIN
+  message_stats ms ON ms.channel_id = tc.channel_id
+LEFT JOIN
+  image_dirs idr ON idr.channel_id = tc.channel_id
+{% if is_incremental() %}
+LEFT JOIN
+  {{ this }} existing ON existing.channel_id = tc.channel_id
+{% endif %}
 ORDER BY
-  channel_id
+  tc.channel_id
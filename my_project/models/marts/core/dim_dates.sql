@@ -1,14 +1,34 @@
 {{ config(
-    materialized='table',
-    schema='marts'
+    materialized='incremental',
+    unique_key='date_key',
+    on_schema_change='sync_all_columns',
+    schema='marts',
+    indexes=[
+      {'columns': ['date_key'], 'unique': True},
+      {'columns': ['date_day']}
+    ]
 ) }}
 
-WITH date_spine AS (
-    SELECT generate_series(
-        '2022-01-01'::date,
-        CURRENT_DATE + INTERVAL '1 year',
-        '1 day'::interval
-    ) as date_day
+-- The spine runs from 2022-01-01 to a year past the newest message (and at least a year past
+-- today). Incremental runs only append the days past the current end of the table, which is
+-- nothing on most nights. Whether a day is today is left to queries (date_day = CURRENT_DATE),
+-- since a stored flag would go stale.
+
+WITH spine_bounds AS (
+    SELECT
+        {% if is_incremental() %}
+        (SELECT MAX(date_day) FROM {{ this }}) + 1 AS start_day,
+        {% else %}
+        '2022-01-01'::date AS start_day,
+        {% endif %}
+        GREATEST(
+            CURRENT_DATE,
+            (SELECT COALESCE(MAX(message_date), CURRENT_DATE) FROM {{ ref('fct_messages') }})
+        ) + 365 AS end_day
+),
+date_spine AS (
+    SELECT generate_series(start_day, end_day, '1 day'::interval)::date AS date_day
+    FROM spine_bounds
 )
 SELECT
     date_day,
@@ -23,9 +43,6 @@ SELECT
     EXTRACT(WEEK FROM date_day) AS week_of_year,
     EXTRACT(QUARTER FROM date_day) AS quarter,
     TO_CHAR(date_day, 'YYYY-MM') AS year_month,
-    (EXTRACT(DOW FROM date_day) IN (0, 6)) AS is_weekend,
-    date_day::DATE = CURRENT_DATE AS is_current_date
+    (EXTRACT(DOW FROM date_day) IN (0, 6)) AS is_weekend
 FROM
     date_spine
-ORDER BY
-    date_day
\ No newline at end of file
@@ -1,13 +1,62 @@
 {{ config(
     materialized='incremental',
     unique_key='image_detection_pk',
+    incremental_strategy='delete+insert',
     schema='marts',
-    post_hook="CREATE UNIQUE INDEX IF NOT EXISTS fct_image_detections_unique_idx ON marts.fct_image_detections (image_detection_pk);"
+    indexes=[
+      {'columns': ['image_detection_pk'], 'unique': True},
+      {'columns': ['message_pk']},
+      {'columns': ['channel_id', 'message_id']},
+      {'columns': ['loaded_at']}
+    ]
 ) }}
 
-WITH stg_detections AS (
-    SELECT * FROM {{ ref('stg_yolo_detections') }}
+-- Detections are matched to their message on (channel_id, message_id); the channel comes from
+-- the image directory name through dim_channels.image_dir_names. Incremental runs pick up
+-- detections loaded since the last run, plus older detections whose message only arrived in
+-- fct_messages since then (they had nothing to join to before).
+
+WITH channel_dirs AS (
+    SELECT DISTINCT ON (image_dir_name)
+        image_dir_name,
+        channel_id
+    FROM
+        {{ ref('dim_channels') }},
+        UNNEST(image_dir_names) AS image_dir_name
+    ORDER BY
+        image_dir_name,
+        latest_scraped_date DESC
+),
+stg_detections AS (
+    SELECT
+        sd.*,
+        cd.channel_id
+    FROM
+        {{ ref('stg_yolo_detections') }} sd
+    INNER JOIN
+        channel_dirs cd ON cd.image_dir_name = sd.channel_name
+),
+{% if is_incremental() %}
+watermark AS (
+    SELECT COALESCE(MAX(loaded_at), '-infinity') AS loaded_at FROM {{ this }}
+),
+new_messages AS (
+    SELECT channel_id, message_id
+    FROM {{ ref('fct_messages') }}
+    WHERE loaded_at >= (SELECT loaded_at FROM watermark)
+),
+candidate_detections AS (
+    SELECT * FROM stg_detections
+    WHERE raw_loaded_at >= (SELECT loaded_at FROM watermark)
+    UNION
+    SELECT sd.* FROM stg_detections sd
+    INNER JOIN new_messages nm ON nm.channel_id = sd.channel_id AND nm.message_id = sd.message_id
+),
+{% else %}
+candidate_detections AS (
+    SELECT * FROM stg_detections
 ),
+{% endif %}
 fct_messages_base AS (
     SELECT
         message_pk,
@@ -17,22 +66,18 @@ fct_messages_base AS (
         {{ ref('fct_messages') }}
 )
 SELECT
-    sd.image_detection_pk,
-    sd.message_id,
+    cd.image_detection_pk,
+    cd.message_id,
+    cd.channel_id,
     fmb.message_pk,
-    sd.image_path,
-    sd.scraped_date,
-    sd.channel_name,
-    sd.detected_object_class,
-    sd.confidence_score,
-    sd.detection_timestamp,
-    sd.raw_loaded_at AS loaded_at
+    cd.image_path,
+    cd.scraped_date,
+    cd.channel_name,
+    cd.detected_object_class,
+    cd.confidence_score,
+    cd.detection_timestamp,
+    cd.raw_loaded_at AS loaded_at
 FROM
-    stg_detections sd
+    candidate_detections cd
 INNER JOIN
-    fct_messages_base fmb ON sd.message_id = fmb.message_id
-WHERE
-    1=1
-    {% if is_incremental() %}
-        AND sd.detection_timestamp > (SELECT MAX(detection_timestamp) FROM {{ this }})
-    {% endif %}
\ No newline at end of file
+    fct_messages_base fmb ON fmb.channel_id = cd.channel_id AND fmb.message_id = cd.message_id
@@ -1,18 +1,50 @@
 {{ config(
-  materialized='table',
+  materialized='incremental',
+  unique_key='message_pk',
+  incremental_strategy='merge',
+  on_schema_change='append_new_columns',
   schema='marts',
+  indexes=[
+    {'columns': ['message_pk'], 'unique': True},
+    {'columns': ['loaded_at']},
+    {'columns': ['message_search_vector'], 'type': 'gin'},
+    {'columns': ['message_text gin_trgm_ops'], 'type': 'gin'},
+    {'columns': ['message_date']},
+    {'columns': ['channel_id', 'message_date']},
+    {'columns': ['channel_id', 'message_id']}
+  ]
 ) }}
 
+-- Incremental runs merge the raw rows loaded since the newest loaded_at already in the table
+-- (the loader bumps loaded_at when it re-loads a message, so edited view counts etc. are merged too).
+-- The watermark is inclusive so rows committed in the same instant are not missed; the anti-join
+-- drops the ones that were already merged.
+
 WITH stg_messages AS (
   SELECT * FROM {{ ref('stg_telegram_messages') }}
+  WHERE telethon_channel_id IS NOT NULL
+  {% if is_incremental() %}
+    AND raw_loaded_at >= (SELECT COALESCE(MAX(loaded_at), '-infinity') FROM {{ this }})
+  {% endif %}
+),
+new_messages AS (
+  SELECT
+    {{ dbt_utils.generate_surrogate_key(['stg_messages.message_id', 'stg_messages.telethon_channel_id']) }} AS message_pk,
+    stg_messages.*
+  FROM
+    stg_messages
 )
 SELECT
-  {{ dbt_utils.generate_surrogate_key(['stg_messages.message_id', 'stg_messages.telethon_channel_id']) }} AS message_pk,
+  stg_messages.message_pk,
   stg_messages.message_id,
   stg_messages.telethon_channel_id AS channel_id,
-  DATE(stg_messages.message_timestamp) AS message_date,
-  TO_CHAR(DATE(stg_messages.message_timestamp), 'YYYYMMDD')::INTEGER AS date_key,
+  stg_messages.message_timestamp,
+  stg_messages.message_date,
+  TO_CHAR(stg_messages.message_date, 'YYYYMMDD')::INTEGER AS date_key,
   stg_messages.message_text,
+  -- 'english' stems English words; 'simple' keeps Amharic (Ethiopic) and other tokens verbatim.
+  to_tsvector('english', COALESCE(stg_messages.message_text, ''))
+    || to_tsvector('simple', COALESCE(stg_messages.message_text, '')) AS message_search_vector,
   LENGTH(stg_messages.message_text) AS message_length,
   stg_messages.views_count,
   stg_messages.forwards_count,
@@ -23,12 +55,11 @@ SELECT
   stg_messages.raw_message_json,
   stg_messages.raw_loaded_at AS loaded_at
 FROM
-  stg_messages
+  new_messages stg_messages
+{% if is_incremental() %}
+LEFT JOIN
+  {{ this }} existing ON existing.message_pk = stg_messages.message_pk
 WHERE
-  stg_messages.telethon_channel_id IS NOT NULL
-  {% if is_incremental() %}
-    AND stg_messages.message_id NOT IN (
-      SELECT message_id FROM {{ this }}
-      WHERE channel_id = stg_messages.telethon_channel_id
-    )
-  {% endif %}
\ No newline at end of file
+  existing.message_pk IS NULL
+  OR existing.loaded_at < stg_messages.raw_loaded_at
+{% endif %}
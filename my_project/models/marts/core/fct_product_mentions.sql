@@ -0,0 +1,92 @@
+{{ config(
+    materialized='incremental',
+    unique_key='message_pk',
+    incremental_strategy='delete+insert',
+    schema='marts',
+    indexes=[
+      {'columns': ['product_name', 'message_date']},
+      {'columns': ['message_pk']}
+    ],
+    post_hook="DELETE FROM {{ this }} WHERE product_name IS NULL OR dictionary_hash IS DISTINCT FROM (SELECT dictionary_hash FROM {{ source('raw', 'raw_product_tagger_state') }} WHERE tagger = 'product_keywords')"
+) }}
+
+-- One row per (message, product), built from the spans written by scripts/tag_product_mentions.py.
+-- Incremental runs take every message tagged since the last run from raw_product_tagged_messages,
+-- so delete+insert replaces all product rows of those messages, including messages that no longer
+-- have any mention: they produce a placeholder row with a NULL product_name, which the post-hook
+-- deletes (the tagged_at watermark may then trail; re-taking those messages is harmless).
+-- When the tagger's keyword dictionary changed, every tagged message is taken and the post-hook
+-- also drops rows built from the old dictionary, i.e. the mart is rebuilt in full.
+
+WITH tagger_state AS (
+    SELECT
+        dictionary_hash
+    FROM
+        {{ source('raw', 'raw_product_tagger_state') }}
+    WHERE
+        tagger = 'product_keywords'
+),
+tagged_messages AS (
+    SELECT
+        channel_id,
+        message_id,
+        dictionary_hash,
+        tagged_at
+    FROM
+        {{ source('raw', 'raw_product_tagged_messages') }}
+    {% if is_incremental() %}
+    WHERE
+        tagged_at > (SELECT COALESCE(MAX(tagged_at), '-infinity') FROM {{ this }})
+        OR (SELECT dictionary_hash FROM tagger_state) IS DISTINCT FROM (SELECT MAX(dictionary_hash) FROM {{ this }})
+    {% endif %}
+),
+mentions AS (
+    SELECT
+        pm.channel_id,
+        pm.message_id,
+        pm.product_name,
+        pm.matched_keyword,
+        pm.span_start
+    FROM
+        {{ source('raw', 'raw_product_mentions') }} pm
+    INNER JOIN
+        tagged_messages tm ON tm.channel_id = pm.channel_id AND tm.message_id = pm.message_id
+),
+messages AS (
+    SELECT
+        message_pk,
+        message_id,
+        channel_id,
+        message_date,
+        date_key
+    FROM
+        {{ ref('fct_messages') }}
+)
+SELECT
+    {{ dbt_utils.generate_surrogate_key(['m.message_pk', 'pm.product_name']) }} AS product_mention_pk,
+    m.message_pk,
+    m.message_id,
+    m.channel_id,
+    m.message_date,
+    m.date_key,
+    pm.product_name,
+    ARRAY_AGG(DISTINCT pm.matched_keyword ORDER BY pm.matched_keyword) AS matched_keywords,
+    COUNT(pm.product_name) AS mention_count,
+    MIN(pm.span_start) AS first_span_start,
+    tm.dictionary_hash,
+    tm.tagged_at
+FROM
+    tagged_messages tm
+INNER JOIN
+    messages m ON m.message_id = tm.message_id AND m.channel_id = tm.channel_id
+LEFT JOIN
+    mentions pm ON pm.message_id = tm.message_id AND pm.channel_id = tm.channel_id
+GROUP BY
+    m.message_pk,
+    m.message_id,
+    m.channel_id,
+    m.message_date,
+    m.date_key,
+    pm.product_name,
+    tm.dictionary_hash,
+    tm.tagged_at
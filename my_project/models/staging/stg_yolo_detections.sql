@@ -0,0 +1,27 @@
+{{ config(
+    materialized='view',
+    schema='staging'
+) }}
+
+-- raw_yolo_detections is unique on (image_path, detection_index), the box's position in the
+-- image's prediction result, so the key is stable across reloads and boxes that share class and
+-- confidence stay distinct. Image directories are named after the channel title with spaces
+-- replaced by underscores; channel_name keeps that directory name.
+
+SELECT
+    {{ dbt_utils.generate_surrogate_key([
+        'raw_detection.image_path',
+        'raw_detection.detection_index'
+    ]) }} AS image_detection_pk,
+    raw_detection.message_id,
+    raw_detection.image_path,
+    raw_detection.scraped_date,
+    raw_detection.channel_name,
+    raw_detection.detected_object_class,
+    raw_detection.confidence_score,
+    raw_detection.detection_index,
+    raw_detection.raw_detection_json -> 'bbox' AS bbox,
+    raw_detection.detection_timestamp,
+    raw_detection.loaded_at AS raw_loaded_at
+FROM
+    {{ source('raw', 'raw_yolo_detections') }} raw_detection
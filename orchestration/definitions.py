@@ -2,6 +2,7 @@ from dagster import job, repository, schedule
 from .ops import (
     scrape_telegram_data_op,
     load_raw_telegram_messages_op,
+    tag_product_mentions_op,
     run_yolo_detection_op,
     load_yolo_detections_op,
     run_dbt_transformations_op,
@@ -15,11 +16,13 @@ def telegram_data_pipeline_job():
 
     loaded_raw_messages_result = load_raw_telegram_messages_op(scraped_result) 
 
+    tagged_products_result = tag_product_mentions_op(loaded_raw_messages_result)
+
     yolo_detected_images_result = run_yolo_detection_op(scraped_result)
 
     loaded_yolo_detections_result = load_yolo_detections_op(yolo_detected_images_result)
 
-    dbt_transformed_result = run_dbt_transformations_op(loaded_raw_messages_result, loaded_yolo_detections_result)
+    dbt_transformed_result = run_dbt_transformations_op(tagged_products_result, loaded_yolo_detections_result)
 
     run_dbt_tests_op(dbt_transformed_result)
 
@@ -1,118 +1,185 @@
 import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import importlib
 import subprocess
+from contextlib import contextmanager
 from dagster import op, get_dagster_logger
 
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DBT_PROJECT_DIR = os.path.join(PROJECT_ROOT, 'my_project')
 SCRIPTS_DIR = os.path.join(PROJECT_ROOT, 'scripts')
 SCRAP_DIR = os.path.join(PROJECT_ROOT, 'src')
+# Models are incremental; set DBT_FULL_REFRESH=1 to rebuild them from scratch (e.g. after a model change).
+DBT_FULL_REFRESH = os.getenv("DBT_FULL_REFRESH", "0") == "1"
+# Steps run in the op's process by default. Steps listed here (e.g. "yolo_detection", or "all")
+# run as a separate Python process instead, for isolation from a crashing or leaking step.
+PIPELINE_ISOLATED_STEPS = {step.strip() for step in os.getenv("PIPELINE_ISOLATED_STEPS", "").split(',') if step.strip()}
+STEP_LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+class DagsterLogHandler(logging.Handler):
+    """Forwards log records of an in-process step to the Dagster logger as they are emitted."""
+    def __init__(self, dagster_logger):
+        super().__init__(level=logging.INFO)
+        self.dagster_logger = dagster_logger
+        self.setFormatter(logging.Formatter('%(name)s - %(message)s'))
+
+    def emit(self, record):
+        # Dagster's own records propagate to the root logger too; forwarding them would loop.
+        if record.name.startswith('dagster'):
+            return
+        try:
+            self.dagster_logger.log(record.levelno, self.format(record))
+        except Exception:
+            self.handleError(record)
+
+@contextmanager
+def step_environment(logger, log_file):
+    """
+    Runs a step the way its script expects to be run: from the project root (the scripts use
+    relative data/ paths), with scripts/ and src/ importable (they import their helpers by bare
+    name), and with its logging streamed live to Dagster.
+
+    The scripts configure logging with basicConfig when imported, which only takes effect
+    once per process, so the step's own handlers (its `log_file`, stderr and Dagster) replace
+    the root handlers for the duration of the step.
+    """
+    previous_cwd = os.getcwd()
+    added_paths = [path for path in (SCRIPTS_DIR, SCRAP_DIR) if path not in sys.path]
+    sys.path[:0] = added_paths
+    log_path = os.path.join(PROJECT_ROOT, log_file)
+    os.makedirs(os.path.dirname(log_path), exist_ok=True)
+    handlers = [logging.FileHandler(log_path), logging.StreamHandler()]
+    for handler in handlers:
+        handler.setFormatter(logging.Formatter(STEP_LOG_FORMAT))
+    handlers.append(DagsterLogHandler(logger))
+    root_logger = logging.getLogger()
+    previous_level = root_logger.level
+    previous_handlers = root_logger.handlers[:]
+    for handler in previous_handlers:
+        root_logger.removeHandler(handler)
+    for handler in handlers:
+        root_logger.addHandler(handler)
+    if root_logger.getEffectiveLevel() > logging.INFO:
+        root_logger.setLevel(logging.INFO)
+    os.chdir(PROJECT_ROOT)
+    try:
+        yield
+    finally:
+        os.chdir(previous_cwd)
+        root_logger.setLevel(previous_level)
+        for handler in handlers:
+            root_logger.removeHandler(handler)
+            handler.close()
+        for handler in previous_handlers:
+            root_logger.addHandler(handler)
+        for path in added_paths:
+            sys.path.remove(path)
+
+def stream_subprocess(command, cwd, logger):
+    """Runs a command, forwarding each line of its combined stdout/stderr to the logger as it is printed."""
+    started_at = time.monotonic()
+    logger.info(f"Running {' '.join(command)}")
+    with subprocess.Popen(command, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                          text=True, bufsize=1, env=dict(os.environ, PYTHONUNBUFFERED='1')) as process:
+        for line in process.stdout:
+            logger.info(line.rstrip())
+        returncode = process.wait()
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, command)
+    return {'returncode': returncode, 'duration_seconds': round(time.monotonic() - started_at, 1)}
+
+def run_pipeline_step(step, script_path, module_name, function_name, log_file, **kwargs):
+    """
+    Calls `module_name.function_name(**kwargs)` in-process (awaiting it if it is a coroutine)
+    and returns its structured result, logging to `log_file` as the script does when run
+    directly; falls back to running `script_path` as a subprocess when the step is listed
+    in PIPELINE_ISOLATED_STEPS.
+    """
+    logger = get_dagster_logger()
+    if step in PIPELINE_ISOLATED_STEPS or 'all' in PIPELINE_ISOLATED_STEPS:
+        logger.info(f"Running step '{step}' in a separate process (PIPELINE_ISOLATED_STEPS).")
+        return stream_subprocess([sys.executable, script_path], PROJECT_ROOT, logger)
+
+    with step_environment(logger, log_file):
+        module = importlib.import_module(module_name)
+        result = getattr(module, function_name)(**kwargs)
+        if asyncio.iscoroutine(result):
+            result = asyncio.run(result)
+    logger.info(f"Step '{step}' result: {json.dumps(result, default=str)}")
+    return result
 
 @op
 def scrape_telegram_data_op():
-  
+
     logger = get_dagster_logger()
     logger.info("Starting Telegram data scraping...")
     try:
-        result = subprocess.run(
-            ["python", os.path.join(SCRAP_DIR, "telegram_scraper.py")],
-            check=True,
-            capture_output=True,
-            text=True,
-            cwd=PROJECT_ROOT
-        )
-        logger.info(f"Telegram scraper stdout:\n{result.stdout}")
-        if result.stderr:
-            logger.warning(f"Telegram scraper stderr:\n{result.stderr}")
+        result = run_pipeline_step('scrape', os.path.join(SCRAP_DIR, "telegram_scraper.py"),
+                                   'telegram_scraper', 'connect_and_scrape', 'data/scraper.log')
         logger.info("Telegram data scraping completed.")
-        return "Scraping complete" 
-    except subprocess.CalledProcessError as e:
-        logger.error(f"Telegram scraper failed: {e}")
-        logger.error(f"Stdout: {e.stdout}")
-        logger.error(f"Stderr: {e.stderr}")
-        raise
+        return result
     except Exception as e:
-        logger.error(f"An unexpected error occurred during Telegram scraping: {e}")
+        logger.error(f"Telegram scraping failed: {e}")
         raise
 
 @op
 def load_raw_telegram_messages_op(upstream_result):
-    
+
     logger = get_dagster_logger()
     logger.info("Starting raw Telegram messages loading to PostgreSQL...")
     try:
-        result = subprocess.run(
-            ["python", os.path.join(SCRIPTS_DIR, "load_to_postgres.py")],
-            check=True,
-            capture_output=True,
-            text=True,
-            cwd=PROJECT_ROOT
-        )
-        logger.info(f"Raw messages loader stdout:\n{result.stdout}")
-        if result.stderr:
-            logger.warning(f"Raw messages loader stderr:\n{result.stderr}")
+        result = run_pipeline_step('load_raw_messages', os.path.join(SCRIPTS_DIR, "load_to_postgres.py"),
+                                   'load_to_postgres', 'load_raw_messages_to_postgres', 'data/raw_loader.log')
         logger.info("Raw Telegram messages loaded to PostgreSQL.")
-        return "Raw messages loaded" 
-    except subprocess.CalledProcessError as e:
-        logger.error(f"Raw messages loader failed: {e}")
-        logger.error(f"Stdout: {e.stdout}")
-        logger.error(f"Stderr: {e.stderr}")
+        return result
+    except Exception as e:
+        logger.error(f"Raw messages loading failed: {e}")
         raise
+
+@op
+def tag_product_mentions_op(upstream_result):
+
+    logger = get_dagster_logger()
+    logger.info("Starting product mention tagging...")
+    try:
+        result = run_pipeline_step('tag_product_mentions', os.path.join(SCRIPTS_DIR, "tag_product_mentions.py"),
+                                   'tag_product_mentions', 'tag_product_mentions', 'data/product_tagger.log')
+        logger.info("Product mentions tagged.")
+        return result
     except Exception as e:
-        logger.error(f"An unexpected error occurred during raw messages loading: {e}")
+        logger.error(f"Product mention tagging failed: {e}")
         raise
 
 @op
 def run_yolo_detection_op(upstream_result):
-    
+
     logger = get_dagster_logger()
     logger.info("Starting YOLO object detection on images...")
     try:
-        result = subprocess.run(
-            ["python", os.path.join(SCRIPTS_DIR, "yolo_detector.py")],
-            check=True,
-            capture_output=True,
-            text=True,
-            cwd=PROJECT_ROOT
-        )
-        logger.info(f"YOLO detector stdout:\n{result.stdout}")
-        if result.stderr:
-            logger.warning(f"YOLO detector stderr:\n{result.stderr}")
+        result = run_pipeline_step('yolo_detection', os.path.join(SCRIPTS_DIR, "yolo_detector.py"),
+                                   'yolo_detector', 'run_yolo_detection', 'data/yolo_detector.log')
         logger.info("YOLO object detection completed.")
-        return "YOLO detection complete" 
-    except subprocess.CalledProcessError as e:
-        logger.error(f"YOLO detector failed: {e}")
-        logger.error(f"Stdout: {e.stdout}")
-        logger.error(f"Stderr: {e.stderr}")
-        raise
+        return result
     except Exception as e:
-        logger.error(f"An unexpected error occurred during YOLO detection: {e}")
+        logger.error(f"YOLO detection failed: {e}")
         raise
 
 @op
 def load_yolo_detections_op(upstream_result):
-    
+
     logger = get_dagster_logger()
     logger.info("Starting YOLO detections loading to PostgreSQL...")
     try:
-        result = subprocess.run(
-            ["python", os.path.join(SCRIPTS_DIR, "load_yolo_to_pg.py")],
-            check=True,
-            capture_output=True,
-            text=True,
-            cwd=PROJECT_ROOT
-        )
-        logger.info(f"YOLO detections loader stdout:\n{result.stdout}")
-        if result.stderr:
-            logger.warning(f"YOLO detections loader stderr:\n{result.stderr}")
+        result = run_pipeline_step('load_yolo_detections', os.path.join(SCRIPTS_DIR, "load_yolo_to_pg.py"),
+                                   'load_yolo_to_pg', 'load_yolo_detections_to_postgres', 'data/yolo_loader.log')
         logger.info("YOLO detections loaded to PostgreSQL.")
-        return "YOLO detections loaded" 
-    except subprocess.CalledProcessError as e:
-        logger.error(f"YOLO detections loader failed: {e}")
-        logger.error(f"Stdout: {e.stdout}")
-        logger.error(f"Stderr: {e.stderr}")
-        raise
+        return result
     except Exception as e:
-        logger.error(f"An unexpected error occurred during YOLO detections loading: {e}")
+        logger.error(f"YOLO detections loading failed: {e}")
         raise
 
 @op
@@ -123,24 +190,12 @@ def run_dbt_transformations_op(messages_loaded_result, yolo_loaded_result):
     logger = get_dagster_logger()
     logger.info("Starting dbt transformations...")
     try:
-        dbt_command = ["dbt", "run", "--full-refresh"]
-        
-        result = subprocess.run(
-            dbt_command,
-            check=True,
-            capture_output=True,
-            text=True,
-            cwd=DBT_PROJECT_DIR
-        )
-        logger.info(f"dbt run stdout:\n{result.stdout}")
-        if result.stderr:
-            logger.warning(f"dbt run stderr:\n{result.stderr}")
+        dbt_command = ["dbt", "run", "--full-refresh"] if DBT_FULL_REFRESH else ["dbt", "run"]
+        result = stream_subprocess(dbt_command, DBT_PROJECT_DIR, logger)
         logger.info("dbt transformations completed.")
-        return "dbt transformations complete"
+        return result
     except subprocess.CalledProcessError as e:
         logger.error(f"dbt run failed: {e}")
-        logger.error(f"Stdout: {e.stdout}")
-        logger.error(f"Stderr: {e.stderr}")
         raise
     except Exception as e:
         logger.error(f"An unexpected error occurred during dbt transformations: {e}")
@@ -152,23 +207,12 @@ def run_dbt_tests_op(dbt_result):
     logger = get_dagster_logger()
     logger.info("Starting dbt tests...")
     try:
-        result = subprocess.run(
-            ["dbt", "test"],
-            check=True,
-            capture_output=True,
-            text=True,
-            cwd=DBT_PROJECT_DIR
-        )
-        logger.info(f"dbt test stdout:\n{result.stdout}")
-        if result.stderr:
-            logger.warning(f"dbt test stderr:\n{result.stderr}")
+        result = stream_subprocess(["dbt", "test"], DBT_PROJECT_DIR, logger)
         logger.info("dbt tests completed.")
-        return "dbt tests complete"
+        return result
     except subprocess.CalledProcessError as e:
         logger.error(f"dbt test failed: {e}")
-        logger.error(f"Stdout: {e.stdout}")
-        logger.error(f"Stderr: {e.stderr}")
         raise
     except Exception as e:
         logger.error(f"An unexpected error occurred during dbt tests: {e}")
-        raise
\ No newline at end of file
+        raise
@@ -0,0 +1,110 @@
+import os
+import json
+import time
+import logging
+import argparse
+import threading
+import urllib.error
+import urllib.request
+from urllib.parse import urljoin
+
+API_BASE_URL = os.getenv("API_BASE_URL", "http://localhost:8000")
+
+os.makedirs('data', exist_ok=True)
+
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+                    handlers=[
+                        logging.FileHandler('data/bench_api_concurrency.log'),
+                        logging.StreamHandler()
+                    ])
+logger = logging.getLogger(__name__)
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    position = min(len(sorted_values) - 1, max(0, int(round(fraction * (len(sorted_values) - 1)))))
+    return sorted_values[position]
+
+def client_loop(url, deadline, latencies, errors, lock):
+    """Sends requests back to back until `deadline`, recording each latency in milliseconds."""
+    while time.monotonic() < deadline:
+        started_at = time.monotonic()
+        try:
+            with urllib.request.urlopen(url, timeout=60) as response:
+                response.read()
+            elapsed_ms = (time.monotonic() - started_at) * 1000
+            with lock:
+                latencies.append(elapsed_ms)
+        except (urllib.error.URLError, OSError) as e:
+            with lock:
+                errors.append(str(e))
+
+def run_clients(url, clients, deadline):
+    latencies, errors, lock = [], [], threading.Lock()
+    threads = [threading.Thread(target=client_loop, args=(url, deadline, latencies, errors, lock), daemon=True)
+               for _ in range(clients)]
+    return threads, latencies, errors
+
+def summarize(name, latencies, errors, duration):
+    latencies = sorted(latencies)
+    summary = {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'requests_per_second': round(len(latencies) / duration, 2),
+        'p50_ms': percentile(latencies, 0.50),
+        'p95_ms': percentile(latencies, 0.95),
+        'p99_ms': percentile(latencies, 0.99),
+        'max_ms': latencies[-1] if latencies else None
+    }
+    summary = {k: round(v, 1) if isinstance(v, float) else v for k, v in summary.items()}
+    logger.info(f"{name}: {json.dumps(summary)}")
+    if errors:
+        logger.warning(f"{name}: first error: {errors[0]}")
+    return summary
+
+def run_benchmark(base_url, slow_path, fast_path, slow_clients, fast_clients, duration):
+    """
+    Measures the latency of cheap requests while slow database-bound requests run concurrently.
+
+    With a blocking data layer the slow queries stall the event loop, so the p99 of the
+    fast requests tracks the slow query time; with the executor-backed path it should
+    stay close to the fast requests' own latency. Run it against the server before and
+    after a change to compare.
+    """
+    deadline = time.monotonic() + duration
+    slow_threads, slow_latencies, slow_errors = run_clients(urljoin(base_url, slow_path), slow_clients, deadline)
+    fast_threads, fast_latencies, fast_errors = run_clients(urljoin(base_url, fast_path), fast_clients, deadline)
+
+    logger.info(f"Benchmarking {base_url} for {duration}s: {slow_clients} clients on {slow_path}, "
+                f"{fast_clients} clients on {fast_path}.")
+    for thread in slow_threads + fast_threads:
+        thread.start()
+    for thread in slow_threads + fast_threads:
+        thread.join()
+
+    return {
+        'slow': summarize(f"slow {slow_path}", slow_latencies, slow_errors, duration),
+        'fast': summarize(f"fast {fast_path}", fast_latencies, fast_errors, duration)
+    }
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Concurrency benchmark for the analytical API.")
+    parser.add_argument('--base-url', default=API_BASE_URL, help="API base URL.")
+    parser.add_argument('--slow-path', default='/api/search/messages?query=paracetamol',
+                        help="Database-heavy endpoint hammered in the background.")
+    parser.add_argument('--fast-path', default='/api/health/db-pool',
+                        help="Cheap endpoint whose latency is measured under that load.")
+    parser.add_argument('--slow-clients', type=int, default=8, help="Concurrent clients on the slow endpoint.")
+    parser.add_argument('--fast-clients', type=int, default=4, help="Concurrent clients on the fast endpoint.")
+    parser.add_argument('--duration', type=float, default=30, help="Benchmark duration in seconds.")
+    parser.add_argument('--output', help="Optional JSON file to write the summary to.")
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+    results = run_benchmark(args.base_url, args.slow_path, args.fast_path,
+                            args.slow_clients, args.fast_clients, args.duration)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,123 @@
+import os
+import sys
+import json
+import gzip
+import time
+import random
+import logging
+import argparse
+from datetime import date, timedelta
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from api import schemas
+from api.crud import SEARCH_RESULT_COLUMNS
+from api.serialization import api_payload, dumps, row_records, orjson
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+os.makedirs('data', exist_ok=True)
+
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+                    handlers=[
+                        logging.FileHandler('data/bench_api_serialization.log'),
+                        logging.StreamHandler()
+                    ])
+logger = logging.getLogger(__name__)
+
+WORDS = ['paracetamol', 'amoxicillin', 'syrup', 'tablet', 'cream', 'vitamin', 'ፓራሲታሞል', 'ሽሮፕ', 'ክሬም',
+         'price', 'available', 'call', 'delivery', 'ብር', 'ዋጋ']
+SEARCH_COLUMNS = list(SEARCH_RESULT_COLUMNS) + ['channel_id']
+
+def generate_search_rows(rng, count, words_per_message):
+    """Tuples shaped like the search query's result set."""
+    start = date(2024, 1, 1)
+    return [
+        (index, ' '.join(rng.choice(WORDS) for _ in range(words_per_message)),
+         start + timedelta(days=rng.randint(0, 365)), f"channel_{rng.randint(1, 20)}", rng.random(), rng.randint(1, 20))
+        for index in range(count)
+    ]
+
+def current_path(rows):
+    """RealDictCursor-style dicts -> pydantic models -> APIResponse, re-validated and encoded as FastAPI did."""
+    dict_rows = [dict(zip(SEARCH_COLUMNS, row)) for row in rows]
+    response = schemas.PaginatedAPIResponse(
+        status="success",
+        message=f"Successfully found {len(dict_rows)} messages.",
+        data=[schemas.MessageSearchResult(**item) for item in dict_rows],
+        next_cursor=None
+    )
+    # response_model handling: dump, validate against the declared type, then jsonable_encoder + json.dumps.
+    validated = schemas.PaginatedAPIResponse[List[schemas.MessageSearchResult]].model_validate(response.model_dump())
+    return json.dumps(jsonable_encoder(validated), ensure_ascii=False, allow_nan=False,
+                      separators=(",", ":")).encode('utf-8')
+
+def fast_path(rows):
+    """Tuples -> one dict of the documented fields per row -> dumps."""
+    data = row_records(SEARCH_RESULT_COLUMNS, rows)
+    return dumps(api_payload(data, f"Successfully found {len(data)} messages.", next_cursor=None))
+
+def time_call(func, argument, repeat):
+    best = None
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        result = func(argument)
+        elapsed = time.perf_counter() - started_at
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def run_benchmark(row_counts, words_per_message, repeat, seed):
+    """
+    Serializes synthetic search pages of each size through the current and the fast path
+    (best of `repeat` runs), checks both produce the same JSON, and reports compressed sizes.
+    """
+    rng = random.Random(seed)
+    logger.info(f"JSON encoder for the fast path: {'orjson' if orjson is not None else 'json (orjson not installed)'}.")
+    results = []
+    for count in row_counts:
+        rows = generate_search_rows(rng, count, words_per_message)
+        current_seconds, current_body = time_call(current_path, rows, repeat)
+        fast_seconds, fast_body = time_call(fast_path, rows, repeat)
+        if json.loads(current_body) != json.loads(fast_body):
+            logger.warning(f"Current and fast path produced different payloads for {count} rows.")
+
+        gzip_seconds, gzip_body = time_call(lambda body: gzip.compress(body, compresslevel=6), fast_body, repeat)
+        result = {
+            'rows': count,
+            'bytes': len(fast_body),
+            'current_ms': round(current_seconds * 1000, 2),
+            'fast_ms': round(fast_seconds * 1000, 2),
+            'speedup': round(current_seconds / fast_seconds, 1) if fast_seconds else None,
+            'gzip_bytes': len(gzip_body),
+            'gzip_ms': round(gzip_seconds * 1000, 2)
+        }
+        if brotli is not None:
+            brotli_seconds, brotli_body = time_call(lambda body: brotli.compress(body, quality=4), fast_body, repeat)
+            result['brotli_bytes'] = len(brotli_body)
+            result['brotli_ms'] = round(brotli_seconds * 1000, 2)
+        logger.info(f"Results: {json.dumps(result)}")
+        results.append(result)
+    return results
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the API's fast JSON response path against the pydantic path.")
+    parser.add_argument('--rows', type=int, nargs='+', default=[100, 500, 5000],
+                        help="Result sizes (rows per response) to benchmark.")
+    parser.add_argument('--words-per-message', type=int, default=40, help="Words per synthetic message text.")
+    parser.add_argument('--repeat', type=int, default=20, help="Runs per measurement; the fastest is reported.")
+    parser.add_argument('--seed', type=int, default=42, help="Random seed for the synthetic data.")
+    parser.add_argument('--output', help="Optional JSON file to write the results to.")
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+    results = run_benchmark(args.rows, args.words_per_message, args.repeat, args.seed)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,129 @@
+import os
+import json
+import time
+import random
+import logging
+import argparse
+from keyword_tagger import ProductTagger, normalize_text, is_word_match
+
+os.makedirs('data', exist_ok=True)
+
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+                    handlers=[
+                        logging.FileHandler('data/bench_keyword_tagger.log'),
+                        logging.StreamHandler()
+                    ])
+logger = logging.getLogger(__name__)
+
+LATIN_LETTERS = 'abcdefghijklmnopqrstuvwxyz'
+# A slice of Ethiopic syllables (ሀ..ፐ) so the transliteration path is exercised too.
+ETHIOPIC_SYLLABLES = [chr(code_point) for code_point in range(0x1200, 0x1350) if chr(code_point).isalpha()]
+
+def random_word(rng, ethiopic=False):
+    if ethiopic:
+        return ''.join(rng.choice(ETHIOPIC_SYLLABLES) for _ in range(rng.randint(2, 5)))
+    return ''.join(rng.choice(LATIN_LETTERS) for _ in range(rng.randint(5, 12)))
+
+def generate_keywords(rng, count, ethiopic_share):
+    """Random product keywords; a tenth of them are two-word phrases."""
+    keywords = []
+    for index in range(count):
+        ethiopic = rng.random() < ethiopic_share
+        keyword = random_word(rng, ethiopic)
+        if index % 10 == 0:
+            keyword = f"{keyword} {random_word(rng, ethiopic)}"
+        keywords.append((keyword, f"Product {index % max(1, count // 3)}"))
+    return keywords
+
+def generate_messages(rng, count, words_per_message, keywords, mention_rate, ethiopic_share):
+    filler = [random_word(rng, rng.random() < ethiopic_share) for _ in range(5000)]
+    for _ in range(count):
+        words = []
+        for _ in range(words_per_message):
+            if rng.random() < mention_rate:
+                words.append(rng.choice(keywords)[0].upper() if rng.random() < 0.3 else rng.choice(keywords)[0])
+            else:
+                words.append(rng.choice(filler))
+        yield ' '.join(words)
+
+def naive_tag(text, patterns):
+    """The per-keyword substring scan the automaton replaces (one find per keyword)."""
+    normalized, offsets = normalize_text(text)
+    mentions = []
+    for pattern, product_name in patterns:
+        start = normalized.find(pattern)
+        while start != -1:
+            if is_word_match(normalized, start, start + len(pattern)):
+                mentions.append((product_name, offsets[start]))
+            start = normalized.find(pattern, start + 1)
+    return mentions
+
+def run_benchmark(keyword_count, message_count, words_per_message, mention_rate, ethiopic_share, naive_sample, seed):
+    """
+    Times building the automaton for `keyword_count` keywords and tagging `message_count`
+    synthetic messages, and compares per-message cost with a naive per-keyword scan on a sample.
+    """
+    rng = random.Random(seed)
+    keywords = generate_keywords(rng, keyword_count, ethiopic_share)
+
+    started_at = time.monotonic()
+    tagger = ProductTagger(keywords)
+    build_seconds = time.monotonic() - started_at
+    logger.info(f"Built {tagger.automaton.backend} automaton for {len(tagger.automaton)} keywords in {build_seconds:.2f}s.")
+
+    tag_seconds = 0.0
+    characters = 0
+    mentions = 0
+    for index, text in enumerate(generate_messages(rng, message_count, words_per_message, keywords, mention_rate, ethiopic_share), 1):
+        started_at = time.monotonic()
+        mentions += len(tagger.tag(text))
+        tag_seconds += time.monotonic() - started_at
+        characters += len(text)
+        if index % 100000 == 0:
+            logger.info(f"Tagged {index} messages ({index / tag_seconds:.0f} messages/sec).")
+
+    results = {
+        'backend': tagger.automaton.backend,
+        'keywords': len(tagger.automaton),
+        'messages': message_count,
+        'mentions': mentions,
+        'build_seconds': round(build_seconds, 2),
+        'tag_seconds': round(tag_seconds, 2),
+        'messages_per_second': round(message_count / tag_seconds) if tag_seconds else None,
+        'mb_per_second': round(characters / tag_seconds / 1e6, 2) if tag_seconds else None
+    }
+
+    if naive_sample:
+        patterns = [(normalize_text(keyword)[0], product_name) for keyword, product_name in keywords]
+        sample = list(generate_messages(rng, naive_sample, words_per_message, keywords, mention_rate, ethiopic_share))
+        started_at = time.monotonic()
+        for text in sample:
+            naive_tag(text, patterns)
+        naive_per_message = (time.monotonic() - started_at) / naive_sample
+        results['naive_messages_per_second'] = round(1 / naive_per_message) if naive_per_message else None
+        results['speedup_vs_naive'] = round(naive_per_message / (tag_seconds / message_count), 1) if tag_seconds else None
+
+    logger.info(f"Results: {json.dumps(results)}")
+    return results
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the Aho-Corasick product keyword tagger.")
+    parser.add_argument('--keywords', type=int, default=10000, help="Number of keywords in the dictionary.")
+    parser.add_argument('--messages', type=int, default=1000000, help="Number of synthetic messages to tag.")
+    parser.add_argument('--words-per-message', type=int, default=30, help="Words per synthetic message.")
+    parser.add_argument('--mention-rate', type=float, default=0.02, help="Share of words that are keywords.")
+    parser.add_argument('--ethiopic-share', type=float, default=0.3, help="Share of Ethiopic-script words.")
+    parser.add_argument('--naive-sample', type=int, default=200,
+                        help="Messages tagged with the naive per-keyword scan for comparison (0 to skip).")
+    parser.add_argument('--seed', type=int, default=42, help="Random seed for the synthetic data.")
+    parser.add_argument('--output', help="Optional JSON file to write the results to.")
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+    results = run_benchmark(args.keywords, args.messages, args.words_per_message, args.mention_rate,
+                            args.ethiopic_share, args.naive_sample, args.seed)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
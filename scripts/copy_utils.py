@@ -0,0 +1,45 @@
+"""Helpers shared by the loaders for streaming rows into PostgreSQL with COPY ... FROM STDIN."""
+import io
+
+def strip_nul(value):
+    """PostgreSQL JSONB and TEXT cannot store \\u0000, which Telegram occasionally sends."""
+    if isinstance(value, str):
+        return value.replace('\x00', '')
+    if isinstance(value, dict):
+        return {k: strip_nul(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [strip_nul(v) for v in value]
+    return value
+
+def copy_field(value):
+    if value is None:
+        return '\\N'
+    return (str(value)
+            .replace('\\', '\\\\')
+            .replace('\t', '\\t')
+            .replace('\n', '\\n')
+            .replace('\r', '\\r'))
+
+class IteratorFile(io.TextIOBase):
+    """Minimal file-like adapter so COPY can pull rows from a generator with bounded memory."""
+    def __init__(self, lines):
+        self._lines = lines
+        self._buffer = ''
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            try:
+                self._buffer += next(self._lines)
+            except StopIteration:
+                break
+        if size < 0:
+            chunk, self._buffer = self._buffer, ''
+        else:
+            chunk, self._buffer = self._buffer[:size], self._buffer[size:]
+        return chunk
+
+    def readline(self, size=-1):
+        return self.read(size)
@@ -0,0 +1,225 @@
+import re
+import csv
+import unicodedata
+from hashlib import md5
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# Bump when normalize_text changes so stored mentions are re-tagged.
+NORMALIZER_VERSION = '2'
+
+# Endings a match may run into and still count as the whole word (tablet -> tablets, ታብሌቶች).
+WORD_SUFFIXES = ('s', 'es', 'och', 'woch')
+
+# Loose Latin forms of the Ethiopic vowel orders, as they appear at the end of the Unicode
+# character names (LA, LU, LI, LAA, LEE, LE, LO, LWA). The sixth order is the bare consonant.
+_ETHIOPIC_VOWELS = {
+    'A': 'a', 'AA': 'a', 'U': 'u', 'I': 'i', 'EE': 'e', 'E': '', 'O': 'o', 'OA': 'oa',
+    'WA': 'wa', 'WAA': 'wa', 'WI': 'wi', 'WEE': 'we', 'WE': 'w', 'YA': 'ya'
+}
+# Consonant series that are pronounced alike in Amharic and spelled interchangeably.
+_ETHIOPIC_CONSONANTS = {'HH': 'h', 'X': 'h', 'KX': 'h', 'SZ': 's', 'TZ': 'ts'}
+_ETHIOPIC_SEPARATORS = '፠፡።፣፤፥፦፧፨'
+_ETHIOPIC_SYLLABLE_NAME = re.compile(r'ETHIOPIC SYLLABLE (?:GLOTTAL |PHARYNGEAL )?([B-DF-HJ-NP-TV-Z]*)(A|AA|U|I|EE|E|O|OA|WA|WAA|WI|WEE|WE|YA)')
+
+def _build_ethiopic_transliteration():
+    table = {}
+    for code_point in list(range(0x1200, 0x1380)) + list(range(0x2D80, 0x2DE0)):
+        char = chr(code_point)
+        match = _ETHIOPIC_SYLLABLE_NAME.fullmatch(unicodedata.name(char, ''))
+        if match:
+            consonant, vowel = match.groups()
+            table[char] = (_ETHIOPIC_CONSONANTS.get(consonant, consonant) + _ETHIOPIC_VOWELS[vowel]).lower()
+    for char in _ETHIOPIC_SEPARATORS:
+        table[char] = ' '
+    return table
+
+_ETHIOPIC_TRANSLITERATION = _build_ethiopic_transliteration()
+_SPACE_RUNS = re.compile(' {2,}')
+
+def fold_char(char):
+    """Case-folds, NFKC-normalizes and transliterates (Ethiopic -> Latin) one character."""
+    if char in _ETHIOPIC_TRANSLITERATION:
+        return _ETHIOPIC_TRANSLITERATION[char]
+    if char.isspace():
+        return ' '
+    return unicodedata.normalize('NFKC', char).casefold()
+
+class _FoldTable(dict):
+    """str.translate table that folds each distinct character once and caches it."""
+    def __missing__(self, code_point):
+        folded = fold_char(chr(code_point))
+        self[code_point] = folded
+        return folded
+
+_FOLD_TABLE = _FoldTable()
+
+def fold_text(text):
+    """
+    Normalizes text for matching: fold_char on every character, then whitespace runs
+    collapse to one space, so 'blood  pressure' and an Ethiopic wordspace both match the
+    pattern 'blood pressure'. Runs in C via str.translate once characters are cached; used
+    to screen texts, while spans always come from normalize_text, which yields the same string.
+    """
+    return _SPACE_RUNS.sub(' ', text.translate(_FOLD_TABLE)).lstrip(' ')
+
+def normalize_text(text):
+    """
+    Returns (normalized_text, offsets) where normalized_text == fold_text(text) and
+    offsets[i] is the index in `text` of the character that produced normalized_text[i].
+    Whitespace is collapsed per folded character, since NFKC can fold one character into
+    several that include a space ('¨' -> ' ̈').
+    """
+    chars = []
+    offsets = []
+    previous_space = True
+    for index, char in enumerate(text):
+        for folded_char in _FOLD_TABLE[ord(char)]:
+            if folded_char == ' ':
+                if previous_space:
+                    continue
+                previous_space = True
+            else:
+                previous_space = False
+            chars.append(folded_char)
+            offsets.append(index)
+    return ''.join(chars), offsets
+
+class KeywordAutomaton:
+    """
+    Aho-Corasick automaton over normalized patterns: one pass over a text finds every
+    occurrence of every pattern, independent of the number of patterns. Uses the
+    pyahocorasick C extension when it is installed, a pure-Python trie otherwise.
+    """
+    def __init__(self):
+        self.backend = 'pyahocorasick' if ahocorasick is not None else 'python'
+        self._patterns = {}
+        self._automaton = None
+
+    def add(self, pattern, value):
+        """Adds `pattern` (already normalized); returns False if it was already present."""
+        if not pattern or pattern in self._patterns:
+            return False
+        self._patterns[pattern] = value
+        return True
+
+    def __len__(self):
+        return len(self._patterns)
+
+    def build(self):
+        if self.backend == 'pyahocorasick':
+            automaton = ahocorasick.Automaton()
+            for pattern, value in self._patterns.items():
+                automaton.add_word(pattern, (len(pattern), value))
+            automaton.make_automaton()
+            self._automaton = automaton
+            return self
+
+        goto = [{}]
+        outputs = [[]]
+        for pattern, value in self._patterns.items():
+            state = 0
+            for char in pattern:
+                next_state = goto[state].get(char)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto[state][char] = next_state
+                    goto.append({})
+                    outputs.append([])
+                state = next_state
+            outputs[state].append((len(pattern), value))
+
+        fail = [0] * len(goto)
+        queue = list(goto[0].values())
+        for state in queue:
+            for char, next_state in goto[state].items():
+                queue.append(next_state)
+                fallback = fail[state]
+                while fallback and char not in goto[fallback]:
+                    fallback = fail[fallback]
+                fail[next_state] = goto[fallback].get(char, 0)
+                outputs[next_state] = outputs[next_state] + outputs[fail[next_state]]
+        self._automaton = (goto, fail, outputs)
+        return self
+
+    def iter_matches(self, text):
+        """Yields (start, end, value) for every pattern occurrence in `text`."""
+        if self.backend == 'pyahocorasick':
+            for end_index, (length, value) in self._automaton.iter(text):
+                yield end_index - length + 1, end_index + 1, value
+            return
+
+        goto, fail, outputs = self._automaton
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if outputs[state]:
+                for length, value in outputs[state]:
+                    yield index - length + 1, index + 1, value
+
+def is_word_match(text, start, end):
+    """True if text[start:end] is a whole word, optionally followed by one of WORD_SUFFIXES."""
+    if start > 0 and text[start - 1].isalnum():
+        return False
+    if end >= len(text) or not text[end].isalnum():
+        return True
+    word_end = end
+    while word_end < len(text) and text[word_end].isalnum():
+        word_end += 1
+    return text[end:word_end] in WORD_SUFFIXES
+
+class ProductTagger:
+    """
+    Tags product mentions in message text from a keyword dictionary (keyword -> product).
+
+    Keywords and text go through the same normalize_text, so synonyms, brand names and
+    Amharic spellings are just extra dictionary rows. Overlapping matches resolve to the
+    leftmost-longest keyword; spans refer to the original, unnormalized text.
+    """
+    def __init__(self, keywords):
+        self.automaton = KeywordAutomaton()
+        self.duplicates = 0
+        fingerprint = md5(NORMALIZER_VERSION.encode('utf-8'))
+        for keyword, product_name in keywords:
+            pattern = normalize_text(keyword.strip())[0].strip()
+            if self.automaton.add(pattern, (product_name.strip(), keyword.strip())):
+                fingerprint.update(f"{pattern}\t{product_name.strip()}\n".encode('utf-8'))
+            else:
+                self.duplicates += 1
+        self.automaton.build()
+        self.dictionary_hash = fingerprint.hexdigest()
+
+    @classmethod
+    def from_csv(cls, path):
+        """Loads a keyword,product_name CSV such as scripts/product_keywords.csv."""
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            return cls((row['keyword'], row['product_name']) for row in csv.DictReader(f) if row.get('keyword'))
+
+    def tag(self, text):
+        """Returns [(product_name, keyword, span_start, span_end)] for one text."""
+        if not text:
+            return []
+        folded = fold_text(text)
+        if not any(is_word_match(folded, start, end) for start, end, _ in self.automaton.iter_matches(folded)):
+            return []
+        # Texts with a match are matched again on normalize_text's output, so spans and
+        # offsets come from the same string.
+        normalized, offsets = normalize_text(text)
+        candidates = [
+            (start, end, value) for start, end, value in self.automaton.iter_matches(normalized)
+            if is_word_match(normalized, start, end)
+        ]
+        candidates.sort(key=lambda match: (match[0], match[0] - match[1]))
+        mentions = []
+        covered_until = 0
+        for start, end, (product_name, keyword) in candidates:
+            if start < covered_until:
+                continue
+            covered_until = end
+            mentions.append((product_name, keyword, offsets[start], offsets[end - 1] + 1))
+        return mentions
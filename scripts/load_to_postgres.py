@@ -0,0 +1,433 @@
+import os
+import io
+import json
+import gzip
+import time
+import datetime
+import psycopg2
+import logging
+from dotenv import load_dotenv
+from copy_utils import IteratorFile, copy_field, strip_nul
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+load_dotenv()
+
+POSTGRES_DB = os.getenv("POSTGRES_DB")
+POSTGRES_USER = os.getenv("POSTGRES_USER")
+POSTGRES_PASSWORD = os.getenv("POSTGRES_PASSWORD")
+POSTGRES_HOST = os.getenv("POSTGRES_HOST")
+POSTGRES_PORT = os.getenv("POSTGRES_PORT")
+
+RAW_MESSAGES_DIR = 'data/raw/telegram_messages'
+SEGMENT_SUFFIXES = ('.ndjson', '.ndjson.gz', '.ndjson.zst')
+COPY_COLUMNS = ('message_id', 'channel_id', 'channel_username', 'channel_title', 'message_timestamp', 'message_text',
+                'views_count', 'forwards_count', 'replies_count', 'media_type', 'media_file_name', 'raw_json', 'scraped_date')
+# TOAST compression of the raw_json side column (lz4 needs PostgreSQL 14+ built with lz4; 'pglz' always works).
+RAW_JSON_COMPRESSION = os.getenv("RAW_JSON_COMPRESSION", "lz4")
+
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+                    handlers=[
+                        logging.FileHandler('data/raw_loader.log'),
+                        logging.StreamHandler()
+                    ])
+logger = logging.getLogger(__name__)
+
+RAW_MESSAGES_COLUMNS_SQL = """
+        message_id BIGINT NOT NULL,
+        channel_id BIGINT NOT NULL,
+        channel_username TEXT,
+        channel_title TEXT,
+        message_date DATE NOT NULL,
+        message_timestamp TIMESTAMP NOT NULL,
+        message_text TEXT,
+        views_count INTEGER,
+        forwards_count INTEGER,
+        replies_count INTEGER NOT NULL DEFAULT 0,
+        media_type TEXT,
+        media_file_name TEXT,
+        raw_json JSONB NOT NULL,
+        scraped_date DATE NOT NULL,
+        source_path TEXT,
+        loaded_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+"""
+
+def ensure_message_partitions(cursor, source_table, date_expression='message_timestamp::date'):
+    """Creates the monthly partitions of raw.raw_telegram_messages that rows of `source_table` fall into."""
+    cursor.execute(f"SELECT DISTINCT date_trunc('month', {date_expression})::date FROM {source_table} "
+                   f"WHERE {date_expression} IS NOT NULL;")
+    for (month_start,) in cursor.fetchall():
+        next_month = (month_start.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+        cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS raw.raw_telegram_messages_{month_start:%Y_%m}
+        PARTITION OF raw.raw_telegram_messages
+        FOR VALUES FROM ('{month_start.isoformat()}') TO ('{next_month.isoformat()}');
+        """)
+
+def set_raw_json_compression(cursor):
+    """Best effort: older servers or builds without lz4 keep the default (pglz) compression."""
+    cursor.execute("SAVEPOINT raw_json_compression;")
+    try:
+        cursor.execute(f"ALTER TABLE raw.raw_telegram_messages ALTER COLUMN raw_json SET COMPRESSION {RAW_JSON_COMPRESSION};")
+        cursor.execute("RELEASE SAVEPOINT raw_json_compression;")
+    except psycopg2.Error as pg_err:
+        cursor.execute("ROLLBACK TO SAVEPOINT raw_json_compression;")
+        logger.warning(f"Could not set {RAW_JSON_COMPRESSION} compression on raw_json, keeping the default: {pg_err}")
+
+def dependent_views(cursor, table):
+    """Views that (directly or through other views) read from `table`, e.g. dbt's staging views."""
+    cursor.execute("""
+    WITH RECURSIVE dependents AS (
+        SELECT DISTINCT r.ev_class AS view_oid
+        FROM pg_depend d JOIN pg_rewrite r ON r.oid = d.objid
+        WHERE d.refobjid = %s::regclass AND r.ev_class <> d.refobjid
+        UNION
+        SELECT r.ev_class
+        FROM dependents dep
+        JOIN pg_depend d ON d.refobjid = dep.view_oid
+        JOIN pg_rewrite r ON r.oid = d.objid
+        WHERE r.ev_class <> d.refobjid
+    )
+    SELECT n.nspname || '.' || c.relname
+    FROM dependents dep JOIN pg_class c ON c.oid = dep.view_oid JOIN pg_namespace n ON n.oid = c.relnamespace
+    ORDER BY 1;
+    """, (table,))
+    return [row[0] for row in cursor.fetchall()]
+
+def create_raw_messages_tables(cursor):
+    """
+    Ensures the raw message table, its upsert key and the load manifest exist.
+
+    raw.raw_telegram_messages is range-partitioned by message_date (one partition per month)
+    and keeps the columns staging needs as typed columns, so dbt never parses raw_json; the
+    full message stays in the compressed raw_json column. A message's date never changes,
+    so the (channel_id, message_id, message_date) upsert key still finds re-scraped messages.
+    Tables created by older loaders are migrated in place.
+    """
+    create_table_sql = f"""
+    CREATE SCHEMA IF NOT EXISTS raw;
+    CREATE TABLE IF NOT EXISTS raw.raw_telegram_messages ({RAW_MESSAGES_COLUMNS_SQL}) PARTITION BY RANGE (message_date);
+    CREATE UNIQUE INDEX IF NOT EXISTS uq_raw_telegram_messages_channel_message
+        ON raw.raw_telegram_messages (channel_id, message_id, message_date);
+    CREATE INDEX IF NOT EXISTS idx_raw_telegram_messages_loaded_at ON raw.raw_telegram_messages (loaded_at);
+
+    CREATE TABLE IF NOT EXISTS raw.raw_load_manifest (
+        source_path TEXT PRIMARY KEY,
+        source_type TEXT NOT NULL,
+        fingerprint TEXT NOT NULL,
+        row_count BIGINT NOT NULL,
+        loaded_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+    );
+
+    CREATE TEMP TABLE IF NOT EXISTS tmp_raw_telegram_messages (
+        message_id BIGINT,
+        channel_id BIGINT,
+        channel_username TEXT,
+        channel_title TEXT,
+        message_timestamp TIMESTAMP,
+        message_text TEXT,
+        views_count INTEGER,
+        forwards_count INTEGER,
+        replies_count INTEGER,
+        media_type TEXT,
+        media_file_name TEXT,
+        raw_json TEXT,
+        scraped_date DATE
+    );
+    """
+    # Unpartitioned tables from older loaders: the JSONB-only layout is given the id columns first,
+    # then every message is copied into the partitioned table with its typed columns extracted.
+    migrate_id_columns_sql = """
+    ALTER TABLE raw.raw_telegram_messages_unpartitioned ADD COLUMN IF NOT EXISTS message_id BIGINT;
+    ALTER TABLE raw.raw_telegram_messages_unpartitioned ADD COLUMN IF NOT EXISTS channel_id BIGINT;
+    ALTER TABLE raw.raw_telegram_messages_unpartitioned ADD COLUMN IF NOT EXISTS source_path TEXT;
+    UPDATE raw.raw_telegram_messages_unpartitioned
+    SET message_id = (raw_json->>'id')::BIGINT,
+        channel_id = (raw_json->'peer_id'->>'channel_id')::BIGINT
+    WHERE message_id IS NULL OR channel_id IS NULL;
+    """
+    migrate_rows_sql = """
+    INSERT INTO raw.raw_telegram_messages
+        (message_id, channel_id, channel_username, channel_title, message_date, message_timestamp, message_text,
+         views_count, forwards_count, replies_count, media_type, media_file_name, raw_json, scraped_date,
+         source_path, loaded_at)
+    SELECT DISTINCT ON (channel_id, message_id)
+        message_id,
+        channel_id,
+        COALESCE(raw_json->>'channel_username', channel_username),
+        COALESCE(raw_json->>'channel_title', channel_title),
+        (raw_json->>'date')::TIMESTAMP::DATE,
+        (raw_json->>'date')::TIMESTAMP,
+        raw_json->>'message',
+        (raw_json->>'views')::INTEGER,
+        (raw_json->>'forwards')::INTEGER,
+        COALESCE((raw_json->'replies'->>'replies')::INTEGER, 0),
+        raw_json->>'media_type',
+        raw_json->'media'->'document'->'attributes'->0->>'file_name',
+        raw_json,
+        scraped_date,
+        source_path,
+        loaded_at
+    FROM raw.raw_telegram_messages_unpartitioned
+    WHERE message_id IS NOT NULL AND channel_id IS NOT NULL AND raw_json->>'date' IS NOT NULL
+    ORDER BY channel_id, message_id, loaded_at DESC NULLS LAST;
+    """
+    try:
+        cursor.execute("""
+        SELECT c.relkind FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = 'raw' AND c.relname = 'raw_telegram_messages';
+        """)
+        existing = cursor.fetchone()
+        migrate = existing is not None and existing[0] == 'r'
+        if migrate:
+            logger.info("Migrating raw.raw_telegram_messages to the typed, partitioned layout...")
+            cursor.execute("""
+            ALTER TABLE raw.raw_telegram_messages RENAME TO raw_telegram_messages_unpartitioned;
+            DROP INDEX IF EXISTS raw.uq_raw_telegram_messages_channel_message;
+            DROP INDEX IF EXISTS raw.idx_raw_telegram_messages_loaded_at;
+            """)
+            cursor.execute(migrate_id_columns_sql)
+        cursor.execute(create_table_sql)
+        set_raw_json_compression(cursor)
+        if migrate:
+            ensure_message_partitions(cursor, 'raw.raw_telegram_messages_unpartitioned',
+                                      "(raw_json->>'date')::TIMESTAMP::DATE")
+            cursor.execute(migrate_rows_sql)
+            logger.info(f"Copied {cursor.rowcount} messages into the partitioned raw.raw_telegram_messages.")
+            # Views follow a renamed table, so dbt's staging views still read the old table;
+            # they are dropped with it and recreated by the next `dbt run`.
+            views = dependent_views(cursor, 'raw.raw_telegram_messages_unpartitioned')
+            cursor.execute("DROP TABLE raw.raw_telegram_messages_unpartitioned CASCADE;")
+            if views:
+                logger.warning(f"Dropped views built on the old raw table: {', '.join(views)}. "
+                               f"Run `dbt run` to recreate them on the partitioned table.")
+        logger.info("Raw tables 'raw.raw_telegram_messages' and 'raw.raw_load_manifest' ensured to exist.")
+    except Exception as e:
+        logger.error(f"Error creating raw message tables: {e}", exc_info=True)
+        raise
+
+def discover_load_units(base_dir=RAW_MESSAGES_DIR):
+    """
+    Lazily yields (source_path, source_type, fingerprint) for every loadable unit in the lake.
+
+    A unit is a closed NDJSON segment written by the scraper's NdjsonMessageSink, or a
+    channel/day directory of legacy one-file-per-message JSON. The fingerprint changes
+    whenever the unit's content can have changed, so only new or modified units are loaded.
+    """
+    if not os.path.isdir(base_dir):
+        return
+    for date_entry in sorted(os.scandir(base_dir), key=lambda e: e.name):
+        if not date_entry.is_dir():
+            continue
+        for channel_entry in sorted(os.scandir(date_entry.path), key=lambda e: e.name):
+            if not channel_entry.is_dir():
+                continue
+            legacy_file_count = 0
+            legacy_max_mtime = 0
+            for entry in os.scandir(channel_entry.path):
+                if not entry.is_file():
+                    continue
+                if entry.name.endswith(SEGMENT_SUFFIXES):
+                    yield entry.path, 'ndjson_segment', str(entry.stat().st_size)
+                elif entry.name.endswith('.json') and not entry.name.startswith('_'):
+                    legacy_file_count += 1
+                    legacy_max_mtime = max(legacy_max_mtime, entry.stat().st_mtime_ns)
+            if legacy_file_count:
+                yield channel_entry.path, 'json_directory', f"{legacy_file_count}:{legacy_max_mtime}"
+
+def open_segment(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise RuntimeError(f"Cannot read {path}: the 'zstandard' package is not installed.")
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(open(path, 'rb')), encoding='utf-8')
+    return open(path, 'r', encoding='utf-8')
+
+def iter_unit_records(source_path, source_type):
+    """Yields raw message dicts of one load unit, one at a time."""
+    if source_type == 'ndjson_segment':
+        with open_segment(source_path) as f:
+            for line_num, line in enumerate(f):
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as jde:
+                    logger.error(f"Error decoding JSON on line {line_num + 1} in {source_path}: {jde}")
+    else:
+        for entry in os.scandir(source_path):
+            if not entry.name.endswith('.json') or entry.name.startswith('_'):
+                continue
+            try:
+                with open(entry.path, 'r', encoding='utf-8') as f:
+                    yield json.load(f)
+            except json.JSONDecodeError as jde:
+                logger.error(f"Error decoding JSON in {entry.path}: {jde}")
+
+def scraped_date_from_path(source_path, source_type):
+    """The data lake partitions by scrape date: <base>/<YYYY-MM-DD>/<channel>/..."""
+    channel_dir = source_path if source_type == 'json_directory' else os.path.dirname(source_path)
+    return os.path.basename(os.path.dirname(channel_dir))
+
+def media_file_name(record):
+    attributes = (((record.get('media') or {}).get('document') or {}).get('attributes') or [{}])
+    return attributes[0].get('file_name') if attributes and isinstance(attributes[0], dict) else None
+
+def iter_copy_rows(records, scraped_date, stats):
+    """
+    Turns raw message dicts into COPY text-format lines with the typed columns extracted,
+    skipping records without a key or date.
+    """
+    for record in records:
+        message_id = record.get('id')
+        channel_id = (record.get('peer_id') or {}).get('channel_id')
+        if message_id is None or channel_id is None or not record.get('date'):
+            stats['skipped'] += 1
+            continue
+        record = strip_nul(record)
+        raw_json = json.dumps(record, ensure_ascii=False, separators=(',', ':'))
+        row = (
+            message_id, channel_id, record.get('channel_username'), record.get('channel_title'),
+            record['date'], record.get('message'), record.get('views'), record.get('forwards'),
+            (record.get('replies') or {}).get('replies') or 0, record.get('media_type'), media_file_name(record),
+            raw_json, scraped_date
+        )
+        stats['rows'] += 1
+        yield '\t'.join(copy_field(v) for v in row) + '\n'
+
+def load_unit(conn, cursor, source_path, source_type, fingerprint):
+    """Streams one unit into the temp table with COPY and upserts it in a single transaction."""
+    stats = {'rows': 0, 'skipped': 0}
+    scraped_date = scraped_date_from_path(source_path, source_type)
+
+    cursor.execute("TRUNCATE tmp_raw_telegram_messages;")
+    rows = iter_copy_rows(iter_unit_records(source_path, source_type), scraped_date, stats)
+    cursor.copy_expert(
+        f"COPY tmp_raw_telegram_messages ({', '.join(COPY_COLUMNS)}) FROM STDIN",
+        IteratorFile(rows),
+        size=1 << 16
+    )
+    ensure_message_partitions(cursor, 'tmp_raw_telegram_messages')
+    cursor.execute("""
+    INSERT INTO raw.raw_telegram_messages
+        (message_id, channel_id, channel_username, channel_title, message_date, message_timestamp, message_text,
+         views_count, forwards_count, replies_count, media_type, media_file_name, raw_json, scraped_date, source_path)
+    SELECT DISTINCT ON (channel_id, message_id)
+        message_id, channel_id, channel_username, channel_title, message_timestamp::date, message_timestamp, message_text,
+        views_count, forwards_count, replies_count, media_type, media_file_name, raw_json::jsonb, scraped_date, %s
+    FROM tmp_raw_telegram_messages
+    ORDER BY channel_id, message_id
+    ON CONFLICT (channel_id, message_id, message_date) DO UPDATE SET
+        channel_username = EXCLUDED.channel_username,
+        channel_title = EXCLUDED.channel_title,
+        message_text = EXCLUDED.message_text,
+        views_count = EXCLUDED.views_count,
+        forwards_count = EXCLUDED.forwards_count,
+        replies_count = EXCLUDED.replies_count,
+        media_type = EXCLUDED.media_type,
+        media_file_name = EXCLUDED.media_file_name,
+        raw_json = EXCLUDED.raw_json,
+        scraped_date = EXCLUDED.scraped_date,
+        source_path = EXCLUDED.source_path,
+        loaded_at = CURRENT_TIMESTAMP
+    WHERE raw.raw_telegram_messages.raw_json IS DISTINCT FROM EXCLUDED.raw_json;
+    """, (source_path,))
+    upserted = cursor.rowcount
+    cursor.execute("""
+    INSERT INTO raw.raw_load_manifest (source_path, source_type, fingerprint, row_count)
+    VALUES (%s, %s, %s, %s)
+    ON CONFLICT (source_path) DO UPDATE SET
+        fingerprint = EXCLUDED.fingerprint,
+        row_count = EXCLUDED.row_count,
+        loaded_at = CURRENT_TIMESTAMP;
+    """, (source_path, source_type, fingerprint, stats['rows']))
+    conn.commit()
+
+    if stats['skipped']:
+        logger.warning(f"Skipped {stats['skipped']} records without message or channel id in {source_path}.")
+    return stats['rows'], upserted
+
+def load_raw_messages_to_postgres():
+    """
+    Loads new or changed raw message files from the data lake into PostgreSQL.
+    Returns a summary with the counts, the duration and the new loaded_at watermark.
+    """
+    started_at = time.monotonic()
+    conn = None
+    cursor = None
+    try:
+        conn = psycopg2.connect(
+            dbname=POSTGRES_DB,
+            user=POSTGRES_USER,
+            password=POSTGRES_PASSWORD,
+            host=POSTGRES_HOST,
+            port=POSTGRES_PORT
+        )
+        cursor = conn.cursor()
+
+        create_raw_messages_tables(cursor)
+        conn.commit()
+
+        cursor.execute("SELECT source_path, fingerprint FROM raw.raw_load_manifest;")
+        loaded_fingerprints = dict(cursor.fetchall())
+
+        units_loaded = 0
+        units_failed = 0
+        total_rows = 0
+        total_upserted = 0
+        for source_path, source_type, fingerprint in discover_load_units():
+            if loaded_fingerprints.get(source_path) == fingerprint:
+                continue
+            try:
+                rows, upserted = load_unit(conn, cursor, source_path, source_type, fingerprint)
+            except psycopg2.Error as pg_err:
+                conn.rollback()
+                logger.error(f"Error loading {source_path}: {pg_err}", exc_info=True)
+                units_failed += 1
+                continue
+            units_loaded += 1
+            total_rows += rows
+            total_upserted += upserted
+            logger.info(f"Loaded {source_path}: {rows} messages read, {upserted} inserted or updated.")
+
+        logger.info(f"Successfully loaded {units_loaded} new files/partitions: {total_rows} messages read, "
+                    f"{total_upserted} inserted or updated in raw.raw_telegram_messages.")
+
+        cursor.execute("SELECT MAX(loaded_at) FROM raw.raw_telegram_messages;")
+        return {
+            'units_loaded': units_loaded,
+            'units_failed': units_failed,
+            'messages_read': total_rows,
+            'messages_upserted': total_upserted,
+            'loaded_at_watermark': cursor.fetchone()[0],
+            'duration_seconds': round(time.monotonic() - started_at, 1)
+        }
+
+    except psycopg2.Error as pg_err:
+        logger.error(f"PostgreSQL connection or query error: {pg_err}", exc_info=True)
+        if conn:
+            conn.rollback()
+        raise
+    except Exception as e:
+        logger.error(f"An unexpected error occurred: {e}", exc_info=True)
+        if conn:
+            conn.rollback()
+        raise
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+            logger.info("PostgreSQL connection closed.")
+
+if __name__ == '__main__':
+    if not all([POSTGRES_DB, POSTGRES_USER, POSTGRES_PASSWORD, POSTGRES_HOST, POSTGRES_PORT]):
+        logger.error("PostgreSQL environment variables not fully set. Please check your .env file.")
+        exit(1)
+
+    load_raw_messages_to_postgres()
@@ -1,8 +1,15 @@
 import os
 import json
+import time
 import psycopg2
 import logging
 from dotenv import load_dotenv
+from copy_utils import IteratorFile, copy_field, strip_nul
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
 
 load_dotenv()
 
@@ -13,6 +20,7 @@ POSTGRES_HOST = os.getenv("POSTGRES_HOST")
 POSTGRES_PORT = os.getenv("POSTGRES_PORT")
 
 YOLO_DETECTIONS_FILE = 'data/processed/yolo_detections.jsonl'
+YOLO_DETECTIONS_DIR = 'data/processed/yolo_detections'
 
 logging.basicConfig(level=logging.INFO,
                     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -33,25 +41,255 @@ def create_raw_yolo_table(cursor):
         channel_name TEXT,
         detected_object_class TEXT NOT NULL,
         confidence_score NUMERIC(5, 4) NOT NULL,
+        detection_index INTEGER NOT NULL,
         detection_timestamp TIMESTAMP WITH TIME ZONE NOT NULL,
         raw_detection_json JSONB NOT NULL,
         loaded_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
     );
     CREATE INDEX IF NOT EXISTS idx_raw_yolo_detections_message_id ON raw.raw_yolo_detections (message_id);
     CREATE INDEX IF NOT EXISTS idx_raw_yolo_detections_object_class ON raw.raw_yolo_detections (detected_object_class);
+    CREATE INDEX IF NOT EXISTS idx_raw_yolo_detections_loaded_at ON raw.raw_yolo_detections (loaded_at);
+
+    CREATE TABLE IF NOT EXISTS raw.raw_load_checkpoints (
+        source_path TEXT PRIMARY KEY,
+        file_identity TEXT NOT NULL,
+        byte_offset BIGINT NOT NULL,
+        updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+    );
+
+    CREATE TEMP TABLE IF NOT EXISTS tmp_raw_yolo_detections (
+        message_id BIGINT,
+        image_path TEXT,
+        scraped_date DATE,
+        channel_name TEXT,
+        detected_object_class TEXT,
+        confidence_score NUMERIC(5, 4),
+        detection_index INTEGER,
+        detection_timestamp TIMESTAMP WITH TIME ZONE,
+        raw_detection_json TEXT
+    );
+    """
+    # Rows loaded before the detection key existed have no detection_index and may contain
+    # exact copies of a record from re-loads of the same file. The copies are removed and the
+    # remaining boxes of each image are numbered in detection order; boxes that only share
+    # class and confidence are different detections and are kept.
+    create_detection_key_sql = """
+    ALTER TABLE raw.raw_yolo_detections ADD COLUMN IF NOT EXISTS detection_index INTEGER;
+    DELETE FROM raw.raw_yolo_detections older
+    USING raw.raw_yolo_detections newer
+    WHERE older.image_path = newer.image_path
+      AND older.raw_detection_json = newer.raw_detection_json
+      AND older.id < newer.id;
+    UPDATE raw.raw_yolo_detections d
+    SET detection_index = numbered.detection_index
+    FROM (
+        SELECT id, ROW_NUMBER() OVER (PARTITION BY image_path ORDER BY detection_timestamp, id) - 1 AS detection_index
+        FROM raw.raw_yolo_detections
+    ) numbered
+    WHERE d.id = numbered.id AND d.detection_index IS NULL;
+    ALTER TABLE raw.raw_yolo_detections ALTER COLUMN detection_index SET NOT NULL;
+    DROP INDEX IF EXISTS raw.uq_raw_yolo_detections_natural_key;
+    CREATE UNIQUE INDEX uq_raw_yolo_detections_detection_key
+        ON raw.raw_yolo_detections (image_path, detection_index);
     """
     try:
         cursor.execute(create_table_sql)
+        cursor.execute("SELECT to_regclass('raw.uq_raw_yolo_detections_detection_key');")
+        if cursor.fetchone()[0] is None:
+            logger.info("Creating detection key (image_path, detection_index) on 'raw.raw_yolo_detections' (removing duplicate rows first)...")
+            cursor.execute(create_detection_key_sql)
         logger.info("Raw table 'raw.raw_yolo_detections' ensured to exist.")
     except Exception as e:
         logger.error(f"Error creating raw YOLO table: {e}", exc_info=True)
         raise
 
+def get_file_identity(path):
+    """Identifies the physical file so a replaced or rotated file is re-read from the start."""
+    stat = os.stat(path)
+    return f"{stat.st_dev}:{stat.st_ino}", stat.st_size
+
+def discover_detection_sources():
+    """
+    Lists detection files in load order: the legacy single JSONL file written by older
+    detector versions, then the per-run segments in YOLO_DETECTIONS_DIR.
+    """
+    sources = []
+    if os.path.exists(YOLO_DETECTIONS_FILE):
+        sources.append(YOLO_DETECTIONS_FILE)
+    if os.path.isdir(YOLO_DETECTIONS_DIR):
+        sources.extend(
+            os.path.join(YOLO_DETECTIONS_DIR, name)
+            for name in sorted(os.listdir(YOLO_DETECTIONS_DIR))
+            if name.endswith(('.jsonl', '.parquet'))
+        )
+    return sources
+
+def detection_copy_row(record, location, source_path, progress):
+    """Returns the COPY row for one detection record, or None if required fields are missing."""
+    message_id = record.get('message_id')
+    image_path = record.get('image_path')
+    scraped_date = record.get('scraped_date')
+    channel_name = record.get('channel_name')
+    detected_object_class = record.get('detected_object_class')
+    confidence_score = record.get('confidence_score')
+    # Records from detector versions before detection_index are numbered at insert time.
+    detection_index = record.get('detection_index')
+    detection_timestamp = record.get('timestamp')
+
+    if not all([message_id, image_path, detected_object_class, confidence_score, detection_timestamp]):
+        logger.warning(f"Skipping malformed record at {location} in {source_path}: Missing required fields. Record: {record}")
+        progress['skipped'] += 1
+        return None
+
+    row = (
+        message_id,
+        image_path,
+        scraped_date,
+        channel_name,
+        detected_object_class,
+        confidence_score,
+        detection_index,
+        detection_timestamp,
+        json.dumps(strip_nul(record), ensure_ascii=False)
+    )
+    progress['rows'] += 1
+    return '\t'.join(copy_field(v) for v in row) + '\n'
+
+def iter_new_detection_rows(f, start_offset, progress, source_path):
+    """
+    Yields COPY rows for every complete line after `start_offset`.
+
+    A trailing line without a newline may still be being written by the detector, so it is
+    left for the next run. `progress['offset']` always points just past the last consumed line.
+    """
+    progress['offset'] = start_offset
+    for line in f:
+        if not line.endswith(b'\n'):
+            break
+        progress['offset'] += len(line)
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as jde:
+            logger.error(f"Error decoding JSON at byte {progress['offset'] - len(line)} in {source_path}: {jde}. Line: {line.strip()}")
+            progress['skipped'] += 1
+            continue
+        row = detection_copy_row(record, f"byte {progress['offset'] - len(line)}", source_path, progress)
+        if row is not None:
+            yield row
+
+def iter_parquet_detection_rows(source_path, file_size, progress):
+    """
+    Yields COPY rows for a Parquet segment. Segments are only published once complete,
+    so they are loaded whole and checkpointed at their full size.
+    """
+    row_number = 0
+    for record_batch in pq.ParquetFile(source_path).iter_batches(batch_size=10000):
+        for record in record_batch.to_pylist():
+            row_number += 1
+            row = detection_copy_row(record, f"row {row_number}", source_path, progress)
+            if row is not None:
+                yield row
+    progress['offset'] = file_size
+
+def load_detection_source(conn, cursor, source_path):
+    """
+    Loads the part of one detection file not yet covered by its checkpoint.
+
+    The new rows are bulk-loaded with COPY into a temp table and merged on the detection key
+    (image_path, detection_index); the checkpoint is written in the same transaction as the data.
+    """
+    file_identity, file_size = get_file_identity(source_path)
+    cursor.execute(
+        "SELECT file_identity, byte_offset FROM raw.raw_load_checkpoints WHERE source_path = %s;",
+        (source_path,)
+    )
+    checkpoint = cursor.fetchone()
+    start_offset = 0
+    if checkpoint:
+        if checkpoint[0] == file_identity and checkpoint[1] <= file_size:
+            start_offset = checkpoint[1]
+        else:
+            logger.warning(f"{source_path} was replaced or truncated since the last load. Re-reading it from the start.")
+
+    if start_offset == file_size:
+        return 0
+
+    progress = {'offset': start_offset, 'rows': 0, 'skipped': 0}
+    cursor.execute("TRUNCATE tmp_raw_yolo_detections;")
+    copy_sql = ("COPY tmp_raw_yolo_detections (message_id, image_path, scraped_date, channel_name, detected_object_class, "
+                "confidence_score, detection_index, detection_timestamp, raw_detection_json) FROM STDIN")
+    if source_path.endswith('.parquet'):
+        if pq is None:
+            logger.error(f"Cannot load {source_path}: the 'pyarrow' package is not installed. Skipping it.")
+            return 0
+        cursor.copy_expert(copy_sql, IteratorFile(iter_parquet_detection_rows(source_path, file_size, progress)), size=1 << 16)
+    else:
+        with open(source_path, 'rb') as f:
+            f.seek(start_offset)
+            cursor.copy_expert(copy_sql, IteratorFile(iter_new_detection_rows(f, start_offset, progress, source_path)), size=1 << 16)
+
+    cursor.execute("""
+    INSERT INTO raw.raw_yolo_detections (message_id, image_path, scraped_date, channel_name, detected_object_class, confidence_score, detection_index, detection_timestamp, raw_detection_json)
+    SELECT DISTINCT ON (image_path, detection_index)
+        message_id, image_path, scraped_date, channel_name, detected_object_class, confidence_score, detection_index, detection_timestamp, raw_detection_json::jsonb
+    FROM tmp_raw_yolo_detections
+    WHERE detection_index IS NOT NULL
+    ORDER BY image_path, detection_index, detection_timestamp DESC
+    ON CONFLICT (image_path, detection_index) DO NOTHING;
+    """)
+    detections_loaded = cursor.rowcount
+    # Legacy records carry no detection_index: records already loaded verbatim are skipped and
+    # the rest are numbered after the image's existing detections.
+    cursor.execute("""
+    INSERT INTO raw.raw_yolo_detections (message_id, image_path, scraped_date, channel_name, detected_object_class, confidence_score, detection_index, detection_timestamp, raw_detection_json)
+    SELECT
+        t.message_id, t.image_path, t.scraped_date, t.channel_name, t.detected_object_class, t.confidence_score,
+        COALESCE(existing.max_index, -1) + ROW_NUMBER() OVER (PARTITION BY t.image_path ORDER BY t.detection_timestamp),
+        t.detection_timestamp, t.raw_detection_json
+    FROM (
+        SELECT DISTINCT ON (image_path, raw_detection_json::jsonb)
+            message_id, image_path, scraped_date, channel_name, detected_object_class, confidence_score,
+            detection_timestamp, raw_detection_json::jsonb AS raw_detection_json
+        FROM tmp_raw_yolo_detections
+        WHERE detection_index IS NULL
+    ) t
+    LEFT JOIN LATERAL (
+        SELECT MAX(r.detection_index) AS max_index FROM raw.raw_yolo_detections r WHERE r.image_path = t.image_path
+    ) existing ON TRUE
+    WHERE NOT EXISTS (
+        SELECT 1 FROM raw.raw_yolo_detections r
+        WHERE r.image_path = t.image_path AND r.raw_detection_json = t.raw_detection_json
+    )
+    ON CONFLICT (image_path, detection_index) DO NOTHING;
+    """)
+    detections_loaded += cursor.rowcount
+
+    cursor.execute("""
+    INSERT INTO raw.raw_load_checkpoints (source_path, file_identity, byte_offset)
+    VALUES (%s, %s, %s)
+    ON CONFLICT (source_path) DO UPDATE SET
+        file_identity = EXCLUDED.file_identity,
+        byte_offset = EXCLUDED.byte_offset,
+        updated_at = CURRENT_TIMESTAMP;
+    """, (source_path, file_identity, progress['offset']))
+    conn.commit()
+
+    logger.info(f"Loaded {detections_loaded} new YOLO detections from {source_path} "
+                f"({progress['rows']} records read from bytes {start_offset}-{progress['offset']}, "
+                f"{progress['rows'] - detections_loaded} duplicates, {progress['skipped']} skipped).")
+    return detections_loaded
+
 def load_yolo_detections_to_postgres():
     """
-    Loads YOLO detection records from JSONL file into PostgreSQL.
+    Loads YOLO detection records written since the last run into PostgreSQL.
+
+    Each detection file (the legacy JSONL file and every per-run segment, JSONL or Parquet)
+    has its own checkpoint in raw.raw_load_checkpoints, so only new segments and new tails
+    of JSONL files are read. Returns a summary with the counts and the duration.
     """
+    started_at = time.monotonic()
     conn = None
+    cursor = None
     try:
         conn = psycopg2.connect(
             dbname=POSTGRES_DB,
@@ -63,81 +301,39 @@ def load_yolo_detections_to_postgres():
         cursor = conn.cursor()
 
         create_raw_yolo_table(cursor)
+        conn.commit()
+
+        sources = discover_detection_sources()
+        if not sources:
+            logger.info(f"No YOLO detection files found in {YOLO_DETECTIONS_DIR} or at {YOLO_DETECTIONS_FILE}. Skipping load.")
+            return {'sources': 0, 'detections_loaded': 0, 'duration_seconds': round(time.monotonic() - started_at, 1)}
 
         total_detections_loaded = 0
-        
-        if not os.path.exists(YOLO_DETECTIONS_FILE):
-            logger.info(f"No YOLO detections file found at {YOLO_DETECTIONS_FILE}. Skipping load.")
-            return
-
-        with open(YOLO_DETECTIONS_FILE, 'r', encoding='utf-8') as f:
-            detections_to_insert = []
-            for line_num, line in enumerate(f):
-                try:
-                    record = json.loads(line.strip())
-                    
-                    # Basic validation and type conversion
-                    message_id = record.get('message_id')
-                    image_path = record.get('image_path')
-                    scraped_date = record.get('scraped_date')
-                    channel_name = record.get('channel_name')
-                    detected_object_class = record.get('detected_object_class')
-                    confidence_score = record.get('confidence_score')
-                    detection_timestamp = record.get('timestamp')
-
-                    if not all([message_id, image_path, detected_object_class, confidence_score, detection_timestamp]):
-                        logger.warning(f"Skipping malformed record on line {line_num + 1} in {YOLO_DETECTIONS_FILE}: Missing required fields. Record: {line.strip()}")
-                        continue
-                    
-                    detections_to_insert.append((
-                        message_id,
-                        image_path,
-                        scraped_date,
-                        channel_name,
-                        detected_object_class,
-                        confidence_score,
-                        detection_timestamp,
-                        json.dumps(record)
-                    ))
-
-                    if len(detections_to_insert) >= 100:
-                        insert_sql = """
-                        INSERT INTO raw.raw_yolo_detections (message_id, image_path, scraped_date, channel_name, detected_object_class, confidence_score, detection_timestamp, raw_detection_json)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s::jsonb);
-                        """
-                        cursor.executemany(insert_sql, detections_to_insert)
-                        conn.commit()
-                        total_detections_loaded += cursor.rowcount
-                        logger.info(f"Loaded {total_detections_loaded} YOLO detections so far...")
-                        detections_to_insert = []
-
-                except json.JSONDecodeError as jde:
-                    logger.error(f"Error decoding JSON on line {line_num + 1} in {YOLO_DETECTIONS_FILE}: {jde}. Line: {line.strip()}", exc_info=True)
-                except Exception as e:
-                    logger.error(f"Error processing record on line {line_num + 1} in {YOLO_DETECTIONS_FILE}: {e}. Line: {line.strip()}", exc_info=True)
-            
-            if detections_to_insert:
-                insert_sql = """
-                INSERT INTO raw.raw_yolo_detections (message_id, image_path, scraped_date, channel_name, detected_object_class, confidence_score, detection_timestamp, raw_detection_json)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s::jsonb);
-                """
-                cursor.executemany(insert_sql, detections_to_insert)
-                conn.commit()
-                total_detections_loaded += cursor.rowcount
-
-        logger.info(f"Successfully loaded {total_detections_loaded} YOLO detections into PostgreSQL.")
+        for source_path in sources:
+            total_detections_loaded += load_detection_source(conn, cursor, source_path)
+
+        logger.info(f"Successfully loaded {total_detections_loaded} new YOLO detections into PostgreSQL "
+                    f"from {len(sources)} detection files.")
+        return {
+            'sources': len(sources),
+            'detections_loaded': total_detections_loaded,
+            'duration_seconds': round(time.monotonic() - started_at, 1)
+        }
 
     except psycopg2.Error as pg_err:
         logger.error(f"PostgreSQL connection or query error: {pg_err}", exc_info=True)
         if conn:
             conn.rollback()
+        raise
     except Exception as e:
         logger.error(f"An unexpected error occurred: {e}", exc_info=True)
         if conn:
             conn.rollback()
+        raise
     finally:
-        if conn:
+        if cursor:
             cursor.close()
+        if conn:
             conn.close()
             logger.info("PostgreSQL connection closed.")
 
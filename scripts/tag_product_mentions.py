@@ -0,0 +1,258 @@
+import os
+import time
+import argparse
+import psycopg2
+import logging
+from dotenv import load_dotenv
+from copy_utils import IteratorFile, copy_field
+from keyword_tagger import ProductTagger
+
+load_dotenv()
+
+POSTGRES_DB = os.getenv("POSTGRES_DB")
+POSTGRES_USER = os.getenv("POSTGRES_USER")
+POSTGRES_PASSWORD = os.getenv("POSTGRES_PASSWORD")
+POSTGRES_HOST = os.getenv("POSTGRES_HOST")
+POSTGRES_PORT = os.getenv("POSTGRES_PORT")
+
+PRODUCT_KEYWORDS_FILE = os.getenv("PRODUCT_KEYWORDS_FILE", 'scripts/product_keywords.csv')
+TAGGER_NAME = 'product_keywords'
+TAGGER_BATCH_SIZE = int(os.getenv("TAGGER_BATCH_SIZE", "10000"))
+
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+                    handlers=[
+                        logging.FileHandler('data/product_tagger.log'),
+                        logging.StreamHandler()
+                    ])
+logger = logging.getLogger(__name__)
+
+def create_product_mentions_tables(cursor):
+    """Ensures the product mention table, the tagger state table and the staging temp tables exist."""
+    create_table_sql = """
+    CREATE SCHEMA IF NOT EXISTS raw;
+    CREATE TABLE IF NOT EXISTS raw.raw_product_mentions (
+        channel_id BIGINT NOT NULL,
+        message_id BIGINT NOT NULL,
+        product_name TEXT NOT NULL,
+        matched_keyword TEXT NOT NULL,
+        span_start INTEGER NOT NULL,
+        span_end INTEGER NOT NULL,
+        tagged_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (channel_id, message_id, span_start, product_name)
+    );
+    CREATE INDEX IF NOT EXISTS idx_raw_product_mentions_tagged_at ON raw.raw_product_mentions (tagged_at);
+
+    -- Every message the tagger processed, with or without mentions, so downstream models can
+    -- replace the mentions of re-tagged messages even when none are left.
+    CREATE TABLE IF NOT EXISTS raw.raw_product_tagged_messages (
+        channel_id BIGINT NOT NULL,
+        message_id BIGINT NOT NULL,
+        dictionary_hash TEXT NOT NULL,
+        tagged_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (channel_id, message_id)
+    );
+    CREATE INDEX IF NOT EXISTS idx_raw_product_tagged_messages_tagged_at ON raw.raw_product_tagged_messages (tagged_at);
+
+    CREATE TABLE IF NOT EXISTS raw.raw_product_tagger_state (
+        tagger TEXT PRIMARY KEY,
+        dictionary_hash TEXT NOT NULL,
+        loaded_at_watermark TIMESTAMP WITH TIME ZONE NOT NULL,
+        updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+    );
+
+    CREATE TEMP TABLE IF NOT EXISTS tmp_tagged_messages (
+        channel_id BIGINT,
+        message_id BIGINT
+    );
+    CREATE TEMP TABLE IF NOT EXISTS tmp_product_mentions (
+        channel_id BIGINT,
+        message_id BIGINT,
+        product_name TEXT,
+        matched_keyword TEXT,
+        span_start INTEGER,
+        span_end INTEGER
+    );
+    """
+    try:
+        cursor.execute(create_table_sql)
+        logger.info("Table 'raw.raw_product_mentions' ensured to exist.")
+    except Exception as e:
+        logger.error(f"Error creating product mention tables: {e}", exc_info=True)
+        raise
+
+def copy_rows(cursor, table, columns, rows):
+    cursor.copy_expert(
+        f"COPY {table} ({', '.join(columns)}) FROM STDIN",
+        IteratorFile('\t'.join(copy_field(v) for v in row) + '\n' for row in rows),
+        size=1 << 16
+    )
+
+def write_batch(cursor, batch, tagger, stats):
+    """
+    Tags one batch of (channel_id, message_id, text), replaces those messages' mentions and
+    records them in raw.raw_product_tagged_messages.
+    """
+    started_at = time.monotonic()
+    mentions = []
+    for channel_id, message_id, text in batch:
+        for product_name, keyword, span_start, span_end in tagger.tag(text):
+            mentions.append((channel_id, message_id, product_name, keyword, span_start, span_end))
+    stats['tag_seconds'] += time.monotonic() - started_at
+
+    cursor.execute("TRUNCATE tmp_tagged_messages, tmp_product_mentions;")
+    copy_rows(cursor, 'tmp_tagged_messages', ('channel_id', 'message_id'),
+              ((channel_id, message_id) for channel_id, message_id, _ in batch))
+    copy_rows(cursor, 'tmp_product_mentions',
+              ('channel_id', 'message_id', 'product_name', 'matched_keyword', 'span_start', 'span_end'), mentions)
+    cursor.execute("""
+    DELETE FROM raw.raw_product_mentions pm
+    USING tmp_tagged_messages t
+    WHERE pm.channel_id = t.channel_id AND pm.message_id = t.message_id;
+    """)
+    cursor.execute("""
+    INSERT INTO raw.raw_product_mentions (channel_id, message_id, product_name, matched_keyword, span_start, span_end)
+    SELECT channel_id, message_id, product_name, matched_keyword, span_start, span_end
+    FROM tmp_product_mentions
+    ON CONFLICT DO NOTHING;
+    """)
+    cursor.execute("""
+    INSERT INTO raw.raw_product_tagged_messages (channel_id, message_id, dictionary_hash)
+    SELECT DISTINCT channel_id, message_id, %s
+    FROM tmp_tagged_messages
+    ON CONFLICT (channel_id, message_id) DO UPDATE SET
+        dictionary_hash = EXCLUDED.dictionary_hash,
+        tagged_at = EXCLUDED.tagged_at;
+    """, (tagger.dictionary_hash,))
+    stats['messages'] += len(batch)
+    stats['mentions'] += len(mentions)
+
+def tag_product_mentions(full=False, batch_size=TAGGER_BATCH_SIZE):
+    """
+    Tags product mentions in raw messages loaded since the last run and stores them as
+    (channel_id, message_id, product, keyword, span) rows in raw.raw_product_mentions; every
+    tagged message is also recorded, with the dictionary hash, in raw.raw_product_tagged_messages.
+
+    Messages are streamed with a server-side cursor and tagged in one pass each by the
+    Aho-Corasick ProductTagger. All messages are re-tagged when the keyword dictionary
+    (or normalizer) changes; the new watermark is committed with the mentions.
+    Returns a summary with the counts, the duration and the watermark.
+    """
+    tagger = ProductTagger.from_csv(PRODUCT_KEYWORDS_FILE)
+    logger.info(f"Loaded {len(tagger.automaton)} product keywords from {PRODUCT_KEYWORDS_FILE} "
+                f"({tagger.duplicates} duplicates after normalization, {tagger.automaton.backend} automaton).")
+
+    conn = None
+    cursor = None
+    try:
+        conn = psycopg2.connect(
+            dbname=POSTGRES_DB,
+            user=POSTGRES_USER,
+            password=POSTGRES_PASSWORD,
+            host=POSTGRES_HOST,
+            port=POSTGRES_PORT
+        )
+        cursor = conn.cursor()
+
+        create_product_mentions_tables(cursor)
+        conn.commit()
+
+        cursor.execute("SELECT MAX(loaded_at) FROM raw.raw_telegram_messages;")
+        upper_watermark = cursor.fetchone()[0]
+        if upper_watermark is None:
+            logger.info("No raw messages to tag.")
+            return {'messages': 0, 'mentions': 0, 'full': False, 'loaded_at_watermark': None, 'duration_seconds': 0.0}
+
+        cursor.execute("SELECT dictionary_hash, loaded_at_watermark FROM raw.raw_product_tagger_state WHERE tagger = %s;",
+                       (TAGGER_NAME,))
+        state = cursor.fetchone()
+        cursor.execute("SELECT EXISTS (SELECT 1 FROM raw.raw_product_tagged_messages);")
+        has_tagged_messages = cursor.fetchone()[0]
+        lower_watermark = None
+        if full or state is None:
+            logger.info("Tagging all raw messages.")
+        elif state[0] != tagger.dictionary_hash:
+            logger.info("Product keyword dictionary changed since the last run. Re-tagging all raw messages.")
+        elif not has_tagged_messages:
+            logger.info("No tagged messages recorded yet (first run with raw.raw_product_tagged_messages). Re-tagging all raw messages.")
+        else:
+            lower_watermark = state[1]
+            logger.info(f"Tagging raw messages loaded since {lower_watermark}.")
+
+        if lower_watermark is None:
+            # Drops mentions of keywords that were removed from the dictionary.
+            cursor.execute("DELETE FROM raw.raw_product_mentions;")
+            cursor.execute("DELETE FROM raw.raw_product_tagged_messages;")
+
+        stats = {'messages': 0, 'mentions': 0, 'tag_seconds': 0.0}
+        started_at = time.monotonic()
+        messages = conn.cursor(name='product_tagger_messages')
+        messages.itersize = batch_size
+        messages.execute("""
+        SELECT channel_id, message_id, message_text
+        FROM raw.raw_telegram_messages
+        WHERE loaded_at <= %s
+          AND (%s::timestamptz IS NULL OR loaded_at >= %s::timestamptz);
+        """, (upper_watermark, lower_watermark, lower_watermark))
+        while True:
+            batch = messages.fetchmany(batch_size)
+            if not batch:
+                break
+            write_batch(cursor, batch, tagger, stats)
+            logger.info(f"Tagged {stats['messages']} messages, {stats['mentions']} product mentions so far.")
+        messages.close()
+
+        cursor.execute("""
+        INSERT INTO raw.raw_product_tagger_state (tagger, dictionary_hash, loaded_at_watermark)
+        VALUES (%s, %s, %s)
+        ON CONFLICT (tagger) DO UPDATE SET
+            dictionary_hash = EXCLUDED.dictionary_hash,
+            loaded_at_watermark = EXCLUDED.loaded_at_watermark,
+            updated_at = CURRENT_TIMESTAMP;
+        """, (TAGGER_NAME, tagger.dictionary_hash, upper_watermark))
+        conn.commit()
+
+        elapsed = time.monotonic() - started_at
+        rate = stats['messages'] / stats['tag_seconds'] if stats['tag_seconds'] else 0
+        logger.info(f"Successfully tagged {stats['messages']} messages with {stats['mentions']} product mentions "
+                    f"in {elapsed:.1f}s (tagging {rate:.0f} messages/sec).")
+        return {
+            'messages': stats['messages'],
+            'mentions': stats['mentions'],
+            'full': lower_watermark is None,
+            'loaded_at_watermark': upper_watermark,
+            'duration_seconds': round(elapsed, 1)
+        }
+
+    except psycopg2.Error as pg_err:
+        logger.error(f"PostgreSQL connection or query error: {pg_err}", exc_info=True)
+        if conn:
+            conn.rollback()
+        raise
+    except Exception as e:
+        logger.error(f"An unexpected error occurred: {e}", exc_info=True)
+        if conn:
+            conn.rollback()
+        raise
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+            logger.info("PostgreSQL connection closed.")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Tag product mentions in raw Telegram messages.")
+    parser.add_argument('--full', action='store_true',
+                        help="Re-tag every raw message instead of only those loaded since the last run.")
+    parser.add_argument('--batch-size', type=int, default=TAGGER_BATCH_SIZE,
+                        help="Messages fetched, tagged and written per batch.")
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    if not all([POSTGRES_DB, POSTGRES_USER, POSTGRES_PASSWORD, POSTGRES_HOST, POSTGRES_PORT]):
+        logger.error("PostgreSQL environment variables not fully set. Please check your .env file.")
+        exit(1)
+
+    args = parse_args()
+    tag_product_mentions(full=args.full, batch_size=args.batch_size)
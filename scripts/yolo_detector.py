@@ -3,16 +3,63 @@ import json
 import logging
 import datetime
 import asyncio
+import argparse
 import re
+import time
+import sqlite3
+import queue
+import shutil
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+import numpy as np
+from PIL import Image
 from ultralytics import YOLO
 from hashlib import md5
 
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
 RAW_IMAGES_DIR = 'data/raw/telegram_images'
 PROCESSED_DATA_DIR = 'data/processed'
-YOLO_DETECTIONS_FILE = os.path.join(PROCESSED_DATA_DIR, 'yolo_detections.jsonl')
+YOLO_DETECTIONS_DIR = os.path.join(PROCESSED_DATA_DIR, 'yolo_detections')
+YOLO_STAGING_DIR = os.path.join(PROCESSED_DATA_DIR, 'staging')
 PROCESSED_IMAGES_LOG = os.path.join(PROCESSED_DATA_DIR, 'processed_images.log')
+PROCESSED_IMAGES_DB = os.path.join(PROCESSED_DATA_DIR, 'processed_images.sqlite')
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.bmp')
+MODEL_CACHE_DIR = os.getenv("YOLO_MODEL_CACHE_DIR", 'data/models')
+
+YOLO_BATCH_SIZE = int(os.getenv("YOLO_BATCH_SIZE", "16"))
+YOLO_IMAGE_SIZE = int(os.getenv("YOLO_IMAGE_SIZE", "640"))
+YOLO_THREADS = int(os.getenv("YOLO_THREADS", "0"))
+YOLO_PREP_WORKERS = int(os.getenv("YOLO_PREP_WORKERS", "4"))
+YOLO_PREFETCH_BATCHES = int(os.getenv("YOLO_PREFETCH_BATCHES", "2"))
+YOLO_WORKERS = int(os.getenv("YOLO_WORKERS", "1"))
+YOLO_OUTPUT_FORMAT = os.getenv("YOLO_OUTPUT_FORMAT", "jsonl")
+DETECTION_FLUSH_RECORDS = int(os.getenv("DETECTION_FLUSH_RECORDS", "1000"))
+DETECTION_EXTENSIONS = {'jsonl': '.jsonl', 'parquet': '.parquet'}
+
+YOLO_WEIGHTS = os.getenv("YOLO_WEIGHTS", "yolov8n.pt")
+YOLO_BACKEND = os.getenv("YOLO_BACKEND", "pytorch")
+YOLO_PARITY_SAMPLES = int(os.getenv("YOLO_PARITY_SAMPLES", "16"))
+YOLO_PARITY_IOU = float(os.getenv("YOLO_PARITY_IOU", "0.5"))
+YOLO_PARITY_MIN_MATCH = float(os.getenv("YOLO_PARITY_MIN_MATCH", "0.95"))
+# Ultralytics export arguments per backend, and how far confidences may drift from PyTorch.
+YOLO_BACKENDS = {
+    'pytorch': {'export': None, 'confidence_tolerance': 0.0},
+    'onnx': {'export': {'format': 'onnx', 'dynamic': True, 'simplify': True}, 'confidence_tolerance': 0.02},
+    'openvino': {'export': {'format': 'openvino', 'dynamic': True}, 'confidence_tolerance': 0.02},
+    'openvino-int8': {'export': {'format': 'openvino', 'int8': True}, 'confidence_tolerance': 0.1},
+}
 
 os.makedirs(PROCESSED_DATA_DIR, exist_ok=True)
+os.makedirs(YOLO_DETECTIONS_DIR, exist_ok=True)
+os.makedirs(YOLO_STAGING_DIR, exist_ok=True)
 
 logging.basicConfig(level=logging.INFO,
                     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -22,11 +69,11 @@ logging.basicConfig(level=logging.INFO,
                     ])
 logger = logging.getLogger(__name__)
 
-def load_yolo_model():
-    """Loads a pre-trained YOLOv8n model."""
+def load_yolo_model(model_path=YOLO_WEIGHTS):
+    """Loads a pre-trained YOLOv8n model, either the PyTorch weights or an exported artifact."""
     try:
-        model = YOLO('yolov8n.pt')
-        logger.info("YOLOv8n model loaded successfully.")
+        model = YOLO(model_path, task='detect')
+        logger.info(f"YOLOv8n model loaded successfully from {model_path}.")
         return model
     except Exception as e:
         logger.error(f"Error loading YOLOv8 model: {e}", exc_info=True)
@@ -37,32 +84,291 @@ def get_image_hash(image_path):
     hasher = md5()
     try:
         with open(image_path, 'rb') as f:
-            buf = f.read()
-            hasher.update(buf)
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                hasher.update(chunk)
         return hasher.hexdigest()
     except Exception as e:
         logger.warning(f"Could not hash image {image_path}: {e}")
         return None
 
-def get_processed_image_hashes():
-    """Reads the set of already processed image hashes from the log file."""
-    processed_hashes = set()
-    if os.path.exists(PROCESSED_IMAGES_LOG):
+class ProcessedImageIndex:
+    """
+    SQLite index of images already handled by the detector, replacing processed_images.log.
+
+    Rows are keyed by path and remember the file's size and mtime, so an unchanged file is
+    skipped with a single stat and no read. A content-hash table still catches the same
+    image stored under a new path. Status updates are buffered and written in batched
+    transactions. The legacy log is imported on first use and renamed to `*.migrated`.
+    """
+    def __init__(self, db_path=PROCESSED_IMAGES_DB, read_only=False, flush_every=500):
+        if read_only:
+            self.conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False, timeout=30)
+        else:
+            self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+            self.conn.execute("PRAGMA journal_mode=WAL;")
+            self.conn.execute("PRAGMA synchronous=NORMAL;")
+            self._create_schema()
+            self._migrate_legacy_log()
+        self.flush_every = flush_every
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def _create_schema(self):
+        self.conn.executescript("""
+        CREATE TABLE IF NOT EXISTS images (
+            path TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            content_hash TEXT,
+            status TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_images_content_hash ON images (content_hash);
+        CREATE TABLE IF NOT EXISTS content_hashes (
+            content_hash TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        );
+        """)
+
+    def _migrate_legacy_log(self, log_path=PROCESSED_IMAGES_LOG):
+        if not os.path.exists(log_path):
+            return
+        now = datetime.datetime.now().isoformat()
         try:
-            with open(PROCESSED_IMAGES_LOG, 'r') as f:
-                for line in f:
-                    processed_hashes.add(line.strip())
+            with open(log_path, 'r') as f, self.conn:
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO content_hashes (content_hash, status, updated_at) VALUES (?, 'processed', ?);",
+                    ((line.strip(), now) for line in f if line.strip())
+                )
+            os.replace(log_path, f"{log_path}.migrated")
+            logger.info(f"Migrated {log_path} into {PROCESSED_IMAGES_DB}.")
         except Exception as e:
-            logger.error(f"Error reading processed images log: {e}", exc_info=True)
-    return processed_hashes
+            logger.error(f"Error migrating processed images log: {e}", exc_info=True)
+            raise
 
-def log_processed_image_hash(image_hash):
-    """Appends a new image hash to the processed images log file."""
-    try:
-        with open(PROCESSED_IMAGES_LOG, 'a') as f:
-            f.write(f"{image_hash}\n")
-    except Exception as e:
-        logger.error(f"Error writing to processed images log: {e}", exc_info=True)
+    def is_unchanged(self, image_path, stat_result):
+        """True when the path was already handled and its size and mtime have not changed since."""
+        with self._lock:
+            row = self.conn.execute("SELECT size, mtime_ns FROM images WHERE path = ?;", (image_path,)).fetchone()
+        return row is not None and row[0] == stat_result.st_size and row[1] == stat_result.st_mtime_ns
+
+    def is_hash_processed(self, content_hash):
+        """True when an image with this content got detections. Older indexes also hold other
+        statuses here; a 'duplicate' row was only written for an already processed hash."""
+        with self._lock:
+            row = self.conn.execute("SELECT 1 FROM content_hashes WHERE content_hash = ? "
+                                    "AND status IN ('processed', 'duplicate');", (content_hash,)).fetchone()
+        return row is not None
+
+    def mark(self, image_path, size, mtime_ns, content_hash, status):
+        with self._lock:
+            self._pending.append((image_path, size, mtime_ns, content_hash, status, datetime.datetime.now().isoformat()))
+            should_flush = len(self._pending) >= self.flush_every
+        if should_flush:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, []
+            with self.conn:
+                self.conn.executemany("""
+                INSERT INTO images (path, size, mtime_ns, content_hash, status, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (path) DO UPDATE SET
+                    size = excluded.size,
+                    mtime_ns = excluded.mtime_ns,
+                    content_hash = excluded.content_hash,
+                    status = excluded.status,
+                    updated_at = excluded.updated_at;
+                """, pending)
+                # Only processed content counts for duplicates: a skipped or failed image must not
+                # keep a later copy of the same content from being detected.
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO content_hashes (content_hash, status, updated_at) VALUES (?, ?, ?);",
+                    [(row[3], row[4], row[5]) for row in pending if row[3] and row[4] == 'processed']
+                )
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+class ProcessedUpdatesLog:
+    """
+    Sidecar of index updates for one output segment.
+
+    Updates only reach ProcessedImageIndex once the segment holding their detections has
+    been published, so a crash never marks an image processed whose detections were lost.
+    """
+    def __init__(self, staging_dir, segment_id):
+        self.final_path = os.path.join(staging_dir, f"processed-{segment_id}.jsonl")
+        self.part_path = f"{self.final_path}.part"
+        self._file = open(self.part_path, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def mark(self, image_path, size, mtime_ns, content_hash, status):
+        with self._lock:
+            self._file.write(json.dumps([image_path, size, mtime_ns, content_hash, status]) + '\n')
+
+    def sync(self):
+        with self._lock:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        self.sync()
+        self._file.close()
+        os.replace(self.part_path, self.final_path)
+
+class DetectionWriter:
+    """
+    Single writer for the detection records of one run (or one shard of a run).
+
+    Records are buffered and written in chunks of `flush_records`; `sync` is called at
+    image-batch boundaries and fsyncs what has been written. Output goes to one segment
+    file, written as `*.part` and renamed on close. With output_format='parquet' the
+    segment is a Parquet file (requires pyarrow) that loaders can read without parsing JSON.
+    """
+    PARQUET_FIELDS = (
+        ('message_id', 'int64'),
+        ('image_path', 'string'),
+        ('scraped_date', 'string'),
+        ('channel_name', 'string'),
+        ('detected_object_class', 'string'),
+        ('confidence_score', 'float64'),
+        ('detection_index', 'int64'),
+        ('bbox', 'list<float64>'),
+        ('timestamp', 'string')
+    )
+
+    def __init__(self, staging_dir, segment_id, output_format=YOLO_OUTPUT_FORMAT, flush_records=DETECTION_FLUSH_RECORDS):
+        if output_format not in DETECTION_EXTENSIONS:
+            raise ValueError(f"Unsupported detection output format '{output_format}'. Expected one of {sorted(DETECTION_EXTENSIONS)}.")
+        if output_format == 'parquet' and pa is None:
+            raise ValueError("Parquet output requested but the 'pyarrow' package is not installed.")
+        self.output_format = output_format
+        self.flush_records = max(1, flush_records)
+        self.final_path = os.path.join(staging_dir, f"detections-{segment_id}{DETECTION_EXTENSIONS[output_format]}")
+        self.part_path = f"{self.final_path}.part"
+        self.records_written = 0
+        self._buffer = []
+        self._file = open(self.part_path, 'wb')
+        self._parquet_writer = None
+        if output_format == 'parquet':
+            schema = pa.schema([
+                (name, pa.list_(pa.float64()) if type_name == 'list<float64>' else getattr(pa, type_name)())
+                for name, type_name in self.PARQUET_FIELDS
+            ])
+            self._parquet_writer = pq.ParquetWriter(self._file, schema)
+
+    def write(self, record):
+        self._buffer.append(record)
+        if len(self._buffer) >= self.flush_records:
+            self._flush_buffer()
+
+    def _flush_buffer(self):
+        if not self._buffer:
+            return
+        if self._parquet_writer is not None:
+            self._parquet_writer.write_table(pa.Table.from_pylist(self._buffer, schema=self._parquet_writer.schema))
+        else:
+            self._file.write(b''.join(json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n' for record in self._buffer))
+        self.records_written += len(self._buffer)
+        self._buffer = []
+
+    def sync(self):
+        # Parquet keeps small batches buffered so row groups stay large; the segment is only
+        # usable once its footer is written on close anyway.
+        if self._parquet_writer is None or len(self._buffer) >= self.flush_records:
+            self._flush_buffer()
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self._flush_buffer()
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        if self.records_written:
+            os.replace(self.part_path, self.final_path)
+        else:
+            os.remove(self.part_path)
+
+def truncate_to_last_line(path):
+    """Drops a torn trailing line left by a crashed writer."""
+    with open(path, 'rb+') as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        position = size
+        while position > 0:
+            step = min(1 << 16, position)
+            f.seek(position - step)
+            chunk = f.read(step)
+            newline = chunk.rfind(b'\n')
+            if newline != -1:
+                position = position - step + newline + 1
+                break
+            position -= step
+        if position != size:
+            f.truncate(position)
+    return position
+
+def publish_staged_outputs(index):
+    """
+    Moves finished (or recoverable) detection segments from YOLO_STAGING_DIR into
+    YOLO_DETECTIONS_DIR and only then applies their sidecar updates to the index.
+
+    Segments left as `*.part` by a crashed writer are kept up to their last complete line
+    for JSONL (every batch was fsynced before its index updates were written) and dropped
+    for Parquet, whose images are then retried.
+    """
+    segment_ids = sorted({
+        name[len('processed-'):].split('.jsonl')[0]
+        for name in os.listdir(YOLO_STAGING_DIR) if name.startswith('processed-')
+    })
+    published = 0
+    for segment_id in segment_ids:
+        sidecar_path = os.path.join(YOLO_STAGING_DIR, f"processed-{segment_id}.jsonl")
+        if not os.path.exists(sidecar_path):
+            sidecar_path = f"{sidecar_path}.part"
+
+        segment_path = None
+        for extension in DETECTION_EXTENSIONS.values():
+            for candidate in (f"detections-{segment_id}{extension}", f"detections-{segment_id}{extension}.part"):
+                if os.path.exists(os.path.join(YOLO_STAGING_DIR, candidate)):
+                    segment_path = os.path.join(YOLO_STAGING_DIR, candidate)
+
+        if segment_path and segment_path.endswith('.parquet.part'):
+            logger.warning(f"Discarding incomplete Parquet segment {segment_path}; its images will be retried.")
+            os.remove(segment_path)
+            os.remove(sidecar_path)
+            continue
+        if segment_path and segment_path.endswith('.part'):
+            if truncate_to_last_line(segment_path) == 0:
+                os.remove(segment_path)
+                segment_path = None
+            else:
+                logger.warning(f"Recovering detections from interrupted segment {segment_path}.")
+        if segment_path:
+            published_name = os.path.basename(segment_path)
+            if published_name.endswith('.part'):
+                published_name = published_name[:-len('.part')]
+            os.replace(segment_path, os.path.join(YOLO_DETECTIONS_DIR, published_name))
+            published += 1
+
+        with open(sidecar_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    index.mark(*json.loads(line))
+                except (ValueError, TypeError):
+                    break
+        index.flush()
+        os.remove(sidecar_path)
+    return published
 
 def extract_metadata_from_path(image_path):
     """
@@ -87,20 +393,57 @@ def extract_metadata_from_path(image_path):
 
     return scraped_date_str, channel_name, message_id
 
-async def run_yolo_detection():
+def configure_inference_threads(threads):
+    """Pins PyTorch's intra-op thread pool; 0 keeps the library default (one per core)."""
+    if threads and threads > 0:
+        import torch
+        torch.set_num_threads(threads)
+        logger.info(f"Using {threads} inference threads.")
+
+def configure_backend_threads(model, model_path, threads, imgsz):
     """
-    Scans for new images, runs YOLOv8 detection, and logs results.
+    Applies the thread count to an exported ONNX Runtime or OpenVINO model, which ignore
+    torch.set_num_threads. Ultralytics creates the runtime session on the first prediction
+    without thread options, so a warm-up prediction creates it and it is rebuilt with
+    `threads` intra-op threads. Best effort: on failure the runtime default is kept.
     """
-    model = load_yolo_model()
-    if not model:
+    if not threads or threads <= 0:
         return
+    try:
+        model.predict(source=np.zeros((imgsz, imgsz, 3), dtype=np.uint8), imgsz=imgsz, verbose=False)
+        backend = model.predictor.model
+        if getattr(backend, 'onnx', False):
+            import onnxruntime
+            options = onnxruntime.SessionOptions()
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+            backend.session = onnxruntime.InferenceSession(model_path, sess_options=options,
+                                                           providers=backend.session.get_providers())
+        elif getattr(backend, 'xml', False):
+            # Compiled for the CPU explicitly: the AUTO device does not accept CPU thread settings.
+            config = {'PERFORMANCE_HINT': getattr(backend, 'inference_mode', 'LATENCY'), 'INFERENCE_NUM_THREADS': threads}
+            backend.ov_compiled_model = backend.core.compile_model(backend.ov_model, device_name='CPU', config=config)
+        else:
+            return
+        logger.info(f"Using {threads} inference threads in the exported model's runtime.")
+    except Exception as e:
+        logger.warning(f"Could not set the thread count of {model_path}; keeping the runtime default: {e}", exc_info=True)
 
-    processed_hashes = get_processed_image_hashes()
-    new_detections_count = 0
-    images_scanned_count = 0
+def load_inference_model(settings):
+    """Loads the run's model with its inference thread count applied to PyTorch and the exported runtime."""
+    configure_inference_threads(settings['threads'])
+    model = load_yolo_model(settings['model_path'])
+    configure_backend_threads(model, settings['model_path'], settings['threads'], settings['imgsz'])
+    return model
 
-    logger.info(f"Starting YOLO object detection. Scanning directory: {RAW_IMAGES_DIR}")
+def image_shard(image_path, shard_count):
+    return int(md5(image_path.encode('utf-8')).hexdigest(), 16) % shard_count
 
+def iter_image_paths(shard_index=0, shard_count=1):
+    """
+    Walks RAW_IMAGES_DIR (date/channel/file) and yields every image path,
+    or only those whose path hash falls into the given shard.
+    """
     for date_dir in os.listdir(RAW_IMAGES_DIR):
         full_date_dir_path = os.path.join(RAW_IMAGES_DIR, date_dir)
         if not os.path.isdir(full_date_dir_path):
@@ -112,54 +455,588 @@ async def run_yolo_detection():
                 continue
 
             for filename in os.listdir(full_channel_dir_path):
-                if filename.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.bmp')):
-                    image_path = os.path.join(full_channel_dir_path, filename)
-                    images_scanned_count += 1
-
-                    image_hash = get_image_hash(image_path)
-                    if image_hash in processed_hashes:
-                        continue
-
-                    scraped_date_str, channel_name, message_id = extract_metadata_from_path(image_path)
-                    if not message_id:
-                        logger.warning(f"Skipping image {image_path} due to missing message_id.")
-                        log_processed_image_hash(image_hash)
-                        continue
-
-                    try:
-                        results = model.predict(source=image_path, conf=0.25, iou=0.7, verbose=False)
-
-                        for r in results:
-                            boxes = r.boxes
-                            names = r.names
-
-                            for box in boxes:
-                                class_id = int(box.cls[0])
-                                confidence = float(box.conf[0])
-                                object_class = names[class_id]
-
-                                detection_record = {
-                                    'message_id': message_id,
-                                    'image_path': image_path,
-                                    'scraped_date': scraped_date_str,
-                                    'channel_name': channel_name,
-                                    'detected_object_class': object_class,
-                                    'confidence_score': confidence,
-                                    'timestamp': datetime.datetime.now().isoformat()
-                                }
-
-                                with open(YOLO_DETECTIONS_FILE, 'a', encoding='utf-8') as f:
-                                    json.dump(detection_record, f, ensure_ascii=False)
-                                    f.write('\n')
-                                new_detections_count += 1
-                        
-                        log_processed_image_hash(image_hash)
-
-                    except Exception as e:
-                        logger.error(f"Error processing image {image_path}: {e}", exc_info=True)
-                        log_processed_image_hash(image_hash)
-
-    logger.info(f"YOLO detection complete. Scanned {images_scanned_count} images. Found {new_detections_count} new detections.")
+                if not filename.lower().endswith(IMAGE_EXTENSIONS):
+                    continue
+                image_path = os.path.join(full_channel_dir_path, filename)
+                if shard_count > 1 and image_shard(image_path, shard_count) != shard_index:
+                    continue
+                yield image_path
+
+def decode_image(image_path):
+    """Decodes an image into a BGR array, falling back to PIL for formats OpenCV cannot read (e.g. GIF)."""
+    image = cv2.imread(image_path, cv2.IMREAD_COLOR)
+    if image is not None:
+        return image
+    with Image.open(image_path) as pil_image:
+        return np.ascontiguousarray(np.asarray(pil_image.convert('RGB'))[:, :, ::-1])
+
+def prepare_image(image_path, index, mark_processed):
+    """
+    Hashes and decodes one image. Returns None for images that need no inference;
+    images that cannot be used are returned with `image` set to None and a `status`
+    so the writer records them in the index.
+    """
+    stat_result = os.stat(image_path)
+    if index.is_unchanged(image_path, stat_result):
+        return None
+
+    image_hash = get_image_hash(image_path)
+    if image_hash is None:
+        return None
+    if index.is_hash_processed(image_hash):
+        mark_processed(image_path, stat_result.st_size, stat_result.st_mtime_ns, image_hash, 'duplicate')
+        return None
+
+    scraped_date_str, channel_name, message_id = extract_metadata_from_path(image_path)
+    item = {
+        'image_path': image_path,
+        'image_hash': image_hash,
+        'scraped_date': scraped_date_str,
+        'channel_name': channel_name,
+        'message_id': message_id,
+        'size': stat_result.st_size,
+        'mtime_ns': stat_result.st_mtime_ns,
+        'image': None,
+        'status': 'skipped'
+    }
+    if not message_id:
+        logger.warning(f"Skipping image {image_path} due to missing message_id.")
+        return item
+    try:
+        item['image'] = decode_image(image_path)
+    except Exception as e:
+        item['status'] = 'failed'
+        logger.error(f"Error decoding image {image_path}: {e}", exc_info=True)
+    return item
+
+def iter_batches(items, batch_size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def build_detection_records(result, item):
+    """
+    Maps the boxes of one prediction result back to its image's message metadata. Each box
+    keeps its position in the result (detection_index) and its xyxy pixel coordinates, so
+    boxes of the same class and confidence stay distinct.
+    """
+    records = []
+    names = result.names
+    for detection_index, box in enumerate(result.boxes):
+        class_id = int(box.cls[0])
+        records.append({
+            'message_id': item['message_id'],
+            'image_path': item['image_path'],
+            'scraped_date': item['scraped_date'],
+            'channel_name': item['channel_name'],
+            'detected_object_class': names[class_id],
+            'confidence_score': float(box.conf[0]),
+            'detection_index': detection_index,
+            'bbox': [round(value, 1) for value in box.xyxy[0].tolist()],
+            'timestamp': datetime.datetime.now().isoformat()
+        })
+    return records
+
+def predict_batch(model, batch, imgsz):
+    """
+    Runs one predict call for the whole batch of decoded images. If it fails,
+    falls back to per-image calls so a single bad image does not drop its neighbours.
+    Returns a list of (item, result or None) pairs.
+    """
+    try:
+        results = model.predict(source=[item['image'] for item in batch], imgsz=imgsz,
+                                conf=0.25, iou=0.7, batch=len(batch), verbose=False)
+        return list(zip(batch, results))
+    except Exception as e:
+        logger.warning(f"Batch prediction of {len(batch)} images failed ({e}). Retrying images one by one.")
+
+    pairs = []
+    for item in batch:
+        try:
+            results = model.predict(source=item['image'], imgsz=imgsz, conf=0.25, iou=0.7, verbose=False)
+            pairs.append((item, results[0]))
+        except Exception as e:
+            logger.error(f"Error processing image {item['image_path']}: {e}", exc_info=True)
+            pairs.append((item, None))
+    return pairs
+
+def detection_boxes(result):
+    """Returns the (class_id, confidence, xyxy) triples of one prediction result."""
+    boxes = result.boxes
+    return list(zip(boxes.cls.tolist(), boxes.conf.tolist(), boxes.xyxy.tolist()))
+
+def box_iou(a, b):
+    inter_w = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    inter_h = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    intersection = inter_w * inter_h
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - intersection
+    return intersection / union if union > 0 else 0.0
+
+def compare_detections(reference_boxes, candidate_boxes, confidence_tolerance, iou_threshold=YOLO_PARITY_IOU):
+    """
+    Greedily matches candidate boxes to reference boxes of the same class by IoU.
+
+    A pair counts as matched when its confidences differ by at most `confidence_tolerance`.
+    Unmatched boxes scoring within the tolerance of the 0.25 confidence cut-off are ignored,
+    since a small drift legitimately moves them across it.
+    """
+    borderline = 0.25 + confidence_tolerance
+    unmatched = list(candidate_boxes)
+    matched = 0
+    mismatched = 0
+    for class_id, confidence, xyxy in sorted(reference_boxes, key=lambda box: -box[1]):
+        best, best_iou = None, iou_threshold
+        for candidate in unmatched:
+            if candidate[0] == class_id:
+                iou = box_iou(xyxy, candidate[2])
+                if iou >= best_iou:
+                    best, best_iou = candidate, iou
+        if best is None:
+            if confidence >= borderline:
+                mismatched += 1
+            continue
+        unmatched.remove(best)
+        if abs(best[1] - confidence) <= confidence_tolerance:
+            matched += 1
+        else:
+            mismatched += 1
+    mismatched += sum(1 for candidate in unmatched if candidate[1] >= borderline)
+    return matched, mismatched
+
+def run_parity_check(reference_model, candidate_model, backend, imgsz, sample_count=YOLO_PARITY_SAMPLES):
+    """
+    Runs both models over a sample of the scraped images and compares their detections.
+    Returns a summary dict, or None when there are no images to sample yet.
+    """
+    samples = []
+    for image_path in iter_image_paths():
+        try:
+            image = decode_image(image_path)
+        except Exception as e:
+            logger.warning(f"Skipping undecodable image {image_path} in the {backend} parity check: {e}", exc_info=True)
+            continue
+        if image is not None:
+            samples.append(image)
+        if len(samples) >= sample_count:
+            break
+    if not samples:
+        logger.warning(f"No images available for the {backend} parity check; skipping it.")
+        return None
+
+    confidence_tolerance = YOLO_BACKENDS[backend]['confidence_tolerance']
+    matched = mismatched = 0
+    for image in samples:
+        reference = reference_model.predict(source=image, imgsz=imgsz, conf=0.25, iou=0.7, verbose=False)[0]
+        candidate = candidate_model.predict(source=image, imgsz=imgsz, conf=0.25, iou=0.7, verbose=False)[0]
+        image_matched, image_mismatched = compare_detections(detection_boxes(reference), detection_boxes(candidate),
+                                                             confidence_tolerance)
+        matched += image_matched
+        mismatched += image_mismatched
+
+    compared = matched + mismatched
+    match_rate = matched / compared if compared else 1.0
+    summary = {
+        'images': len(samples),
+        'matched_boxes': matched,
+        'mismatched_boxes': mismatched,
+        'match_rate': round(match_rate, 4),
+        'confidence_tolerance': confidence_tolerance,
+        'passed': match_rate >= YOLO_PARITY_MIN_MATCH,
+        'checked_at': datetime.datetime.now().isoformat()
+    }
+    log = logger.info if summary['passed'] else logger.error
+    log(f"Parity check {backend} vs pytorch on {len(samples)} images: {matched}/{compared} boxes match "
+        f"(IoU >= {YOLO_PARITY_IOU}, confidence within {confidence_tolerance}).")
+    return summary
+
+def export_model(weights_path, weights_hash, backend, imgsz):
+    """
+    Exports the weights for `backend` into the model cache, keyed by weights hash, backend
+    and image size. The export runs in a scratch directory that is renamed into place,
+    so concurrent or interrupted runs never see a partial artifact.
+    """
+    stem = os.path.splitext(os.path.basename(weights_path))[0]
+    cache_dir = os.path.join(MODEL_CACHE_DIR, f"{stem}-{weights_hash[:16]}", f"{backend}-{imgsz}")
+    manifest_path = os.path.join(cache_dir, 'export.json')
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return cache_dir, json.load(f)
+
+    scratch_dir = f"{cache_dir}.part-{os.getpid()}"
+    shutil.rmtree(scratch_dir, ignore_errors=True)
+    os.makedirs(scratch_dir)
+    logger.info(f"Exporting {weights_path} for the {backend} backend (image size {imgsz}); this is done once per weights file.")
+    try:
+        scratch_weights = os.path.join(scratch_dir, os.path.basename(weights_path))
+        shutil.copy2(weights_path, scratch_weights)
+        artifact = YOLO(scratch_weights).export(imgsz=imgsz, **YOLO_BACKENDS[backend]['export'])
+        os.remove(scratch_weights)
+        manifest = {
+            'weights': weights_path,
+            'weights_hash': weights_hash,
+            'backend': backend,
+            'imgsz': imgsz,
+            'artifact': os.path.relpath(str(artifact), scratch_dir),
+            'exported_at': datetime.datetime.now().isoformat()
+        }
+        with open(os.path.join(scratch_dir, 'export.json'), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+        try:
+            os.replace(scratch_dir, cache_dir)
+        except OSError:
+            # Another process exported the same artifact first.
+            shutil.rmtree(scratch_dir, ignore_errors=True)
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        return cache_dir, manifest
+    except Exception:
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+        raise
+
+def resolve_model_path(backend=YOLO_BACKEND, imgsz=YOLO_IMAGE_SIZE, force_parity_check=False,
+                       parity_samples=YOLO_PARITY_SAMPLES):
+    """
+    Returns the model path to run inference with. For non-PyTorch backends the exported
+    artifact is taken from the cache (exporting it on first use) and checked against the
+    PyTorch model; if the parity check fails or has no images to run on, inference falls
+    back to the PyTorch weights.
+    """
+    if backend not in YOLO_BACKENDS:
+        raise ValueError(f"Unsupported YOLO backend '{backend}'. Expected one of {sorted(YOLO_BACKENDS)}.")
+    if backend == 'pytorch':
+        return YOLO_WEIGHTS
+
+    reference_model = None
+    weights_path = YOLO_WEIGHTS
+    if not os.path.exists(weights_path):
+        # Ultralytics downloads the named weights on first load.
+        reference_model = load_yolo_model(YOLO_WEIGHTS)
+        weights_path = str(getattr(reference_model, 'ckpt_path', None) or YOLO_WEIGHTS)
+    weights_hash = get_image_hash(weights_path)
+    if weights_hash is None:
+        raise ValueError(f"Cannot hash YOLO weights at {weights_path}.")
+
+    cache_dir, manifest = export_model(weights_path, weights_hash, backend, imgsz)
+    artifact_path = os.path.join(cache_dir, manifest['artifact'])
+
+    if force_parity_check or 'parity' not in manifest:
+        reference_model = reference_model or load_yolo_model(weights_path)
+        parity = run_parity_check(reference_model, load_yolo_model(artifact_path), backend, imgsz, parity_samples)
+        if parity is not None:
+            manifest['parity'] = parity
+            manifest_path = os.path.join(cache_dir, 'export.json')
+            with open(f"{manifest_path}.part", 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, indent=2)
+            os.replace(f"{manifest_path}.part", manifest_path)
+
+    parity = manifest.get('parity')
+    if parity is None:
+        # Nothing was verified (no images to sample yet); the check runs again on the next run.
+        logger.warning(f"The {backend} export at {artifact_path} has not passed a parity check. "
+                       f"Falling back to the PyTorch backend.")
+        return weights_path
+    if not parity['passed']:
+        logger.error(f"The {backend} export at {artifact_path} does not match the PyTorch model "
+                     f"(match rate {parity['match_rate']}). Falling back to the PyTorch backend.")
+        return weights_path
+    logger.info(f"Using the {backend} backend: {artifact_path}")
+    return artifact_path
+
+_STAGE_DONE = object()
+
+def walker_stage(image_paths, path_queue, worker_count, stats, stop_event):
+    """Stage 1: feeds discovered image paths to the prep workers."""
+    try:
+        for image_path in image_paths:
+            if stop_event.is_set():
+                break
+            stats['images_scanned'] += 1
+            path_queue.put(image_path)
+    except Exception as e:
+        logger.error(f"Error walking {RAW_IMAGES_DIR}: {e}", exc_info=True)
+    finally:
+        for _ in range(worker_count):
+            path_queue.put(_STAGE_DONE)
+
+def prep_stage(path_queue, ready_queue, writer_queue, index, mark_processed, stop_event):
+    """Stage 2 (thread pool): hashes and decodes images while the previous batch is being inferred."""
+    try:
+        while True:
+            image_path = path_queue.get()
+            if image_path is _STAGE_DONE:
+                break
+            if stop_event.is_set():
+                continue
+            try:
+                item = prepare_image(image_path, index, mark_processed)
+            except Exception as e:
+                logger.error(f"Error preparing image {image_path}: {e}", exc_info=True)
+                continue
+            if item is None:
+                continue
+            if item['image'] is None:
+                writer_queue.put([(item, None)])
+            else:
+                ready_queue.put(item)
+    finally:
+        ready_queue.put(_STAGE_DONE)
+
+def writer_stage(writer_queue, stats, detection_writer, updates):
+    """
+    Stage 4: the single writer of detection records. Each inference batch is fsynced
+    before its images are marked processed.
+    """
+    while True:
+        pairs = writer_queue.get()
+        if pairs is _STAGE_DONE:
+            break
+        try:
+            for item, result in pairs:
+                if result is not None:
+                    for detection_record in build_detection_records(result, item):
+                        detection_writer.write(detection_record)
+                        stats['new_detections'] += 1
+            detection_writer.sync()
+            for item, result in pairs:
+                status = 'processed' if result is not None else item.get('status', 'failed')
+                updates.mark(item['image_path'], item['size'], item['mtime_ns'], item['image_hash'], status)
+            updates.sync()
+        except Exception as e:
+            logger.error(f"Error writing results for {len(pairs)} images: {e}", exc_info=True)
+
+def detect_images(model, image_paths, index, detection_writer, updates,
+                  batch_size, imgsz, prep_workers, prefetch_batches):
+    """
+    Runs the staged detection pipeline over `image_paths`: a walker, a thread pool that
+    hashes and decodes images, batched inference on this thread and a writer thread.
+    The queues between stages are bounded, so at most `prefetch_batches` batches of
+    decoded images are held in memory regardless of the backlog size.
+    """
+    batch_size = max(1, batch_size)
+    prep_workers = max(1, prep_workers)
+    stats = {'images_scanned': 0, 'images_inferred': 0, 'new_detections': 0, 'inference_seconds': 0.0}
+
+    path_queue = queue.Queue(maxsize=batch_size * 4)
+    ready_queue = queue.Queue(maxsize=batch_size * max(1, prefetch_batches))
+    writer_queue = queue.Queue(maxsize=max(1, prefetch_batches) * 2)
+
+    stop_event = threading.Event()
+    threads_started = [threading.Thread(target=walker_stage, args=(image_paths, path_queue, prep_workers, stats, stop_event),
+                                        name='yolo-walker', daemon=True)]
+    threads_started += [threading.Thread(target=prep_stage, args=(path_queue, ready_queue, writer_queue, index, updates.mark, stop_event),
+                                         name=f'yolo-prep-{i}', daemon=True) for i in range(prep_workers)]
+    writer = threading.Thread(target=writer_stage, args=(writer_queue, stats, detection_writer, updates),
+                              name='yolo-writer', daemon=True)
+    for thread in threads_started + [writer]:
+        thread.start()
+
+    def run_batch(batch):
+        batch_started_at = time.monotonic()
+        pairs = predict_batch(model, batch, imgsz)
+        stats['inference_seconds'] += time.monotonic() - batch_started_at
+        stats['images_inferred'] += len(batch)
+        for item, _ in pairs:
+            item['image'] = None
+        writer_queue.put(pairs)
+        logger.info(f"Processed batch of {len(batch)} images. "
+                    f"Throughput: {stats['images_inferred'] / stats['inference_seconds'] if stats['inference_seconds'] else 0:.2f} images/sec. "
+                    f"Queued decoded images: {ready_queue.qsize()}.")
+
+    finished_workers = 0
+    try:
+        batch = []
+        while finished_workers < prep_workers:
+            item = ready_queue.get()
+            if item is _STAGE_DONE:
+                finished_workers += 1
+                continue
+            batch.append(item)
+            if len(batch) >= batch_size:
+                run_batch(batch)
+                batch = []
+        if batch:
+            run_batch(batch)
+    except BaseException:
+        # Unblock the upstream stages so they can shut down before the error propagates.
+        stop_event.set()
+        while finished_workers < prep_workers:
+            if ready_queue.get() is _STAGE_DONE:
+                finished_workers += 1
+        raise
+    finally:
+        for thread in threads_started:
+            thread.join()
+        writer_queue.put(_STAGE_DONE)
+        writer.join()
+
+    return stats
+
+def run_detection_segment(model, image_paths, index, segment_id, settings):
+    """Runs the pipeline with a fresh DetectionWriter/ProcessedUpdatesLog pair in the staging directory."""
+    detection_writer = DetectionWriter(YOLO_STAGING_DIR, segment_id, settings['output_format'])
+    updates = ProcessedUpdatesLog(YOLO_STAGING_DIR, segment_id)
+    try:
+        return detect_images(
+            model,
+            image_paths,
+            index,
+            detection_writer,
+            updates,
+            settings['batch_size'],
+            settings['imgsz'],
+            settings['prep_workers'],
+            settings['prefetch_batches']
+        )
+    finally:
+        detection_writer.close()
+        updates.close()
+
+def run_detection_shard(shard_index, shard_count, run_id, settings):
+    """
+    Worker process entry point: loads its own model and runs the pipeline over its shard,
+    writing its own segment, and returns the shard's stats. The parent publishes the
+    segments once all workers exit.
+    """
+    model = load_inference_model(settings)
+    index = ProcessedImageIndex(read_only=True)
+    try:
+        stats = run_detection_segment(model, iter_image_paths(shard_index, shard_count), index,
+                                      f"{run_id}-{shard_index:03d}", settings)
+    finally:
+        index.close()
+    logger.info(f"Shard {shard_index + 1}/{shard_count} finished: {stats}")
+    return stats
+
+def run_sharded_detection(workers, settings, run_id):
+    """
+    Splits the images across `workers` processes by path hash. Returns the stats of the
+    successful shards summed as in a single-process run, and the failed shard indexes.
+    """
+    if not settings['threads']:
+        settings = dict(settings, threads=max(1, (os.cpu_count() or 1) // workers))
+
+    logger.info(f"Starting sharded YOLO detection with {workers} worker processes, {settings['threads']} threads each.")
+    context = multiprocessing.get_context('spawn')
+    # One single-worker pool per shard: a worker that dies only breaks its own pool, so the
+    # other shards keep running.
+    executors = [ProcessPoolExecutor(max_workers=1, mp_context=context) for _ in range(workers)]
+    try:
+        futures = [executor.submit(run_detection_shard, shard_index, workers, run_id, settings)
+                   for shard_index, executor in enumerate(executors)]
+        stats = {'images_scanned': 0, 'images_inferred': 0, 'new_detections': 0, 'inference_seconds': 0.0}
+        failed = []
+        for shard_index, future in enumerate(futures):
+            try:
+                shard_stats = future.result()
+            except Exception as e:
+                failed.append(shard_index)
+                logger.error(f"YOLO worker {shard_index} failed ({e!r}); detections it fsynced are kept and "
+                             f"its remaining images will be retried on the next run.")
+                continue
+            for key in stats:
+                stats[key] += shard_stats[key]
+    finally:
+        for executor in executors:
+            executor.shutdown()
+    return stats, failed
+
+async def run_yolo_detection(batch_size=YOLO_BATCH_SIZE, imgsz=YOLO_IMAGE_SIZE, threads=YOLO_THREADS,
+                             prep_workers=YOLO_PREP_WORKERS, prefetch_batches=YOLO_PREFETCH_BATCHES,
+                             workers=YOLO_WORKERS, output_format=YOLO_OUTPUT_FORMAT, backend=YOLO_BACKEND,
+                             parity_check=False, parity_samples=YOLO_PARITY_SAMPLES):
+    """
+    Scans for new images, runs batched YOLOv8 detection, and logs results.
+    With workers > 1 the images are sharded across that many processes, each with its own model.
+    Non-PyTorch backends run a cached ONNX/OpenVINO export of the weights.
+    Each run writes its detections to its own segment(s) under YOLO_DETECTIONS_DIR.
+    Returns a summary of the run (image and detection counts, segments published, duration).
+    """
+    started_at = time.monotonic()
+    run_id = f"{datetime.datetime.now().strftime('%Y%m%dT%H%M%S')}-{os.getpid()}"
+    settings = {
+        'batch_size': batch_size,
+        'imgsz': imgsz,
+        'threads': threads,
+        'prep_workers': prep_workers,
+        'prefetch_batches': prefetch_batches,
+        'output_format': output_format,
+        # Resolved once here so shard workers load the exported artifact instead of re-exporting it.
+        'model_path': resolve_model_path(backend, imgsz, parity_check, parity_samples)
+    }
+    logger.info(f"Starting YOLO object detection. Scanning directory: {RAW_IMAGES_DIR} "
+                f"(batch size {batch_size}, image size {imgsz}, {prep_workers} prep workers, {output_format} output, "
+                f"{backend} backend)")
+
+    index = ProcessedImageIndex()
+    try:
+        recovered = publish_staged_outputs(index)
+        if recovered:
+            logger.info(f"Published {recovered} detection segments left over from an earlier run.")
+
+        if workers > 1:
+            stats, failed = run_sharded_detection(workers, settings, run_id)
+            published = publish_staged_outputs(index)
+        else:
+            failed = []
+            model = load_inference_model(settings)
+
+            try:
+                stats = run_detection_segment(model, iter_image_paths(), index, f"{run_id}-000", settings)
+            finally:
+                published = publish_staged_outputs(index)
+    finally:
+        index.close()
+
+    elapsed = time.monotonic() - started_at
+    logger.info(f"YOLO detection complete. Scanned {stats['images_scanned']} images, inferred {stats['images_inferred']}. "
+                f"Found {stats['new_detections']} new detections. Published {published} detection segments.")
+    if stats['images_inferred']:
+        # inference_seconds is summed over the worker processes.
+        logger.info(f"Inference throughput: {stats['images_inferred'] / stats['inference_seconds']:.2f} images/sec per worker "
+                    f"(end-to-end {stats['images_inferred'] / elapsed:.2f} images/sec over {elapsed:.1f}s).")
+    return dict(stats, run_id=run_id, backend=backend, workers=max(1, workers), failed_shards=failed,
+                segments_published=published + recovered, duration_seconds=round(elapsed, 1))
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run YOLOv8 object detection on scraped Telegram images.")
+    parser.add_argument('--batch-size', type=int, default=YOLO_BATCH_SIZE,
+                        help="Number of images per predict call.")
+    parser.add_argument('--imgsz', type=int, default=YOLO_IMAGE_SIZE,
+                        help="Inference image size in pixels.")
+    parser.add_argument('--threads', type=int, default=YOLO_THREADS,
+                        help="Inference threads per process, for PyTorch and ONNX Runtime/OpenVINO (0 = library default).")
+    parser.add_argument('--prep-workers', type=int, default=YOLO_PREP_WORKERS,
+                        help="Threads hashing and decoding images ahead of inference.")
+    parser.add_argument('--prefetch-batches', type=int, default=YOLO_PREFETCH_BATCHES,
+                        help="Decoded batches allowed to wait for inference (bounds memory).")
+    parser.add_argument('--workers', type=int, default=YOLO_WORKERS,
+                        help="Worker processes, each with its own model and a shard of the images.")
+    parser.add_argument('--output-format', choices=sorted(DETECTION_EXTENSIONS), default=YOLO_OUTPUT_FORMAT,
+                        help="Detection segment format (parquet requires pyarrow).")
+    parser.add_argument('--backend', choices=sorted(YOLO_BACKENDS), default=YOLO_BACKEND,
+                        help="Inference backend; non-PyTorch backends use an export cached under YOLO_MODEL_CACHE_DIR.")
+    parser.add_argument('--parity-check', action='store_true',
+                        help="Re-run the parity check of the exported model against PyTorch.")
+    parser.add_argument('--parity-samples', type=int, default=YOLO_PARITY_SAMPLES,
+                        help="Images compared by the parity check.")
+    return parser.parse_args()
 
 if __name__ == '__main__':
-    asyncio.run(run_yolo_detection())
\ No newline at end of file
+    args = parse_args()
+    asyncio.run(run_yolo_detection(
+        batch_size=args.batch_size,
+        imgsz=args.imgsz,
+        threads=args.threads,
+        prep_workers=args.prep_workers,
+        prefetch_batches=args.prefetch_batches,
+        workers=args.workers,
+        output_format=args.output_format,
+        backend=args.backend,
+        parity_check=args.parity_check,
+        parity_samples=args.parity_samples
+    ))
\ No newline at end of file
@@ -1,13 +1,22 @@
+import argparse
 import asyncio
+import gzip
 import json
 import os
 import datetime
 import logging
+import shutil
+import time
 from telethon import TelegramClient, errors
 from telethon.tl.functions.messages import GetHistoryRequest
 from telethon.tl.types import MessageMediaPhoto, MessageMediaDocument
 from dotenv import load_dotenv
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
 load_dotenv()
 
 API_ID = os.getenv("API_ID")
@@ -18,11 +27,30 @@ SESSION_NAME = os.getenv("SESSION_NAME", "telegram_scraper_session")
 BASE_DATA_DIR = 'data'
 RAW_DATA_LAKE_MESSAGES_DIR = os.path.join(BASE_DATA_DIR, 'raw', 'telegram_messages')
 RAW_DATA_LAKE_IMAGES_DIR = os.path.join(BASE_DATA_DIR, 'raw', 'telegram_images')
+MEDIA_OBJECTS_DIR = os.path.join(BASE_DATA_DIR, 'raw', 'telegram_media_objects')
 SESSION_DIR = os.path.join(BASE_DATA_DIR, 'sessions')
+STATE_DIR = os.path.join(BASE_DATA_DIR, 'state')
+SCRAPER_STATE_FILE = os.path.join(STATE_DIR, 'scraper_state.json')
+
+SCRAPER_CONCURRENCY = int(os.getenv("SCRAPER_CONCURRENCY", "4"))
+SCRAPER_REQUESTS_PER_SECOND = float(os.getenv("SCRAPER_REQUESTS_PER_SECOND", "1.0"))
+SCRAPER_BURST = int(os.getenv("SCRAPER_BURST", "3"))
+FLOOD_WAIT_MAX_RETRIES = int(os.getenv("FLOOD_WAIT_MAX_RETRIES", "5"))
+
+RAW_MESSAGE_SINK = os.getenv("RAW_MESSAGE_SINK", "ndjson")
+RAW_MESSAGE_COMPRESSION = os.getenv("RAW_MESSAGE_COMPRESSION", "none")
+CHECKPOINT_EVERY_PAGES = int(os.getenv("CHECKPOINT_EVERY_PAGES", "20"))
+SEGMENT_EXTENSIONS = {'none': '.ndjson', 'gzip': '.ndjson.gz', 'zstd': '.ndjson.zst'}
+MANIFEST_FILE_NAME = '_manifest.json'
+
+MEDIA_DOWNLOAD_WORKERS = int(os.getenv("MEDIA_DOWNLOAD_WORKERS", "4"))
+MEDIA_QUEUE_SIZE = int(os.getenv("MEDIA_QUEUE_SIZE", "200"))
 
 os.makedirs(RAW_DATA_LAKE_MESSAGES_DIR, exist_ok=True)
 os.makedirs(RAW_DATA_LAKE_IMAGES_DIR, exist_ok=True)
+os.makedirs(MEDIA_OBJECTS_DIR, exist_ok=True)
 os.makedirs(SESSION_DIR, exist_ok=True)
+os.makedirs(STATE_DIR, exist_ok=True)
 
 
 logging.basicConfig(level=logging.INFO,
@@ -62,11 +90,602 @@ class CustomEncoder(json.JSONEncoder):
             return obj.__dict__
         return json.JSONEncoder.default(self, obj)
 
-async def connect_and_scrape():
+class MessageSink:
+    """
+    Destination for raw scraped messages.
+
+    `write` may buffer; `commit` must make everything written for a channel so far
+    durable and visible to the loader, and is called before any scraper state that
+    depends on it is saved.
+    """
+    def write(self, channel_username, channel_title, message_data):
+        raise NotImplementedError
+
+    def commit(self, channel_username):
+        pass
+
+    def close(self):
+        pass
+
+class JsonFilesMessageSink(MessageSink):
+    """Compatibility sink: one indented `{message.id}.json` file per message."""
+    def __init__(self, base_dir, day_str):
+        self.base_dir = base_dir
+        self.day_str = day_str
+        self._created_dirs = set()
+
+    def write(self, channel_username, channel_title, message_data):
+        message_file_dir = os.path.join(self.base_dir, self.day_str, channel_title.replace(' ', '_'))
+        if message_file_dir not in self._created_dirs:
+            os.makedirs(message_file_dir, exist_ok=True)
+            self._created_dirs.add(message_file_dir)
+        message_file_path = os.path.join(message_file_dir, f"{message_data['id']}.json")
+        with open(message_file_path, 'w', encoding='utf-8') as f:
+            json.dump(message_data, f, ensure_ascii=False, indent=4, cls=CustomEncoder)
+
+class NdjsonMessageSink(MessageSink):
+    """
+    Default sink: compact NDJSON appended to one rolling segment per channel per day.
+
+    Segments are written as `*.part` files and atomically renamed on commit, so the
+    loader only ever sees complete files. Every channel directory keeps a small
+    `_manifest.json` with the message-id range and count of each segment.
+    """
+    def __init__(self, base_dir, day_str, compression='none'):
+        if compression not in SEGMENT_EXTENSIONS:
+            raise ValueError(f"Unsupported compression '{compression}'. Expected one of {sorted(SEGMENT_EXTENSIONS)}.")
+        if compression == 'zstd' and zstandard is None:
+            raise ValueError("zstd compression requested but the 'zstandard' package is not installed.")
+        self.base_dir = base_dir
+        self.day_str = day_str
+        self.compression = compression
+        self.run_id = datetime.datetime.now().strftime('%H%M%S')
+        self._segments = {}
+        self._sequence = {}
+
+    def _open_segment(self, channel_username, channel_title):
+        channel_dir = os.path.join(self.base_dir, self.day_str, channel_title.replace(' ', '_'))
+        os.makedirs(channel_dir, exist_ok=True)
+        sequence = self._sequence.get(channel_username, 0) + 1
+        self._sequence[channel_username] = sequence
+        file_name = f"messages-{self.run_id}-{sequence:04d}{SEGMENT_EXTENSIONS[self.compression]}"
+        raw_file = open(os.path.join(channel_dir, f"{file_name}.part"), 'wb')
+        if self.compression == 'gzip':
+            stream = gzip.GzipFile(fileobj=raw_file, mode='wb')
+        elif self.compression == 'zstd':
+            stream = zstandard.ZstdCompressor().stream_writer(raw_file)
+        else:
+            stream = raw_file
+        segment = {
+            'channel_dir': channel_dir,
+            'file_name': file_name,
+            'raw_file': raw_file,
+            'stream': stream,
+            'min_message_id': None,
+            'max_message_id': None,
+            'message_count': 0
+        }
+        self._segments[channel_username] = segment
+        return segment
+
+    def write(self, channel_username, channel_title, message_data):
+        segment = self._segments.get(channel_username) or self._open_segment(channel_username, channel_title)
+        line = json.dumps(message_data, ensure_ascii=False, separators=(',', ':'), cls=CustomEncoder)
+        segment['stream'].write(line.encode('utf-8') + b'\n')
+        message_id = message_data['id']
+        if segment['min_message_id'] is None or message_id < segment['min_message_id']:
+            segment['min_message_id'] = message_id
+        if segment['max_message_id'] is None or message_id > segment['max_message_id']:
+            segment['max_message_id'] = message_id
+        segment['message_count'] += 1
+
+    def commit(self, channel_username):
+        segment = self._segments.pop(channel_username, None)
+        if segment is None:
+            return
+        stream, raw_file = segment['stream'], segment['raw_file']
+        if self.compression == 'gzip':
+            stream.close()
+        elif self.compression == 'zstd':
+            stream.flush(zstandard.FLUSH_FRAME)
+        raw_file.flush()
+        os.fsync(raw_file.fileno())
+        raw_file.close()
+
+        part_path = os.path.join(segment['channel_dir'], f"{segment['file_name']}.part")
+        if segment['message_count'] == 0:
+            os.remove(part_path)
+            return
+        os.replace(part_path, os.path.join(segment['channel_dir'], segment['file_name']))
+        self._append_to_manifest(segment)
+
+    def _append_to_manifest(self, segment):
+        manifest_path = os.path.join(segment['channel_dir'], MANIFEST_FILE_NAME)
+        manifest = {'segments': []}
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        manifest['segments'].append({
+            'file': segment['file_name'],
+            'min_message_id': segment['min_message_id'],
+            'max_message_id': segment['max_message_id'],
+            'message_count': segment['message_count'],
+            'compression': self.compression,
+            'closed_at': datetime.datetime.now().isoformat()
+        })
+        tmp_path = f"{manifest_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, manifest_path)
+
+    def close(self):
+        for channel_username in list(self._segments):
+            self.commit(channel_username)
+
+def create_message_sink(sink_type=RAW_MESSAGE_SINK, compression=RAW_MESSAGE_COMPRESSION):
+    day_str = datetime.datetime.now().strftime('%Y-%m-%d')
+    if sink_type == 'ndjson':
+        return NdjsonMessageSink(RAW_DATA_LAKE_MESSAGES_DIR, day_str, compression=compression)
+    if sink_type == 'json-files':
+        return JsonFilesMessageSink(RAW_DATA_LAKE_MESSAGES_DIR, day_str)
+    raise ValueError(f"Unknown raw message sink '{sink_type}'. Expected 'ndjson' or 'json-files'.")
+
+class RateScheduler:
+    """
+    Token bucket shared by every channel task so the whole run respects one request budget.
+
+    A FloodWaitError pauses all callers until Telegram's wait has elapsed and halves
+    the refill rate; each successful request then recovers it additively towards the
+    configured rate.
+    """
+    def __init__(self, rate, burst, min_rate=0.05):
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+        self.flood_waits = 0
+        self.flood_wait_seconds = 0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now):
+        # No tokens accrue during a flood-wait pause, so requests resume at the lowered rate
+        # instead of with a full burst.
+        elapsed = max(0.0, now - max(self.updated_at, self.paused_until))
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self.updated_at = now
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def on_success(self):
+        self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+
+    def on_flood_wait(self, seconds):
+        now = time.monotonic()
+        self._refill(now)
+        self.tokens = 0.0
+        self.paused_until = max(self.paused_until, now + seconds + 1)
+        self.rate = max(self.min_rate, self.rate / 2)
+        self.flood_waits += 1
+        self.flood_wait_seconds += seconds
+        logger.warning(f"Flood wait of {seconds}s observed. Pausing all requests; rate lowered to {self.rate:.2f} req/s.")
+
+async def call_with_rate_limit(client, scheduler, request_factory, description):
+    """
+    Runs one Telegram request through the shared scheduler, retrying the same
+    request after a flood wait instead of abandoning the channel.
+    """
+    for attempt in range(1, FLOOD_WAIT_MAX_RETRIES + 1):
+        await scheduler.acquire()
+        try:
+            result = await request_factory()
+            scheduler.on_success()
+            return result
+        except errors.FloodWaitError as fwe:
+            logger.warning(f"Flood wait on {description} (attempt {attempt}/{FLOOD_WAIT_MAX_RETRIES}): {fwe.seconds} seconds.")
+            scheduler.on_flood_wait(fwe.seconds)
+            if attempt == FLOOD_WAIT_MAX_RETRIES:
+                raise
+
+class MediaDownloadPool:
+    """
+    Bounded async download queue served by a fixed number of workers.
+
+    Media is stored once under MEDIA_OBJECTS_DIR, keyed by the Telegram photo or
+    document id, and the per-day channel path is hard-linked (or copied) to that
+    object, so a reposted photo is only fetched the first time it is seen. Failed
+    downloads are remembered per channel (see pop_failed) so they can be retried, and
+    pending downloads are counted per channel so one channel can wait for its own.
+    """
+    def __init__(self, client, scheduler, objects_dir=MEDIA_OBJECTS_DIR,
+                 workers=MEDIA_DOWNLOAD_WORKERS, queue_size=MEDIA_QUEUE_SIZE):
+        self.client = client
+        self.scheduler = scheduler
+        self.objects_dir = objects_dir
+        self.worker_count = max(1, workers)
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.files_downloaded = 0
+        self.bytes_downloaded = 0
+        self.dedupe_hits = 0
+        self.failures = 0
+        self.no_media = 0
+        self.max_queue_depth = 0
+        self._failed = {}
+        self._inflight = {}
+        self._pending = {}
+        self._pending_changed = asyncio.Condition()
+        self._workers = []
+
+    def start(self):
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+
+    async def submit(self, channel_username, message, object_key, file_extension, link_path):
+        """Queues a download; blocks the producer only while the queue is full."""
+        self._pending[channel_username] = self._pending.get(channel_username, 0) + 1
+        try:
+            await self.queue.put((channel_username, message, object_key, file_extension, link_path))
+        except asyncio.CancelledError:
+            await self._done(channel_username)
+            raise
+        self.max_queue_depth = max(self.max_queue_depth, self.queue.qsize())
+
+    async def drain(self, channel_username):
+        """Waits until every download queued for the channel has finished or failed."""
+        async with self._pending_changed:
+            await self._pending_changed.wait_for(lambda: not self._pending.get(channel_username))
+
+    async def _done(self, channel_username):
+        async with self._pending_changed:
+            self._pending[channel_username] -= 1
+            if not self._pending[channel_username]:
+                del self._pending[channel_username]
+            self._pending_changed.notify_all()
+
+    def pop_failed(self, channel_username):
+        """Returns (and forgets) the ids of the channel's messages whose media failed to download."""
+        return self._failed.pop(channel_username, set())
+
+    async def close(self):
+        await self.queue.join()
+        for _ in self._workers:
+            await self.queue.put(None)
+        await asyncio.gather(*self._workers)
+        self._workers = []
+
+    def stats(self):
+        return {
+            'files_downloaded': self.files_downloaded,
+            'bytes_downloaded': self.bytes_downloaded,
+            'dedupe_hits': self.dedupe_hits,
+            'failures': self.failures,
+            'no_media': self.no_media,
+            'queue_depth': self.queue.qsize(),
+            'max_queue_depth': self.max_queue_depth
+        }
+
+    def _object_path(self, object_key, file_extension):
+        return os.path.join(self.objects_dir, object_key[-2:], f"{object_key}{file_extension}")
+
+    async def _worker(self):
+        while True:
+            item = await self.queue.get()
+            try:
+                if item is None:
+                    return
+                await self._process(*item[1:])
+            except Exception as e:
+                self.failures += 1
+                self._failed.setdefault(item[0], set()).add(item[1].id)
+                logger.warning(f"Error downloading media for message {item[1].id} of {item[0]}: {e}", exc_info=True)
+            finally:
+                if item is not None:
+                    await self._done(item[0])
+                self.queue.task_done()
+
+    async def _process(self, message, object_key, file_extension, link_path):
+        object_path = self._object_path(object_key, file_extension)
+
+        if object_path in self._inflight:
+            # True once downloaded, None when there was no media, False when the download failed.
+            outcome = await self._inflight[object_path]
+            if outcome is None:
+                return
+            self.dedupe_hits += 1
+        elif os.path.exists(object_path):
+            self.dedupe_hits += 1
+        else:
+            done = asyncio.get_running_loop().create_future()
+            self._inflight[object_path] = done
+            outcome = False
+            try:
+                os.makedirs(os.path.dirname(object_path), exist_ok=True)
+                downloaded_path = await call_with_rate_limit(
+                    self.client, self.scheduler,
+                    lambda: self.client.download_media(message, file=f"{object_path}.part"),
+                    f"media of message {message.id}"
+                )
+                if downloaded_path is None:
+                    # Nothing downloadable (e.g. the media expired); not a failure to retry.
+                    outcome = None
+                    self.no_media += 1
+                    logger.info(f"Message {message.id} has no downloadable media; skipping it.")
+                    return
+                os.replace(downloaded_path, object_path)
+                self.files_downloaded += 1
+                self.bytes_downloaded += os.path.getsize(object_path)
+                outcome = True
+            finally:
+                del self._inflight[object_path]
+                done.set_result(outcome)
+
+        if not os.path.exists(object_path):
+            raise FileNotFoundError(f"Media object {object_path} is missing after download.")
+        self._link(object_path, link_path)
+
+    @staticmethod
+    def _link(object_path, link_path):
+        if os.path.exists(link_path):
+            return
+        os.makedirs(os.path.dirname(link_path), exist_ok=True)
+        try:
+            os.link(object_path, link_path)
+        except OSError:
+            shutil.copy2(object_path, link_path)
+
+def load_scraper_state():
+    """
+    Reads the persisted per-channel scraping state.
+
+    For every channel the state records the highest message id already captured
+    (`last_message_id`), the messages whose media still has to be downloaded
+    (`failed_media`) and, while a full backfill is running, the last committed
+    page (`backfill`) so an interrupted backfill can be resumed.
+    """
+    if not os.path.exists(SCRAPER_STATE_FILE):
+        return {'channels': {}}
+    try:
+        with open(SCRAPER_STATE_FILE, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        state.setdefault('channels', {})
+        return state
+    except Exception as e:
+        logger.error(f"Error reading scraper state from {SCRAPER_STATE_FILE}: {e}", exc_info=True)
+        raise
+
+def save_scraper_state(state):
+    """Atomically writes the scraper state so a crash never leaves a torn file behind."""
+    tmp_path = f"{SCRAPER_STATE_FILE}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, SCRAPER_STATE_FILE)
+
+async def submit_message_media(media_pool, channel_username, channel_title, message, channel_image_path):
+    """Works out the file name of a message's photo or document and queues its download."""
+    file_name = None
+    file_extension = None
+    object_key = None
+    if isinstance(message.media, MessageMediaPhoto) and message.media.photo:
+        file_extension = '.jpg'
+        file_name = f"{channel_title.replace(' ', '_')}_{message.id}{file_extension}"
+        object_key = f"photo_{message.media.photo.id}"
+    elif isinstance(message.media, MessageMediaDocument) and message.media.document:
+        object_key = f"document_{message.media.document.id}"
+        if message.media.document.attributes:
+            for attr in message.media.document.attributes:
+                if hasattr(attr, 'file_name'):
+                    file_name = attr.file_name
+                    file_extension = os.path.splitext(file_name)[1]
+                    break
+        if not file_name:
+            file_name = f"{channel_title.replace(' ', '_')}_{message.id}_doc"
+            if message.media.document.mime_type and '/' in message.media.document.mime_type:
+                file_extension = '.' + message.media.document.mime_type.split('/')[-1]
+            else:
+                file_extension = '.bin'
+
+        if not file_extension:
+            file_extension = '.dat'
+
+    if file_name:
+        image_file_path = os.path.join(channel_image_path, channel_title.replace(' ', '_'), file_name)
+        await media_pool.submit(channel_username, message, object_key, file_extension, image_file_path)
+    else:
+        logger.info(f"Message {message.id} has media but no identifiable file name/type for download.")
+
+async def retry_failed_media(client, scheduler, media_pool, channel_username, entity, message_ids, channel_image_path):
+    """Re-fetches the messages whose media failed to download in an earlier run and queues them again."""
+    logger.info(f"Retrying media of {len(message_ids)} messages from {channel_username} that failed to download earlier.")
+    messages = await call_with_rate_limit(
+        client, scheduler,
+        lambda: client.get_messages(entity, ids=list(message_ids)),
+        f"failed media messages of {channel_username}"
+    )
+    for message_id, message in zip(message_ids, messages):
+        if message is None or not message.media:
+            logger.info(f"Message {message_id} of {channel_username} no longer has media. Dropping it from the retry list.")
+            continue
+        await submit_message_media(media_pool, channel_username, entity.title, message, channel_image_path)
+
+async def scrape_channel(client, scheduler, sink, media_pool, channel_username, state, full_backfill=False, resume_backfill=False):
+    """
+    Scrapes a single channel.
+
+    By default only messages newer than the channel's high-water mark are fetched
+    (`min_id`). A full backfill walks the whole history and, every
+    CHECKPOINT_EVERY_PAGES pages, commits the sink and checkpoints the page offset;
+    `resume_backfill` continues from that checkpoint. Media downloads are drained before
+    any state is saved; messages whose media failed are kept in `failed_media` and retried
+    on the next run. Returns the channel's message count, high-water mark, number of
+    failed media downloads and error (None on success).
+    """
+    today_str = datetime.datetime.now().strftime('%Y-%m-%d')
+    channel_image_path = os.path.join(RAW_DATA_LAKE_IMAGES_DIR, today_str)
+
+    os.makedirs(channel_image_path, exist_ok=True)
+
+    channel_state = state['channels'].setdefault(channel_username, {})
+    last_message_id = channel_state.get('last_message_id', 0)
+    backfill_checkpoint = channel_state.get('backfill')
+
+    if resume_backfill and backfill_checkpoint:
+        is_backfill = True
+        min_id = 0
+        offset_id = backfill_checkpoint['offset_id']
+        max_seen_id = max(last_message_id, backfill_checkpoint.get('max_message_id', 0))
+        logger.info(f"\nResuming backfill for channel: {channel_username} from message ID {offset_id}")
+    elif full_backfill:
+        is_backfill = True
+        min_id = 0
+        offset_id = 0
+        max_seen_id = last_message_id
+        logger.info(f"\nStarting full backfill for channel: {channel_username}")
+    else:
+        is_backfill = False
+        min_id = last_message_id
+        offset_id = 0
+        max_seen_id = last_message_id
+        logger.info(f"\nStarting incremental scraping for channel: {channel_username} (messages after ID {min_id})")
+
+    result = {'channel': channel_username, 'messages': 0, 'last_message_id': last_message_id,
+              'failed_media': len(channel_state.get('failed_media', [])), 'error': None}
+    failed_media = set()
+    total_messages_scraped = 0
+    try:
+        entity = await call_with_rate_limit(
+            client, scheduler,
+            lambda: client.get_entity(channel_username),
+            f"get_entity({channel_username})"
+        )
+        if channel_username in IMAGE_CHANNELS and channel_state.get('failed_media'):
+            await retry_failed_media(client, scheduler, media_pool, channel_username, entity,
+                                     channel_state['failed_media'], channel_image_path)
+        limit = 100
+        pages_since_commit = 0
+
+        while True:
+            history = await call_with_rate_limit(
+                client, scheduler,
+                lambda: client(GetHistoryRequest(
+                    peer=entity,
+                    offset_id=offset_id,
+                    offset_date=None,
+                    add_offset=0,
+                    limit=limit,
+                    max_id=0,
+                    min_id=min_id,
+                    hash=0
+                )),
+                f"history page of {channel_username} at offset {offset_id}"
+            )
+            messages = history.messages
+
+            if not messages:
+                break
+
+            for message in messages:
+                message_raw_data = message.to_dict()
+                message_raw_data['channel_username'] = channel_username
+                message_raw_data['channel_title'] = entity.title
+
+                try:
+                    sink.write(channel_username, entity.title, message_raw_data)
+                except Exception as json_e:
+                    logger.error(f"Error saving message {message.id} to JSON: {json_e}", exc_info=True)
+                    continue
+
+                if channel_username in IMAGE_CHANNELS and message.media:
+                    await submit_message_media(media_pool, channel_username, entity.title, message, channel_image_path)
+
+            offset_id = messages[-1].id
+            max_seen_id = max(max_seen_id, max(message.id for message in messages))
+            total_messages_scraped += len(messages)
+            pages_since_commit += 1
+
+            if pages_since_commit >= CHECKPOINT_EVERY_PAGES:
+                sink.commit(channel_username)
+                pages_since_commit = 0
+                if is_backfill:
+                    await media_pool.drain(channel_username)
+                    failed_media |= media_pool.pop_failed(channel_username)
+                    channel_state['failed_media'] = sorted(failed_media)
+                    channel_state['backfill'] = {
+                        'offset_id': offset_id,
+                        'max_message_id': max_seen_id,
+                        'updated_at': datetime.datetime.now().isoformat()
+                    }
+                    save_scraper_state(state)
+
+            logger.info(f"  Fetched {len(messages)} messages. Total for {entity.title}: {total_messages_scraped}. Last message ID: {offset_id}. Media queue depth: {media_pool.queue.qsize()}")
+
+        sink.commit(channel_username)
+        # The high-water mark only moves past messages whose media has been downloaded or
+        # recorded as failed, so nothing is lost if the run stops here.
+        await media_pool.drain(channel_username)
+        failed_media |= media_pool.pop_failed(channel_username)
+        if failed_media:
+            logger.warning(f"Media of {len(failed_media)} messages from {channel_username} failed to download. They will be retried on the next run.")
+            channel_state['failed_media'] = sorted(failed_media)
+        else:
+            channel_state.pop('failed_media', None)
+        channel_state['last_message_id'] = max(channel_state.get('last_message_id', 0), max_seen_id)
+        if is_backfill:
+            # The walk reached the oldest message. Incremental runs keep the checkpoint, so an
+            # interrupted backfill can still be resumed after them.
+            channel_state.pop('backfill', None)
+        channel_state['updated_at'] = datetime.datetime.now().isoformat()
+        save_scraper_state(state)
+
+        logger.info(f"Finished scraping {total_messages_scraped} messages from {entity.title}. High-water mark: {channel_state['last_message_id']}")
+
+    except errors.FloodWaitError as fwe:
+        logger.error(f"Giving up on channel {channel_username} after {FLOOD_WAIT_MAX_RETRIES} flood waits (last: {fwe.seconds} seconds). Progress up to the last committed page is kept.")
+        result['error'] = f"flood wait ({fwe.seconds}s)"
+    except Exception as e:
+        logger.error(f"Error scraping channel {channel_username}: {e}", exc_info=True)
+        result['error'] = str(e)
+    finally:
+        try:
+            sink.commit(channel_username)
+        except Exception as sink_e:
+            logger.error(f"Error committing raw messages for channel {channel_username}: {sink_e}", exc_info=True)
+    result['messages'] = total_messages_scraped
+    result['last_message_id'] = channel_state.get('last_message_id', 0)
+    result['failed_media'] = len(channel_state.get('failed_media', []))
+    return result
+
+def require_credentials():
+    """Raises ValueError when the Telegram credentials are missing from the environment."""
+    if not API_ID or not API_HASH or not PHONE_NUMBER:
+        raise ValueError("API_ID, API_HASH, or PHONE_NUMBER not set in environment variables. Please check your .env file.")
+
+async def connect_and_scrape(full_backfill=False, resume_backfill=False,
+                             concurrency=SCRAPER_CONCURRENCY, requests_per_second=SCRAPER_REQUESTS_PER_SECOND,
+                             sink_type=RAW_MESSAGE_SINK, compression=RAW_MESSAGE_COMPRESSION,
+                             download_workers=MEDIA_DOWNLOAD_WORKERS):
     """
     Connects to Telegram, scrapes messages and media from specified channels,
     and stores them in a partitioned data lake structure.
+
+    Channels are scraped concurrently (at most `concurrency` at a time) and share
+    a single RateScheduler, so wall-clock time tracks the busiest channel.
+    Returns per-channel results (message counts, high-water marks, errors) and run totals.
     """
+    require_credentials()
     client = TelegramClient(os.path.join(SESSION_DIR, SESSION_NAME), API_ID, API_HASH)
 
     logger.info("Connecting to Telegram...")
@@ -82,113 +701,80 @@ async def connect_and_scrape():
 
     except Exception as e:
         logger.error(f"Error connecting to Telegram: {e}", exc_info=True)
-        return
-
-    for channel_username in channels:
-        today_str = datetime.datetime.now().strftime('%Y-%m-%d')
-        channel_message_path = os.path.join(RAW_DATA_LAKE_MESSAGES_DIR, today_str)
-        channel_image_path = os.path.join(RAW_DATA_LAKE_IMAGES_DIR, today_str)
+        raise
 
-        os.makedirs(channel_message_path, exist_ok=True)
-        os.makedirs(channel_image_path, exist_ok=True)
+    state = load_scraper_state()
+    sink = create_message_sink(sink_type, compression)
+    scheduler = RateScheduler(rate=requests_per_second, burst=SCRAPER_BURST)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    media_pool = MediaDownloadPool(client, scheduler, workers=download_workers)
+    media_pool.start()
 
-        logger.info(f"\nStarting scraping for channel: {channel_username}")
-        try:
-            entity = await client.get_entity(channel_username)
-            offset_id = 0
-            limit = 100
-            total_messages_scraped = 0
+    async def scrape_with_slot(channel_username):
+        async with semaphore:
+            return await scrape_channel(client, scheduler, sink, media_pool, channel_username, state,
+                                 full_backfill=full_backfill, resume_backfill=resume_backfill)
 
-            while True:
-                history = await client(GetHistoryRequest(
-                    peer=entity,
-                    offset_id=offset_id,
-                    offset_date=None,
-                    add_offset=0,
-                    limit=limit,
-                    max_id=0,
-                    min_id=0,
-                    hash=0
-                ))
-                messages = history.messages
-
-                if not messages:
-                    break
-
-                for message in messages:
-                    message_raw_data = message.to_dict()
-                    message_raw_data['channel_username'] = channel_username
-                    message_raw_data['channel_title'] = entity.title
-
-                    message_file_dir = os.path.join(channel_message_path, entity.title.replace(' ', '_'))
-                    os.makedirs(message_file_dir, exist_ok=True)
-                    message_file_path = os.path.join(message_file_dir, f"{message.id}.json")
-
-                    try:
-                        with open(message_file_path, 'w', encoding='utf-8') as f:
-                            json.dump(message_raw_data, f, ensure_ascii=False, indent=4, cls=CustomEncoder)
-                    except Exception as json_e:
-                        logger.error(f"Error saving message {message.id} to JSON: {json_e}", exc_info=True)
-                        continue
-
-                    if channel_username in IMAGE_CHANNELS and message.media:
-                        file_name = None
-                        file_extension = None
-                        if isinstance(message.media, MessageMediaPhoto):
-                            file_name = f"{entity.title.replace(' ', '_')}_{message.id}{file_extension}"
-                        elif isinstance(message.media, MessageMediaDocument) and message.media.document:
-                            if message.media.document.attributes:
-                                for attr in message.media.document.attributes:
-                                    if hasattr(attr, 'file_name'):
-                                        file_name = attr.file_name
-                                        file_extension = os.path.splitext(file_name)[1]
-                                        break
-                            if not file_name:
-                                file_name = f"{entity.title.replace(' ', '_')}_{message.id}_doc"
-                                if message.media.document.mime_type and '/' in message.media.document.mime_type:
-                                    file_extension = '.' + message.media.document.mime_type.split('/')[-1]
-                                else:
-                                    file_extension = '.bin'
-
-                            if not file_extension:
-                                file_extension = '.dat'
-
-
-                        if file_name:
-                            image_file_dir = os.path.join(channel_image_path, entity.title.replace(' ', '_'))
-                            os.makedirs(image_file_dir, exist_ok=True)
-                            image_file_path = os.path.join(image_file_dir, file_name)
-
-                            try:
-                                await client.download_media(message, file=image_file_path)
-                                logger.info(f"Downloaded media for message {message.id} to {image_file_path}")
-                            except Exception as dl_e:
-                                logger.warning(f"Error downloading media for message {message.id} in channel {channel_username}: {dl_e}", exc_info=True)
-                        else:
-                            logger.info(f"Message {message.id} has media but no identifiable file name/type for download.")
-
-
-                offset_id = messages[-1].id
-                total_messages_scraped += len(messages)
-                logger.info(f"  Fetched {len(messages)} messages. Total for {entity.title}: {total_messages_scraped}. Last message ID: {offset_id}")
-                await asyncio.sleep(1)
-
-            logger.info(f"Finished scraping {total_messages_scraped} messages from {entity.title}")
-
-        except errors.FloodWaitError as fwe:
-            logger.warning(f"Flood wait error for channel {channel_username}. Waiting for {fwe.seconds} seconds.", exc_info=True)
-            await asyncio.sleep(fwe.seconds + 5)
-        except Exception as e:
-            logger.error(f"Error scraping channel {channel_username}: {e}", exc_info=True)
+    started_at = time.monotonic()
+    try:
+        channel_results = await asyncio.gather(*(scrape_with_slot(channel_username) for channel_username in channels))
+    finally:
+        sink.close()
+        await media_pool.close()
+    elapsed = time.monotonic() - started_at
+    logger.info(f"Scraped {len(channels)} channels in {elapsed:.1f}s "
+                f"(concurrency={concurrency}, flood waits={scheduler.flood_waits}, "
+                f"flood wait seconds={scheduler.flood_wait_seconds}).")
+    logger.info(f"Media downloads: {media_pool.stats()}")
 
     await client.disconnect()
     logger.info("\nDisconnected from Telegram.")
     logger.info("Scraping process complete.")
+    return {
+        'channels': list(channel_results),
+        'messages': sum(channel_result['messages'] for channel_result in channel_results),
+        'failed_channels': [channel_result['channel'] for channel_result in channel_results if channel_result['error']],
+        'flood_waits': scheduler.flood_waits,
+        'media': media_pool.stats(),
+        'duration_seconds': round(elapsed, 1)
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Scrape messages and media from Telegram channels.")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--full-backfill', action='store_true',
+                      help="Ignore the stored high-water marks and walk each channel's full history.")
+    mode.add_argument('--resume-backfill', action='store_true',
+                      help="Resume an interrupted full backfill from its last committed page.")
+    parser.add_argument('--concurrency', type=int, default=SCRAPER_CONCURRENCY,
+                        help="Number of channels scraped at the same time.")
+    parser.add_argument('--requests-per-second', type=float, default=SCRAPER_REQUESTS_PER_SECOND,
+                        help="Target Telegram request rate shared by all channels.")
+    parser.add_argument('--sink', choices=['ndjson', 'json-files'], default=RAW_MESSAGE_SINK,
+                        help="Raw message layout: rolling NDJSON segments (default) or the legacy one JSON file per message.")
+    parser.add_argument('--compression', choices=sorted(SEGMENT_EXTENSIONS), default=RAW_MESSAGE_COMPRESSION,
+                        help="Compression for NDJSON segments.")
+    parser.add_argument('--download-workers', type=int, default=MEDIA_DOWNLOAD_WORKERS,
+                        help="Number of concurrent media download workers.")
+    return parser.parse_args()
 
 
 if __name__ == '__main__':
-    if not API_ID or not API_HASH or not PHONE_NUMBER:
-        logger.error("API_ID, API_HASH, or PHONE_NUMBER not set in environment variables. Please check your .env file.")
+    args = parse_args()
+
+    try:
+        require_credentials()
+    except ValueError as e:
+        logger.error(str(e))
         exit(1)
 
-    asyncio.run(connect_and_scrape())
\ No newline at end of file
+    asyncio.run(connect_and_scrape(
+        full_backfill=args.full_backfill,
+        resume_backfill=args.resume_backfill,
+        concurrency=args.concurrency,
+        requests_per_second=args.requests_per_second,
+        sink_type=args.sink,
+        compression=args.compression,
+        download_workers=args.download_workers
+    ))
@@ -0,0 +1,9 @@
+import os
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The pipeline scripts import their helpers by bare name, as when run from scripts/ or src/.
+for path in (PROJECT_ROOT, os.path.join(PROJECT_ROOT, 'scripts'), os.path.join(PROJECT_ROOT, 'src')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip('psycopg2')
+pytest.importorskip('fastapi')
+
+from starlette.requests import ClientDisconnect
+
+from api import crud, database, main
+
+class FakeCursor:
+    description = [('message_id',), ('message_text',)]
+
+    def __init__(self, batches):
+        self.batches = list(batches)
+
+    def execute(self, query, params):
+        pass
+
+    def fetchmany(self, size):
+        return self.batches.pop(0) if self.batches else []
+
+class FakeConnection:
+    def __init__(self, batches):
+        self.batches = batches
+
+    def cursor(self, name=None):
+        return FakeCursor(self.batches)
+
+@pytest.fixture
+def closed(monkeypatch):
+    """Opens QueryStreams on fake export connections and records every close_export_connection call."""
+    closed = []
+    monkeypatch.setattr(crud, 'open_export_connection', lambda: FakeConnection([[(1, 'a'), (2, 'b')], [(3, 'c')]]))
+    monkeypatch.setattr(crud, 'close_export_connection', closed.append)
+
+    async def run_inline(func, *args, **kwargs):
+        return func(*args, **kwargs)
+    monkeypatch.setattr(database, 'run_db_query', run_inline)
+    return closed
+
+def call_response(response, send, spec_version='2.4'):
+    scope = {'type': 'http', 'asgi': {'spec_version': spec_version}}
+
+    async def receive():
+        await asyncio.sleep(3600)
+
+    asyncio.run(response(scope, receive, send))
+
+def test_close_is_idempotent(closed):
+    stream = crud.QueryStream('SELECT 1')
+    stream.close()
+    stream.close()
+    assert len(closed) == 1
+
+def test_completed_export_closes_the_stream_once(closed):
+    stream = crud.QueryStream('SELECT 1')
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    call_response(main.export_response(stream, ['message_id', 'message_text'], 'csv', 'messages'), send)
+    body = ''.join(message.get('body', b'').decode('utf-8') for message in messages)
+    assert body.splitlines() == ['message_id,message_text', '1,a', '2,b', '3,c']
+    assert len(closed) == 1
+
+def test_export_never_started_still_closes_the_stream(closed):
+    stream = crud.QueryStream('SELECT 1')
+
+    async def send(message):
+        raise OSError("client went away")
+
+    with pytest.raises(ClientDisconnect):
+        call_response(main.export_response(stream, ['message_id'], 'ndjson', 'messages'), send)
+    assert len(closed) == 1
@@ -0,0 +1,73 @@
+import pytest
+
+from keyword_tagger import KeywordAutomaton, ProductTagger, fold_text, normalize_text
+
+KEYWORDS = [
+    ('paracetamol', 'Paracetamol'),
+    ('ፓራሲታሞል', 'Paracetamol'),
+    ('tablet', 'Tablet'),
+    ('blood pressure', 'Blood Pressure Monitor'),
+    ('vitamin c', 'Vitamin C'),
+    ('vitamin', 'Vitamin'),
+]
+
+@pytest.fixture
+def tagger():
+    return ProductTagger(KEYWORDS)
+
+def spans(tagger, text):
+    return [(product_name, text[start:end]) for product_name, _, start, end in tagger.tag(text)]
+
+@pytest.mark.parametrize('text', [
+    'x ¨ paracetamol',
+    '  Blood\t\n pressure ',
+    '¨¨ ¨ tablet',
+    'ፓራሲታሞል፡ቫይታሚን',
+    'ﬁ ½ tablets',
+    '',
+])
+def test_normalize_text_matches_fold_text(text):
+    normalized, offsets = normalize_text(text)
+    assert normalized == fold_text(text)
+    assert len(offsets) == len(normalized)
+    assert offsets == sorted(offsets)
+
+def test_span_after_multi_character_fold(tagger):
+    # NFKC folds '¨' into ' ̈'; the space it yields must not shift later offsets.
+    text = 'x ¨ paracetamol'
+    assert tagger.tag(text) == [('Paracetamol', 'paracetamol', 4, 15)]
+    assert spans(tagger, text) == [('Paracetamol', 'paracetamol')]
+
+def test_spans_refer_to_original_text(tagger):
+    text = 'Need BLOOD   Pressure monitor and Paracetamol'
+    assert spans(tagger, text) == [
+        ('Blood Pressure Monitor', 'BLOOD   Pressure'),
+        ('Paracetamol', 'Paracetamol'),
+    ]
+
+def test_ethiopic_keyword_and_wordspace(tagger):
+    text = 'ፓራሲታሞል፡አለ'
+    assert spans(tagger, text) == [('Paracetamol', 'ፓራሲታሞል')]
+
+def test_plural_suffix_counts_as_whole_word(tagger):
+    assert spans(tagger, '10 tablets left') == [('Tablet', 'tablet')]
+    assert tagger.tag('tabletop') == []
+    assert tagger.tag('multivitamin') == []
+
+def test_leftmost_longest_match_wins(tagger):
+    assert spans(tagger, 'vitamin c 1000mg') == [('Vitamin C', 'vitamin c')]
+
+def test_duplicate_keywords_are_counted_and_do_not_change_hash():
+    base = ProductTagger(KEYWORDS)
+    with_duplicate = ProductTagger(KEYWORDS + [('PARACETAMOL', 'Paracetamol')])
+    assert with_duplicate.duplicates == 1
+    assert with_duplicate.dictionary_hash == base.dictionary_hash
+    assert ProductTagger(KEYWORDS[:-1]).dictionary_hash != base.dictionary_hash
+
+def test_python_automaton_matches_every_occurrence():
+    automaton = KeywordAutomaton()
+    automaton.backend = 'python'
+    for pattern in ('he', 'she', 'hers'):
+        automaton.add(pattern, pattern)
+    automaton.build()
+    assert sorted(automaton.iter_matches('ushers')) == [(1, 4, 'she'), (2, 4, 'he'), (2, 6, 'hers')]
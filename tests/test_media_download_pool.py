@@ -0,0 +1,82 @@
+import asyncio
+import importlib
+import types
+
+import pytest
+
+pytest.importorskip('telethon')
+pytest.importorskip('dotenv')
+
+@pytest.fixture(scope='module')
+def scraper(tmp_path_factory):
+    # The scraper creates its data directories and log file relative to the working directory on import.
+    with pytest.MonkeyPatch.context() as patch:
+        patch.chdir(tmp_path_factory.mktemp('scraper'))
+        yield importlib.import_module('telegram_scraper')
+
+class FakeClient:
+    """download_media writes the file, waiting first for messages listed in `blocked`."""
+    def __init__(self, blocked=(), no_media=()):
+        self.blocked = {message_id: asyncio.Event() for message_id in blocked}
+        self.no_media = set(no_media)
+
+    async def download_media(self, message, file):
+        if message.id in self.blocked:
+            await self.blocked[message.id].wait()
+        if message.id in self.no_media:
+            return None
+        with open(file, 'wb') as f:
+            f.write(b'media')
+        return file
+
+@pytest.fixture
+def run_pool(scraper, monkeypatch, tmp_path):
+    async def call_directly(client, scheduler, request_factory, description):
+        return await request_factory()
+    monkeypatch.setattr(scraper, 'call_with_rate_limit', call_directly)
+
+    def run(scenario, **client_kwargs):
+        async def main():
+            pool = scraper.MediaDownloadPool(FakeClient(**client_kwargs), scheduler=None,
+                                             objects_dir=str(tmp_path / 'objects'), workers=2)
+            pool.start()
+            try:
+                return await scenario(pool)
+            finally:
+                for event in pool.client.blocked.values():
+                    event.set()
+                await pool.close()
+        return asyncio.run(main())
+    return run
+
+def message(message_id):
+    return types.SimpleNamespace(id=message_id)
+
+def test_drain_waits_only_for_the_channels_own_downloads(run_pool, tmp_path):
+    async def scenario(pool):
+        await pool.submit('slow', message(1), 'photo_1', '.jpg', str(tmp_path / 'slow' / '1.jpg'))
+        await pool.submit('fast', message(2), 'photo_2', '.jpg', str(tmp_path / 'fast' / '2.jpg'))
+        await asyncio.wait_for(pool.drain('fast'), timeout=5)
+        assert (tmp_path / 'fast' / '2.jpg').exists()
+        assert not (tmp_path / 'slow' / '1.jpg').exists()
+
+        pool.client.blocked[1].set()
+        await asyncio.wait_for(pool.drain('slow'), timeout=5)
+        assert (tmp_path / 'slow' / '1.jpg').exists()
+
+    run_pool(scenario, blocked=[1])
+
+def test_message_without_downloadable_media_is_skipped_not_failed(run_pool, tmp_path):
+    async def scenario(pool):
+        await pool.submit('chan', message(3), 'photo_3', '.jpg', str(tmp_path / 'chan' / '3.jpg'))
+        # A repost of the same media waits for the first download and shares its outcome.
+        await pool.submit('chan', message(4), 'photo_3', '.jpg', str(tmp_path / 'chan' / '4.jpg'))
+        await asyncio.sleep(0.05)
+        pool.client.blocked[3].set()
+        await asyncio.wait_for(pool.drain('chan'), timeout=5)
+        return pool.pop_failed('chan'), pool.stats()
+
+    failed, stats = run_pool(scenario, blocked=[3], no_media=[3])
+    assert failed == set()
+    assert (stats['failures'], stats['no_media'], stats['files_downloaded']) == (0, 1, 0)
+    assert not (tmp_path / 'chan').exists()
@@ -0,0 +1,53 @@
+import asyncio
+import logging
+import importlib
+
+import pytest
+
+STEP_MODULE = """
+import logging
+logging.basicConfig(level=logging.INFO, handlers=[logging.FileHandler('data/{module}_basic_config.log')])
+logger = logging.getLogger(__name__)
+
+def run():
+    logger.info('hello from {module}')
+    return {{'module': '{module}'}}
+"""
+
+def test_in_process_steps_log_to_their_own_files(tmp_path, monkeypatch):
+    pytest.importorskip('dagster')
+    from orchestration import ops
+
+    monkeypatch.setattr(ops, 'PROJECT_ROOT', str(tmp_path))
+    # Named under 'dagster' so DagsterLogHandler does not forward its own records back to it.
+    monkeypatch.setattr(ops, 'get_dagster_logger', lambda: logging.getLogger('dagster.test_pipeline_steps'))
+    monkeypatch.syspath_prepend(str(tmp_path))
+    (tmp_path / 'data').mkdir()
+    for module in ('pipeline_step_first', 'pipeline_step_second'):
+        (tmp_path / f'{module}.py').write_text(STEP_MODULE.format(module=module))
+
+    assert ops.run_pipeline_step('first', 'unused.py', 'pipeline_step_first', 'run',
+                                 'data/first.log') == {'module': 'pipeline_step_first'}
+    assert ops.run_pipeline_step('second', 'unused.py', 'pipeline_step_second', 'run',
+                                 'data/second.log') == {'module': 'pipeline_step_second'}
+
+    first_log = (tmp_path / 'data' / 'first.log').read_text()
+    second_log = (tmp_path / 'data' / 'second.log').read_text()
+    assert 'hello from pipeline_step_first' in first_log and 'pipeline_step_second' not in first_log
+    assert 'hello from pipeline_step_second' in second_log and 'pipeline_step_first' not in second_log
+    for module in ('pipeline_step_first', 'pipeline_step_second'):
+        assert (tmp_path / 'data' / f'{module}_basic_config.log').read_text() == ''
+
+def test_scrape_without_credentials_fails_before_connecting(tmp_path, monkeypatch):
+    pytest.importorskip('telethon')
+    pytest.importorskip('dotenv')
+    monkeypatch.chdir(tmp_path)
+    scraper = importlib.import_module('telegram_scraper')
+    monkeypatch.setattr(scraper, 'API_HASH', None)
+
+    def fail_connect(*args, **kwargs):
+        raise AssertionError("TelegramClient created without credentials")
+    monkeypatch.setattr(scraper, 'TelegramClient', fail_connect)
+
+    with pytest.raises(ValueError, match='API_HASH'):
+        asyncio.run(scraper.connect_and_scrape())
@@ -0,0 +1,52 @@
+import sqlite3
+import importlib
+
+import pytest
+
+pytest.importorskip('cv2')
+pytest.importorskip('numpy')
+pytest.importorskip('PIL')
+pytest.importorskip('ultralytics')
+
+@pytest.fixture(scope='module')
+def detector(tmp_path_factory):
+    # The detector creates its data directories and log file relative to the working directory on import.
+    with pytest.MonkeyPatch.context() as patch:
+        patch.chdir(tmp_path_factory.mktemp('detector'))
+        yield importlib.import_module('yolo_detector')
+
+@pytest.fixture
+def index(detector, tmp_path):
+    index = detector.ProcessedImageIndex(db_path=str(tmp_path / 'processed.sqlite'))
+    yield index
+    index.close()
+
+@pytest.mark.parametrize('status', ['skipped', 'failed'])
+def test_unprocessed_content_does_not_mark_copies_as_duplicates(index, status):
+    index.mark('a/1.jpg', 10, 1, 'hash-a', status)
+    index.flush()
+    assert not index.is_hash_processed('hash-a')
+
+    index.mark('b/1.jpg', 10, 1, 'hash-a', 'processed')
+    index.flush()
+    assert index.is_hash_processed('hash-a')
+
+def test_duplicate_does_not_replace_the_processed_hash(index):
+    index.mark('a/1.jpg', 10, 1, 'hash-a', 'processed')
+    index.mark('b/1.jpg', 10, 1, 'hash-a', 'duplicate')
+    index.mark('c/1.jpg', 10, 1, 'hash-a', 'failed')
+    index.flush()
+    assert index.is_hash_processed('hash-a')
+
+def test_older_index_rows_of_unprocessed_content_are_ignored(detector, tmp_path):
+    db_path = str(tmp_path / 'processed.sqlite')
+    detector.ProcessedImageIndex(db_path=db_path).close()
+    with sqlite3.connect(db_path) as conn:
+        conn.executemany("INSERT INTO content_hashes (content_hash, status, updated_at) VALUES (?, ?, '');",
+                         [('hash-skipped', 'skipped'), ('hash-duplicate', 'duplicate')])
+    index = detector.ProcessedImageIndex(db_path=db_path, read_only=True)
+    try:
+        assert not index.is_hash_processed('hash-skipped')
+        assert index.is_hash_processed('hash-duplicate')
+    finally:
+        index.conn.close()
@@ -0,0 +1,100 @@
+import asyncio
+import importlib
+
+import pytest
+
+pytest.importorskip('telethon')
+pytest.importorskip('dotenv')
+
+from telethon import errors
+
+@pytest.fixture(scope='module')
+def scraper(tmp_path_factory):
+    # The scraper creates its data directories and log file relative to the working directory on import.
+    with pytest.MonkeyPatch.context() as patch:
+        patch.chdir(tmp_path_factory.mktemp('scraper'))
+        yield importlib.import_module('telegram_scraper')
+
+class FakeClock:
+    """Monotonic clock that only moves when a coroutine sleeps."""
+    def __init__(self):
+        self.now = 100.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.sleeps.append(round(seconds, 6))
+        self.now += seconds
+
+@pytest.fixture
+def clock(scraper, monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(scraper.time, 'monotonic', fake.monotonic)
+    monkeypatch.setattr(scraper.asyncio, 'sleep', fake.sleep)
+    return fake
+
+def acquire(scheduler, times):
+    async def run():
+        for _ in range(times):
+            await scheduler.acquire()
+    asyncio.run(run())
+
+def test_burst_is_served_without_waiting_then_rate_applies(scraper, clock):
+    scheduler = scraper.RateScheduler(rate=2.0, burst=3)
+    acquire(scheduler, 3)
+    assert clock.sleeps == []
+    acquire(scheduler, 2)
+    assert clock.sleeps == [0.5, 0.5]
+
+def test_flood_wait_pauses_every_caller_and_halves_the_rate(scraper, clock):
+    scheduler = scraper.RateScheduler(rate=2.0, burst=3)
+    scheduler.on_flood_wait(10)
+    assert (scheduler.rate, scheduler.flood_waits, scheduler.flood_wait_seconds) == (1.0, 1, 10)
+    acquire(scheduler, 1)
+    # Paused for the wait plus a second of margin, then one token at the lowered rate.
+    assert clock.sleeps == [11.0, 1.0]
+    assert clock.now == pytest.approx(112.0)
+
+def test_rate_recovers_additively_up_to_the_configured_rate(scraper, clock):
+    scheduler = scraper.RateScheduler(rate=2.0, burst=3)
+    scheduler.on_flood_wait(1)
+    scheduler.on_success()
+    assert scheduler.rate == pytest.approx(1.1)
+    for _ in range(100):
+        scheduler.on_success()
+    assert scheduler.rate == 2.0
+
+def test_rate_never_drops_below_the_minimum(scraper, clock):
+    scheduler = scraper.RateScheduler(rate=1.0, burst=1, min_rate=0.3)
+    for _ in range(5):
+        scheduler.on_flood_wait(1)
+    assert scheduler.rate == 0.3
+
+def test_request_is_retried_after_a_flood_wait(scraper, clock):
+    scheduler = scraper.RateScheduler(rate=10.0, burst=5)
+    attempts = []
+
+    async def request():
+        attempts.append(clock.now)
+        if len(attempts) == 1:
+            raise errors.FloodWaitError(request=None, capture=3)
+        return 'history'
+
+    result = asyncio.run(scraper.call_with_rate_limit(None, scheduler, request, 'test request'))
+    assert result == 'history'
+    assert len(attempts) == 2
+    assert attempts[1] - attempts[0] >= 4
+    assert scheduler.flood_waits == 1
+
+def test_flood_wait_is_raised_after_the_last_retry(scraper, clock, monkeypatch):
+    monkeypatch.setattr(scraper, 'FLOOD_WAIT_MAX_RETRIES', 2)
+    scheduler = scraper.RateScheduler(rate=10.0, burst=5)
+
+    async def request():
+        raise errors.FloodWaitError(request=None, capture=1)
+
+    with pytest.raises(errors.FloodWaitError):
+        asyncio.run(scraper.call_with_rate_limit(None, scheduler, request, 'test request'))
+    assert scheduler.flood_waits == 2
@@ -0,0 +1,93 @@
+import os
+import uuid
+import importlib
+
+import pytest
+
+psycopg2 = pytest.importorskip('psycopg2')
+pytest.importorskip('dotenv')
+
+# Needs a real server: e.g. TEST_POSTGRES_DSN="dbname=postgres user=postgres host=localhost".
+# The test creates and drops its own scratch database there.
+TEST_POSTGRES_DSN = os.getenv("TEST_POSTGRES_DSN")
+
+pytestmark = pytest.mark.skipif(not TEST_POSTGRES_DSN, reason="TEST_POSTGRES_DSN is not set")
+
+# raw.raw_telegram_messages and the staging view as they existed before the partitioned layout.
+PRE_PARTITION_SCHEMA_SQL = """
+CREATE SCHEMA raw;
+CREATE TABLE raw.raw_telegram_messages (
+    message_id BIGINT NOT NULL,
+    channel_id BIGINT NOT NULL,
+    channel_username TEXT,
+    channel_title TEXT,
+    raw_json JSONB NOT NULL,
+    scraped_date DATE NOT NULL,
+    source_path TEXT,
+    loaded_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+CREATE UNIQUE INDEX uq_raw_telegram_messages_channel_message ON raw.raw_telegram_messages (channel_id, message_id);
+CREATE INDEX idx_raw_telegram_messages_loaded_at ON raw.raw_telegram_messages (loaded_at);
+INSERT INTO raw.raw_telegram_messages (message_id, channel_id, channel_username, raw_json, scraped_date) VALUES
+    (1, 10, '@CheMed123', '{"id": 1, "date": "2024-05-17T08:00:00", "message": "paracetamol", "views": 3}', '2024-05-18'),
+    (2, 10, '@CheMed123', '{"id": 2, "date": "2024-06-02T09:30:00", "message": "syrup", "views": 5}', '2024-06-03');
+
+CREATE SCHEMA staging;
+CREATE VIEW staging.stg_telegram_messages AS
+SELECT (raw_json->>'id')::BIGINT AS message_id, raw_json->>'message' AS message_text, scraped_date
+FROM raw.raw_telegram_messages;
+CREATE VIEW staging.stg_telegram_message_texts AS SELECT message_text FROM staging.stg_telegram_messages;
+"""
+
+@pytest.fixture(scope='module')
+def loader(tmp_path_factory):
+    # The loader opens its log file under data/ relative to the working directory on import.
+    workdir = tmp_path_factory.mktemp('loader')
+    (workdir / 'data').mkdir()
+    with pytest.MonkeyPatch.context() as patch:
+        patch.chdir(workdir)
+        yield importlib.import_module('load_to_postgres')
+
+@pytest.fixture
+def scratch_db():
+    name = f"test_raw_migration_{uuid.uuid4().hex[:12]}"
+    admin = psycopg2.connect(TEST_POSTGRES_DSN)
+    admin.autocommit = True
+    with admin.cursor() as cursor:
+        cursor.execute(f'CREATE DATABASE "{name}";')
+    conn = psycopg2.connect(TEST_POSTGRES_DSN, dbname=name)
+    try:
+        yield conn
+    finally:
+        conn.close()
+        with admin.cursor() as cursor:
+            cursor.execute(f'DROP DATABASE IF EXISTS "{name}";')
+        admin.close()
+
+def test_pre_partition_table_with_staging_views_is_migrated(loader, scratch_db):
+    with scratch_db.cursor() as cursor:
+        cursor.execute(PRE_PARTITION_SCHEMA_SQL)
+    scratch_db.commit()
+
+    with scratch_db.cursor() as cursor:
+        assert loader.dependent_views(cursor, 'raw.raw_telegram_messages') == [
+            'staging.stg_telegram_message_texts', 'staging.stg_telegram_messages']
+        loader.create_raw_messages_tables(cursor)
+    scratch_db.commit()
+
+    with scratch_db.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = 'raw.raw_telegram_messages'::regclass;")
+        assert cursor.fetchone()[0] == 'p'
+        cursor.execute("SELECT to_regclass('raw.raw_telegram_messages_unpartitioned'), "
+                       "to_regclass('staging.stg_telegram_messages');")
+        assert cursor.fetchone() == (None, None)
+        cursor.execute("SELECT message_id, message_text, views_count, tableoid::regclass::text "
+                       "FROM raw.raw_telegram_messages ORDER BY message_id;")
+        assert cursor.fetchall() == [(1, 'paracetamol', 3, 'raw.raw_telegram_messages_2024_05'),
+                                     (2, 'syrup', 5, 'raw.raw_telegram_messages_2024_06')]
+
+    # A second run finds the partitioned table and leaves it alone.
+    with scratch_db.cursor() as cursor:
+        loader.create_raw_messages_tables(cursor)
+        cursor.execute("SELECT count(*) FROM raw.raw_telegram_messages;")
+        assert cursor.fetchone()[0] == 2
@@ -0,0 +1,95 @@
+import pytest
+
+pytest.importorskip('psycopg2')
+
+from api import cache
+from api.cache import MemoryCacheBackend, ResponseCache, if_none_match
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(cache.time, 'monotonic', fake)
+    return fake
+
+def test_get_returns_stored_value(clock):
+    backend = MemoryCacheBackend(max_entries=4)
+    backend.set('a', '{"data": 1}', ttl=60)
+    assert backend.get('a') == '{"data": 1}'
+    assert backend.get('missing') is None
+    assert len(backend) == 1
+
+def test_entries_expire_after_ttl(clock):
+    backend = MemoryCacheBackend(max_entries=4)
+    backend.set('a', 'value', ttl=10)
+    clock.now += 9.9
+    assert backend.get('a') == 'value'
+    clock.now += 0.2
+    assert backend.get('a') is None
+    assert len(backend) == 0
+
+def test_least_recently_used_entry_is_evicted(clock):
+    backend = MemoryCacheBackend(max_entries=2)
+    backend.set('a', 1, ttl=60)
+    backend.set('b', 2, ttl=60)
+    assert backend.get('a') == 1
+    backend.set('c', 3, ttl=60)
+    assert backend.get('b') is None
+    assert backend.get('a') == 1
+    assert backend.get('c') == 3
+    assert len(backend) == 2
+
+def test_overwriting_an_entry_refreshes_value_and_ttl(clock):
+    backend = MemoryCacheBackend(max_entries=2)
+    backend.set('a', 1, ttl=10)
+    clock.now += 8
+    backend.set('a', 2, ttl=10)
+    clock.now += 8
+    assert backend.get('a') == 2
+    assert len(backend) == 1
+
+def test_keys_include_data_version_and_sorted_params():
+    first = ResponseCache.make_key('top-products', {'limit': 10, 'b': None}, 3)
+    assert first == ResponseCache.make_key('top-products', {'b': None, 'limit': 10}, 3)
+    assert first != ResponseCache.make_key('top-products', {'limit': 10, 'b': None}, 4)
+
+def test_response_cache_counts_hits_and_misses(clock):
+    response_cache = ResponseCache(MemoryCacheBackend(max_entries=4), ttl=60)
+    assert response_cache.get('k') is None
+    response_cache.set('k', 'body')
+    assert response_cache.get('k') == 'body'
+    stats = response_cache.stats()
+    assert (stats['hits'], stats['misses'], stats['entries']) == (1, 1, 1)
+
+@pytest.mark.parametrize('header, matches', [
+    (None, False),
+    ('"abc"', True),
+    ('W/"abc"', True),
+    ('"other", "abc"', True),
+    ('*', False),
+    ('"other"', False),
+])
+def test_if_none_match(header, matches):
+    assert if_none_match(header, '"abc"') is matches
+
+def test_wildcard_if_none_match_does_not_hide_a_missing_channel(monkeypatch):
+    pytest.importorskip('fastapi')
+    pytest.importorskip('httpx')
+    from fastapi.testclient import TestClient
+    from api import crud, database, main
+
+    async def run_inline(func, *args, **kwargs):
+        if func == main.response_cache.data_version:
+            return 'v1'
+        assert func is crud.get_channel_activity
+        return ['message_date'], []
+    monkeypatch.setattr(database, 'run_db_query', run_inline)
+
+    response = TestClient(main.app).get('/api/channels/no_such_channel/activity', headers={'If-None-Match': '*'})
+    assert response.status_code == 404
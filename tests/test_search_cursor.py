@@ -0,0 +1,53 @@
+import base64
+import json
+from datetime import date
+
+import pytest
+
+pytest.importorskip('psycopg2')
+
+from api.crud import build_search_query, decode_search_cursor, encode_search_cursor
+
+ROW = {'message_id': 41, 'channel_id': 7, 'message_date': date(2024, 5, 17), 'rank': 0.125}
+
+@pytest.mark.parametrize('sort, expected', [
+    ('relevance', [0.125, date(2024, 5, 17), 41, 7]),
+    ('date', [date(2024, 5, 17), 41, 7]),
+])
+def test_cursor_round_trip(sort, expected):
+    cursor = encode_search_cursor(ROW, sort)
+    assert '=' not in cursor
+    assert decode_search_cursor(cursor, sort) == expected
+
+def test_cursor_from_another_sort_is_rejected():
+    with pytest.raises(ValueError):
+        decode_search_cursor(encode_search_cursor(ROW, 'relevance'), 'date')
+    with pytest.raises(ValueError):
+        decode_search_cursor(encode_search_cursor(ROW, 'date'), 'relevance')
+
+@pytest.mark.parametrize('cursor', [
+    'not-base64!',
+    base64.urlsafe_b64encode(b'{"a": 1}').decode('ascii'),
+    base64.urlsafe_b64encode(json.dumps(['2024-13-01', 1, 2]).encode('utf-8')).decode('ascii'),
+    '',
+])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError, match='Invalid cursor'):
+        decode_search_cursor(cursor, 'date')
+
+def test_decoded_cursor_becomes_keyset_params():
+    after = decode_search_cursor(encode_search_cursor(ROW, 'relevance'), 'relevance')
+    query, params = build_search_query('paracetamol', sort='relevance', after=after, limit=11)
+    assert '(rank, message_date, message_id, channel_id) < (%s::real, %s, %s, %s)' in query
+    assert params[-5:] == (0.125, date(2024, 5, 17), 41, 7, 11)
+
+@pytest.mark.parametrize('channel', ['CheMed123', '@CheMed123', ' chemed123 '])
+def test_channel_filter_matches_the_normalized_username_exactly(channel):
+    query, params = build_search_query('paracetamol', channel=channel, sort='date')
+    assert "LOWER(LTRIM(dc.channel_username, '@')) = %s" in query
+    assert 'dc.channel_username ILIKE' not in query
+    assert params[3] == 'chemed123'
+
+def test_channel_filter_does_not_treat_like_wildcards_specially():
+    _, params = build_search_query('paracetamol', channel='che_med%', sort='date')
+    assert params[3] == 'che_med%'
@@ -0,0 +1,30 @@
+import datetime
+import json
+from typing import List
+
+import pytest
+
+pytest.importorskip('psycopg2')
+pytest.importorskip('fastapi')
+
+from api import crud, schemas
+from api.serialization import api_payload, dumps, row_records
+
+def test_search_columns_are_the_response_fields():
+    assert crud.SEARCH_RESULT_COLUMNS == tuple(schemas.MessageSearchResult.model_fields)
+
+def test_row_records_drop_trailing_cursor_values():
+    rows = [(7, 'paracetamol 500mg', datetime.date(2024, 3, 1), 'Pharma', 0.5, 42)]
+    assert row_records(crud.SEARCH_RESULT_COLUMNS, rows) == [{
+        'message_id': 7,
+        'message_text': 'paracetamol 500mg',
+        'message_date': datetime.date(2024, 3, 1),
+        'channel_name': 'Pharma',
+        'rank': 0.5,
+    }]
+
+def test_payload_matches_schema_validation():
+    rows = [(1, 'ሽሮፕ available', datetime.date(2024, 1, 2), None, 0.0, 3)]
+    payload = api_payload(row_records(crud.SEARCH_RESULT_COLUMNS, rows), "ok", next_cursor=None)
+    validated = schemas.PaginatedAPIResponse[List[schemas.MessageSearchResult]].model_validate(payload)
+    assert json.loads(dumps(payload)) == json.loads(validated.model_dump_json())
@@ -0,0 +1,78 @@
+import sys
+import types
+import importlib
+
+import pytest
+
+pytest.importorskip('cv2')
+pytest.importorskip('numpy')
+pytest.importorskip('PIL')
+pytest.importorskip('ultralytics')
+
+@pytest.fixture(scope='module')
+def detector(tmp_path_factory):
+    # The detector creates its data directories and log file relative to the working directory on import.
+    with pytest.MonkeyPatch.context() as patch:
+        patch.chdir(tmp_path_factory.mktemp('detector'))
+        yield importlib.import_module('yolo_detector')
+
+class FakeModel:
+    """An Ultralytics model whose predictor holds `backend` once it has predicted."""
+    def __init__(self, backend):
+        self.backend = backend
+        self.predictor = None
+
+    def predict(self, source, **kwargs):
+        self.predictor = types.SimpleNamespace(model=self.backend)
+        return []
+
+def test_onnx_session_is_rebuilt_with_the_thread_count(detector, monkeypatch):
+    created = []
+
+    class InferenceSession:
+        def __init__(self, path, sess_options=None, providers=None):
+            created.append((path, sess_options, providers))
+
+        def get_providers(self):
+            return ['CPUExecutionProvider']
+
+    onnxruntime = types.SimpleNamespace(SessionOptions=types.SimpleNamespace, InferenceSession=InferenceSession)
+    monkeypatch.setitem(sys.modules, 'onnxruntime', onnxruntime)
+    backend = types.SimpleNamespace(onnx=True, session=InferenceSession('model.onnx'))
+
+    detector.configure_backend_threads(FakeModel(backend), 'model.onnx', 3, 64)
+    path, options, providers = created[-1]
+    assert len(created) == 2
+    assert (path, options.intra_op_num_threads, options.inter_op_num_threads, providers) == \
+        ('model.onnx', 3, 1, ['CPUExecutionProvider'])
+
+def test_openvino_model_is_recompiled_with_the_thread_count(detector):
+    compiled = []
+    core = types.SimpleNamespace(compile_model=lambda model, device_name, config: compiled.append(
+        (model, device_name, config)) or 'compiled')
+    backend = types.SimpleNamespace(onnx=False, xml=True, core=core, ov_model='ov-model', inference_mode='LATENCY')
+
+    detector.configure_backend_threads(FakeModel(backend), 'model_openvino_model', 2, 64)
+    assert compiled == [('ov-model', 'CPU', {'PERFORMANCE_HINT': 'LATENCY', 'INFERENCE_NUM_THREADS': 2})]
+    assert backend.ov_compiled_model == 'compiled'
+
+def test_zero_threads_leaves_the_model_untouched(detector):
+    model = FakeModel(types.SimpleNamespace(onnx=True))
+    detector.configure_backend_threads(model, 'model.onnx', 0, 64)
+    assert model.predictor is None
+
+@pytest.mark.parametrize('manifest, parity, expected', [
+    ({'artifact': 'model.onnx'}, None, 'weights.pt'),
+    ({'artifact': 'model.onnx'}, {'passed': True, 'match_rate': 1.0}, 'cache/model.onnx'),
+    ({'artifact': 'model.onnx'}, {'passed': False, 'match_rate': 0.5}, 'weights.pt'),
+])
+def test_unverified_or_failed_export_falls_back_to_pytorch(detector, monkeypatch, tmp_path, manifest, parity, expected):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'weights.pt').write_bytes(b'weights')
+    monkeypatch.setattr(detector, 'YOLO_WEIGHTS', 'weights.pt')
+    monkeypatch.setattr(detector, 'export_model', lambda *args: ('cache', dict(manifest)))
+    monkeypatch.setattr(detector, 'load_yolo_model', lambda path: path)
+    monkeypatch.setattr(detector, 'run_parity_check', lambda *args: parity)
+    (tmp_path / 'cache').mkdir()
+
+    assert detector.resolve_model_path('onnx', 64) == expected